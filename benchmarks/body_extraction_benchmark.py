@@ -0,0 +1,59 @@
+"""
+Micro-benchmark for the HTML body extraction engines.
+
+Times every engine in loaders.body_extractors.HTML_EXTRACTORS over the HTML
+fixtures in benchmarks/fixtures/emails, relative to the previous
+BeautifulSoup html.parser implementation (bs4). The fixtures are
+anonymised stand-ins shaped after real mail: a table-based marketing email
+with inline styles, a newsletter, an order receipt and a CI notification.
+
+Usage: PYTHONPATH=src python benchmarks/body_extraction_benchmark.py
+"""
+
+import argparse
+import os
+import timeit
+from pathlib import Path
+
+os.environ.setdefault("ENVIRONMENT", "benchmark")
+
+from loaders.body_extractors import HTML_EXTRACTORS  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "emails"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--max-chars", type=int, nargs="+", default=[20_000])
+    args = parser.parse_args()
+
+    fixtures = {
+        path.name: path.read_text() for path in sorted(FIXTURES_DIR.glob("*"))
+    }
+
+    for max_chars in args.max_chars:
+        print(f"max_chars={max_chars}")
+        for name, html in fixtures.items():
+            print(f"  {name} ({len(html) / 1024:.0f} KiB)")
+            baseline = None
+            for engine, extract in sorted(
+                HTML_EXTRACTORS.items(), key=lambda item: item[0] != "bs4"
+            ):
+                elapsed = min(
+                    timeit.repeat(
+                        lambda e=extract, h=html: e(h, max_chars),
+                        number=1,
+                        repeat=args.repeat,
+                    )
+                )
+                baseline = baseline or elapsed
+                chars = len(extract(html, max_chars))
+                print(
+                    f"    {engine:<7} {elapsed * 1000:8.2f}ms "
+                    f"{baseline / elapsed:5.1f}x  {chars} chars"
+                )
+
+
+if __name__ == "__main__":
+    main()
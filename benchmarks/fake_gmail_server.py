@@ -0,0 +1,196 @@
+"""
+Local stand-in for the Gmail REST API used by the benchmarks.
+
+Serves a fixed mailbox of synthetic messages and sleeps ``latency`` seconds
+on every request to emulate the round trip to gmail.googleapis.com. With
+``fail_rate`` set, that share of requests (and batch sub-requests) is
+answered with a 429 rateLimitExceeded error.
+"""
+
+import base64
+import json
+import random
+import re
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+BATCH_BOUNDARY = "batch_fake_gmail"
+SUB_REQUEST_RE = re.compile(r"Content-ID: <([^>]+)>\r\n\r\nGET (\S+)")
+
+
+def build_message(index: int) -> dict:
+    body = (
+        f"<html><body><p>Hello, this is message {index}.</p>"
+        + "<p>Lorem ipsum dolor sit amet.</p>" * 20
+        + "</body></html>"
+    )
+    return {
+        "id": f"msg-{index:05d}",
+        "threadId": f"thread-{index:05d}",
+        "labelIds": ["INBOX", "UNREAD"],
+        "payload": {
+            "mimeType": "text/html",
+            "headers": [
+                {"name": "Subject", "value": f"Message {index}"},
+                {"name": "From", "value": "Sender <sender@example.com>"},
+                {"name": "Date", "value": "Mon, 1 Jan 2024 10:00:00 +0000"},
+            ],
+            "body": {"data": base64.urlsafe_b64encode(body.encode()).decode()},
+        },
+    }
+
+
+class FakeGmailServer:
+    def __init__(
+        self,
+        message_count: int = 150,
+        latency: float = 0.05,
+        fail_rate: float = 0.0,
+    ):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.throttled_count = 0
+        self._random = random.Random(42)
+        self.messages = {
+            message["id"]: message
+            for message in (build_message(i) for i in range(message_count))
+        }
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), self._handler_class()
+        )
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/gmail/v1"
+
+    @property
+    def batch_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/batch/gmail/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def record_request(self):
+        with self._lock:
+            self.request_count += 1
+        time.sleep(self.latency)
+
+    def get(self, path: str) -> tuple[int, dict]:
+        if self._throttle():
+            return 429, {
+                "error": {
+                    "code": 429,
+                    "message": "Too many concurrent requests for user",
+                    "errors": [{"reason": "rateLimitExceeded"}],
+                }
+            }
+
+        path, _, query = path.partition("?")
+        path = path.rstrip("/")
+        params = dict(parse_qsl(query))
+        prefix = "/gmail/v1/users/me/messages"
+        if path == "/gmail/v1/users/me/profile":
+            return 200, {"emailAddress": "me@example.com", "historyId": "1"}
+        if path == prefix:
+            return 200, self._list_page(params)
+        if path.startswith(f"{prefix}/"):
+            message = self.messages.get(path.rsplit("/", 1)[1])
+            if message and params.get("format") == "metadata":
+                return 200, {
+                    "id": message["id"],
+                    "threadId": message["threadId"],
+                    "labelIds": message["labelIds"],
+                    "payload": {"headers": message["payload"]["headers"]},
+                }
+            if message:
+                return 200, message
+        return 404, {"error": {"code": 404, "message": "Not Found"}}
+
+    def _throttle(self) -> bool:
+        with self._lock:
+            if self._random.random() >= self.fail_rate:
+                return False
+            self.throttled_count += 1
+            return True
+
+    def _list_page(self, params: dict) -> dict:
+        ids = list(self.messages)
+        start = int(params.get("pageToken", 0))
+        end = start + int(params.get("maxResults", 100))
+        page = {
+            "messages": [
+                {"id": mid, "threadId": self.messages[mid]["threadId"]}
+                for mid in ids[start:end]
+            ],
+            "resultSizeEstimate": len(ids),
+        }
+        if end < len(ids):
+            page["nextPageToken"] = str(end)
+        return page
+
+    def batch(self, body: str) -> str:
+        parts = []
+        for content_id, path in SUB_REQUEST_RE.findall(body):
+            status, payload = self.get(path)
+            parts.append(
+                f"--{BATCH_BOUNDARY}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                "Content-Type: application/json\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        return "".join(parts) + f"--{BATCH_BOUNDARY}--\r\n"
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # noqa: A002
+                pass
+
+            def do_GET(self):  # noqa: N802
+                fake.record_request()
+                status, payload = fake.get(self.path)
+                self._send(status, "application/json", json.dumps(payload))
+
+            def do_POST(self):  # noqa: N802
+                fake.record_request()
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode()
+                if self.path.rstrip("/") != "/batch/gmail/v1":
+                    self._send(404, "application/json", "{}")
+                    return
+                self._send(
+                    200,
+                    f"multipart/mixed; boundary={BATCH_BOUNDARY}",
+                    fake.batch(body),
+                )
+
+            def _send(self, status: int, content_type: str, body: str):
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -0,0 +1,95 @@
+"""
+Local stand-in for the Supabase REST (PostgREST) API used by the
+benchmarks.
+
+Answers every /rest/v1/<table> request with ``rows`` and sleeps
+``latency`` seconds per request. Each new connection also sleeps
+``connect_latency`` seconds, standing in for the TCP + TLS handshake a
+fresh client pays against the real project URL.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeSupabaseServer:
+    def __init__(
+        self,
+        rows: list[dict] | None = None,
+        latency: float = 0.02,
+        connect_latency: float = 0.05,
+    ):
+        self.rows = rows or []
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.request_count = 0
+        self.connection_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), self._handler_class()
+        )
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def record_connection(self):
+        with self._lock:
+            self.connection_count += 1
+        time.sleep(self.connect_latency)
+
+    def record_request(self):
+        with self._lock:
+            self.request_count += 1
+        time.sleep(self.latency)
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; with Nagle on, the
+            # body waits on the client's delayed ACK over a kept-alive
+            # connection
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                fake.record_connection()
+
+            def log_message(self, format, *args):  # noqa: A002
+                pass
+
+            def do_GET(self):  # noqa: N802
+                fake.record_request()
+                self._send(200, json.dumps(fake.rows))
+
+            def do_PATCH(self):  # noqa: N802
+                fake.record_request()
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self._send(200, json.dumps(fake.rows))
+
+            def _send(self, status: int, body: str):
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
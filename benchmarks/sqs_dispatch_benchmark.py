@@ -0,0 +1,131 @@
+"""
+Wall-clock benchmark for the dispatcher's SQS enqueue.
+
+Sends one message per fake mail account to a local moto SQS server,
+first with one send_message call per account (the old dispatcher loop),
+then through sqs_service.send_messages. Checks that the queue received
+every message and prints the number of SQS API requests each approach
+made. moto spends a fixed amount of CPU per message, so against it the
+request count says more than the wall-clock speedup, which is bounded
+by moto rather than by round trips.
+
+Requires moto[server]; moto runs in its own process so its CPU time does
+not compete with the sender threads. Usage:
+PYTHONPATH=src:benchmarks python benchmarks/sqs_dispatch_benchmark.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+os.environ.setdefault("ENVIRONMENT", "benchmark")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+from core.logger import L  # noqa: E402
+from core.settings import settings  # noqa: E402
+from services import sqs_service  # noqa: E402
+
+
+def start_moto_server() -> tuple[subprocess.Popen, str]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "moto.server", "-p", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    endpoint_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, endpoint_url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("moto server did not start")
+
+
+class RequestCounter:
+    def __init__(self, client):
+        self.count = 0
+        client.meta.events.register("before-send.sqs.*", self)
+
+    def __call__(self, **kwargs):
+        self.count += 1
+
+
+def queue_size(queue_url: str) -> int:
+    attributes = sqs_service._sqs_client().get_queue_attributes(
+        QueueUrl=queue_url, AttributeNames=["ApproximateNumberOfMessages"]
+    )
+    return int(attributes["Attributes"]["ApproximateNumberOfMessages"])
+
+
+def send_sequentially(queue_url: str, messages: dict) -> float:
+    started = time.perf_counter()
+    for body in messages.values():
+        sqs_service._sqs_client().send_message(
+            QueueUrl=queue_url, MessageBody=body
+        )
+    return time.perf_counter() - started
+
+
+def send_batched(queue_url: str, messages: dict) -> tuple[int, int, float]:
+    logger = L("sqs-benchmark")
+    started = time.perf_counter()
+    sent, failed = asyncio.run(
+        sqs_service.send_messages(queue_url, messages, logger=logger)
+    )
+    return sent, failed, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=2000)
+    args = parser.parse_args()
+
+    server, settings.SQS_ENDPOINT_URL = start_moto_server()
+    try:
+        client = sqs_service._sqs_client()
+        requests = RequestCounter(client)
+        messages = {
+            str(account_id): json.dumps({"mail_account_id": str(account_id)})
+            for account_id in (uuid.uuid4() for _ in range(args.accounts))
+        }
+        print(
+            f"{args.accounts} accounts, "
+            f"SQS_SEND_CONCURRENCY={settings.SQS_SEND_CONCURRENCY}"
+        )
+
+        queue_url = client.create_queue(QueueName="sequential")["QueueUrl"]
+        requests.count = 0
+        elapsed = send_sequentially(queue_url, messages)
+        baseline = elapsed
+        print(
+            f"send_message loop  requests={requests.count:<6} "
+            f"elapsed={elapsed:6.2f}s queued={queue_size(queue_url)}"
+        )
+
+        queue_url = client.create_queue(QueueName="batched")["QueueUrl"]
+        requests.count = 0
+        sent, failed, elapsed = send_batched(queue_url, messages)
+        print(
+            f"send_messages      requests={requests.count:<6} "
+            f"elapsed={elapsed:6.2f}s queued={queue_size(queue_url)} "
+            f"speedup={baseline / elapsed:4.1f}x sent={sent} failed={failed}"
+        )
+    finally:
+        server.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Per-query latency of a new Supabase client per query versus the shared
+client from core.supabase_client.get_supabase_client.
+
+Queries run against a local fake PostgREST server that charges a
+handshake on every new connection. The shared client is used from two
+separate asyncio.run calls, as happens across Lambda invocations without
+the persistent event loop, to show it survives loop boundaries.
+
+Usage: PYTHONPATH=src:benchmarks python benchmarks/supabase_client_benchmark.py
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+os.environ.setdefault("ENVIRONMENT", "benchmark")
+
+from fake_supabase_server import FakeSupabaseServer  # noqa: E402
+
+from core import supabase_client  # noqa: E402
+from supabase import acreate_client  # noqa: E402
+
+# acreate_client only checks the key is non-empty
+FAKE_SERVICE_KEY = "fake-service-key"
+
+
+async def run_queries(queries: int, shared: bool) -> list[float]:
+    latencies = []
+    for _ in range(queries):
+        started = time.perf_counter()
+        supabase = await (
+            supabase_client.get_supabase_client()
+            if shared
+            else acreate_client(supabase_client.url, supabase_client.key)
+        )
+        await (
+            supabase.table("mail_accounts")
+            .select("*")
+            .eq("id", str(uuid.uuid4()))
+            .execute()
+        )
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(label: str, latencies: list[float], connections: int):
+    print(
+        f"{label:<22} queries={len(latencies):<4} "
+        f"mean={statistics.mean(latencies) * 1000:6.1f}ms "
+        f"p50={statistics.median(latencies) * 1000:6.1f}ms "
+        f"max={max(latencies) * 1000:6.1f}ms "
+        f"connections={connections}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--connect-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with FakeSupabaseServer(
+        latency=args.latency, connect_latency=args.connect_latency
+    ) as server:
+        supabase_client.url = server.url
+        supabase_client.key = FAKE_SERVICE_KEY
+        print(
+            f"{args.latency * 1000:.0f}ms query latency, "
+            f"{args.connect_latency * 1000:.0f}ms connection setup"
+        )
+
+        latencies = asyncio.run(run_queries(args.queries, shared=False))
+        report("client per query", latencies, server.connection_count)
+
+        connections = server.connection_count
+        latencies = asyncio.run(run_queries(args.queries // 2, shared=True))
+        latencies += asyncio.run(run_queries(args.queries // 2, shared=True))
+        report(
+            "shared client (2 runs)",
+            latencies,
+            server.connection_count - connections,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import hashlib
+from typing import Dict, Sequence
+
+from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+from langchain_openai import ChatOpenAI
+from pydantic import SecretStr
+
+from chains import summarize_email_chain
+from chains.summarize_email_chain import system_prompt
+from core.settings import settings
+from schemas.email_summary_batch_schema import EmailSummaryBatchSchema
+
+llm = ChatOpenAI(
+    model="gpt-4.1-nano",
+    # The single-email chain's allowance, for each email of a pack
+    max_completion_tokens=300 * settings.SUMMARY_PACK_MAX_EMAILS,
+    api_key=SecretStr(settings.OPENAI_API_KEY),
+)
+
+human_prompt_template = HumanMessagePromptTemplate.from_template(
+    "Summarize each of the following emails on its own:\n\n"
+    "{emails}\n\n"
+    "Return a JSON object with one summary per email, each with the "
+    "message_id of its email, and use the same language as the email "
+    "content."
+)
+
+email_batch_summary_prompt_template = ChatPromptTemplate.from_messages([
+    system_prompt,
+    human_prompt_template,
+])
+
+structured_llm = llm.with_structured_output(EmailSummaryBatchSchema)
+
+chain = email_batch_summary_prompt_template | structured_llm
+
+# Version of summaries made when packing is on: the single-email chain's,
+# plus this prompt and the size limits of a pack
+PROMPT_VERSION = hashlib.sha256(
+    "\n".join([
+        summarize_email_chain.PROMPT_VERSION,
+        llm.model_name,
+        str(llm.max_tokens),
+        human_prompt_template.prompt.template,
+        str(settings.SUMMARY_PACK_TOKEN_BUDGET),
+        str(settings.SUMMARY_PACK_MAX_EMAIL_TOKENS),
+    ]).encode()
+).hexdigest()[:16]
+
+
+def format_emails(inputs: Sequence[Dict[str, str]]) -> str:
+    """
+    The {emails} variable: single-email chain inputs, each with its
+    message_id, one delimited block per email
+    """
+    return "\n\n".join(
+        f'<email message_id="{item["message_id"]}">\n'
+        f"Subject: {item['subject']}\n"
+        f"From: {item['sender']}\n"
+        f"Date: {item['date']}\n\n"
+        f"{item['body']}\n"
+        "</email>"
+        for item in inputs
+    )
@@ -1,3 +1,5 @@
+import hashlib
+
 from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
 from langchain_core.messages import SystemMessage
 from langchain_openai import ChatOpenAI
@@ -34,3 +36,17 @@ email_summary_prompt_template = ChatPromptTemplate.from_messages([
 structured_llm = llm.with_structured_output(EmailSummarySchema)
 
 chain = email_summary_prompt_template | structured_llm
+
+# Changes whenever the model, the prompt or the preprocessing of the body
+# (see loaders.token_budget.prepare_body) does, so summaries made from an
+# older prompt or a differently truncated body are not reused
+PROMPT_VERSION = hashlib.sha256(
+    "\n".join([
+        llm.model_name,
+        str(llm.max_tokens),
+        system_prompt.content,
+        human_prompt_template.prompt.template,
+        str(settings.SUMMARY_BODY_TOKEN_BUDGET),
+        settings.SUMMARY_BODY_TRUNCATION,
+    ]).encode()
+).hexdigest()[:16]
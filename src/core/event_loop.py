@@ -0,0 +1,27 @@
+import asyncio
+from functools import cache
+from typing import Any, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+
+@cache
+def _event_loop() -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    return loop
+
+
+def run(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    Like asyncio.run, but every call runs on the same event loop.
+
+    asyncio.run closes its loop, and with it every pooled connection, at
+    the end of each invocation. Keeping one loop per process lets warm
+    Lambda invocations reuse the shared clients of core.http_client and
+    core.supabase_client. Those clients keep their connection pool for
+    the lifetime of the loop they were created on; one from a previous
+    loop cannot be used (its connections belong to that loop), so each
+    registry replaces its clients when the running loop changes.
+    """
+    return _event_loop().run_until_complete(coro)
@@ -0,0 +1,77 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Dict
+
+import httpx
+
+from core.settings import settings
+
+
+@dataclass
+class PoolStats:
+    requests: int = 0
+    connections_opened: int = 0
+
+    @property
+    def reused_requests(self) -> int:
+        return max(0, self.requests - self.connections_opened)
+
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_client_loops: Dict[str, asyncio.AbstractEventLoop] = {}
+_pool_stats: Dict[str, PoolStats] = {}
+
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    """
+    Shared client for one outbound service (e.g. "gmail", "telegram"),
+    replaced when closed or when the running loop changes (see
+    core.event_loop.run)
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(name)
+    if client is None or client.is_closed or _client_loops[name] is not loop:
+        client = _create_client(name)
+        _clients[name] = client
+        _client_loops[name] = loop
+    return client
+
+
+def pool_stats() -> Dict[str, PoolStats]:
+    """Requests and new connections per client since the process started"""
+    return dict(_pool_stats)
+
+
+async def aclose_http_clients() -> None:
+    loop = asyncio.get_running_loop()
+    for name, client in list(_clients.items()):
+        if _client_loops[name] is loop:
+            await client.aclose()
+        del _clients[name]
+        del _client_loops[name]
+
+
+def _create_client(name: str) -> httpx.AsyncClient:
+    stats = _pool_stats.setdefault(name, PoolStats())
+
+    async def trace(event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            stats.connections_opened += 1
+
+    async def on_request(request: httpx.Request) -> None:
+        stats.requests += 1
+        request.extensions["trace"] = trace
+
+    return httpx.AsyncClient(
+        http2=settings.HTTP2_ENABLED,
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(
+            settings.HTTP_TIMEOUT_SECONDS,
+            connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS,
+        ),
+        event_hooks={"request": [on_request]},
+    )
@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens are added per second, up to
+    `capacity`.
+
+    A request costing more than the capacity waits for a full bucket and
+    leaves it in debt, so oversized requests are slowed down instead of
+    blocked forever.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._lock_loop: asyncio.AbstractEventLoop | None = None
+
+    async def acquire(self, tokens: float = 1) -> None:
+        # asyncio locks belong to one event loop, and a bucket may outlive
+        # the loop it was first used on
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+
+        async with self._lock:
+            needed = min(tokens, self.capacity)
+            self._refill()
+            if self._tokens < needed:
+                await asyncio.sleep((needed - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
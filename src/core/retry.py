@@ -0,0 +1,79 @@
+import asyncio
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable
+
+import httpx
+
+from core.settings import settings
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Google reports some quota errors as 403 instead of 429
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+def is_retryable(response: httpx.Response) -> bool:
+    if response.status_code in RETRYABLE_STATUS_CODES:
+        return True
+    if response.status_code != httpx.codes.FORBIDDEN:
+        return False
+    try:
+        errors = response.json().get("error", {}).get("errors", [])
+    except ValueError:
+        return False
+    return any(error.get("reason") in RATE_LIMIT_REASONS for error in errors)
+
+
+def retry_delay(attempt: int, response: httpx.Response | None = None) -> float:
+    """
+    Seconds to wait before retry number `attempt` (starting at 0): the
+    server's Retry-After when given, otherwise exponential backoff with
+    full jitter
+    """
+    max_delay = settings.HTTP_RETRY_MAX_DELAY_SECONDS
+    retry_after = _retry_after_seconds(response) if response else None
+    if retry_after is not None:
+        return min(retry_after, max_delay)
+
+    backoff = settings.HTTP_RETRY_BASE_DELAY_SECONDS * 2**attempt
+    return random.uniform(0, min(backoff, max_delay))  # noqa: S311
+
+
+async def send_with_retry(
+    send: Callable[[], Awaitable[httpx.Response]],
+    max_retries: int = settings.HTTP_MAX_RETRIES,
+) -> httpx.Response:
+    """
+    Call `send` until it returns a non-retryable response or retries run
+    out; the last attempt's response (or transport error) is returned
+    """
+    for attempt in range(max_retries):
+        try:
+            response = await send()
+        except httpx.TransportError:
+            await asyncio.sleep(retry_delay(attempt))
+            continue
+
+        if not is_retryable(response):
+            return response
+        await asyncio.sleep(retry_delay(attempt, response))
+
+    return await send()
+
+
+def _retry_after_seconds(response: httpx.Response) -> float | None:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
@@ -93,5 +93,121 @@ class Settings(BaseSettings):
         "LANGCHAIN_TRACING_PROJECT", ""
     )
 
+    HTTP2_ENABLED: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    HTTP_TIMEOUT_SECONDS: float = 30.0
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    HTTP_MAX_RETRIES: int = 5
+    HTTP_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    HTTP_RETRY_MAX_DELAY_SECONDS: float = 32.0
+
+    # Active mail accounts read per query by the dispatcher
+    DISPATCH_PAGE_SIZE: int = 500
+    # all: every active account on each run (one daily trigger).
+    # scheduled: only accounts whose digest time falls in the current slot;
+    # the dispatcher must then run every DISPATCH_SLOT_MINUTES
+    DISPATCH_MODE: str = "all"
+    DISPATCH_SLOT_MINUTES: int = 15
+
+    # Empty for AWS; set to a local stand-in (e.g. moto) to test against
+    SQS_ENDPOINT_URL: str = ""
+    SQS_SEND_CONCURRENCY: int = 8
+    SQS_SEND_MAX_RETRIES: int = 3
+
+    # memory, tmp or supabase. Tokens are always cached in memory, the
+    # other two also persist them for cold starts
+    GOOGLE_TOKEN_CACHE: str = "memory"
+    GOOGLE_TOKEN_CACHE_DIR: str = "/tmp/google-tokens"
+    # Cached tokens are refreshed this long before Google expires them
+    GOOGLE_TOKEN_EXPIRY_MARGIN_SECONDS: int = 300
+
+    # Gmail allows 250 quota units per user per second
+    GMAIL_QUOTA_UNITS_PER_SECOND: float = 250.0
+    GMAIL_FETCH_CONCURRENCY: int = 10
+    GMAIL_BATCH_THRESHOLD: int = 20
+    # A batch is charged for every sub-request (5 units per messages.get)
+    # and waits for its whole cost in the quota bucket: 50 messages would
+    # empty it, so a chunk fetched ahead waits a second for the one before.
+    # With 25, two chunks' batches fit in one second of quota. Batches
+    # save round trips, not quota: a run that is quota bound takes as long
+    # either way. Gmail also rate limits batches over 50 sub-requests.
+    GMAIL_BATCH_SIZE: int = 25
+    # Chunks of GMAIL_BATCH_SIZE messages fetched ahead of the one being
+    # consumed; listing waits once that many are pending
+    GMAIL_FETCH_AHEAD_CHUNKS: int = 2
+    GMAIL_LIST_PAGE_SIZE: int = 100
+    GMAIL_MAX_MESSAGES_PER_RUN: int = 500
+    GMAIL_INCREMENTAL_SYNC: bool = True
+    # Decoded size a message body is cut to before text extraction
+    GMAIL_MAX_BODY_BYTES: int = 256 * 1024
+
+    # One of loaders.body_extractors.HTML_EXTRACTORS: stream, lxml, bs4
+    BODY_EXTRACTION_ENGINE: str = "stream"
+    BODY_MAX_CHARS: int = 20_000
+    # thread, process or inline. Lambda has no /dev/shm, so process pools
+    # only work outside of it (e.g. local runs and benchmarks)
+    BODY_PARSER_POOL: str = "thread"
+    BODY_PARSER_POOL_SIZE: int = 2
+    BODY_PARSER_INLINE_MAX_BYTES: int = 16 * 1024
+
+    # Where digest stage checkpoints are kept: supabase, sqlite or none.
+    # supabase needs supabase/migrations/*_digest_checkpoints.sql applied
+    CHECKPOINT_STORE: str = "supabase"
+    CHECKPOINT_SQLITE_PATH: str = "/tmp/digest_checkpoints.sqlite3"
+    # Days checkpoints are kept after their digest date; the Supabase
+    # table is purged by the pg_cron job of its migration
+    CHECKPOINT_RETENTION_DAYS: int = 7
+    # Summaries produced between two checkpoint saves
+    CHECKPOINT_SAVE_EVERY: int = 10
+
+    # Per-message summary cache: memory, sqlite, supabase or none
+    SUMMARY_CACHE: str = "memory"
+    SUMMARY_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    SUMMARY_CACHE_MAX_ENTRIES: int = 10_000
+    SUMMARY_CACHE_SQLITE_PATH: str = "/tmp/email_summary_cache.sqlite3"
+    # Share summaries of identical bulk mail (newsletters, list posts)
+    # across accounts, through the same backend
+    SHARED_SUMMARY_DEDUP: bool = True
+    # Grouping below holds every fetched email in memory and only starts
+    # summarizing once fetching is done, so it is off by default.
+    # Summarize each thread once, from its messages without quoted replies
+    SUMMARY_THREAD_COLLAPSING: bool = False
+    # Summarize near-duplicate emails from one sender (alerts,
+    # notifications) once: those with the same subject apart from its
+    # numbers whose word shingles overlap at least
+    # NEAR_DUPLICATE_MIN_SIMILARITY (Jaccard, estimated with MinHash).
+    # Distinct alerts built from one template can score 0.75.
+    NEAR_DUPLICATE_CLUSTERING: bool = False
+    NEAR_DUPLICATE_MIN_SIMILARITY: float = 0.8
+
+    # Tokens of an email body sent to the summary chain, after quoted
+    # history and signatures are stripped. Longer bodies keep their start
+    # and end (head_tail) or only their start (head)
+    SUMMARY_BODY_TOKEN_BUDGET: int = 2000
+    SUMMARY_BODY_TRUNCATION: str = "head_tail"
+    # Where tiktoken reads its encoding from, shipped with the code: fill
+    # it with `PYTHONPATH=src python -m loaders.token_budget` before
+    # building (the deploy workflows do). Outside Lambda, tokens are
+    # estimated when the encoding is not there; in Lambda it is an error.
+    TIKTOKEN_CACHE_DIR: str = os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "tiktoken_cache"
+    )
+    # Summarize short emails several to a request, as one list keyed by
+    # message id, instead of one request each
+    SUMMARY_PACKING: bool = False
+    SUMMARY_PACK_TOKEN_BUDGET: int = 4000
+    SUMMARY_PACK_MAX_EMAILS: int = 10
+    # Emails with longer bodies are always summarized alone
+    SUMMARY_PACK_MAX_EMAIL_TOKENS: int = 600
+
+    # Accounts of one SQS batch the worker processes at the same time
+    WORKER_ACCOUNT_CONCURRENCY: int = 4
+    SUMMARY_CONCURRENCY: int = 8
+    SUMMARY_QUEUE_SIZE: int = 16
+    # Extra attempts at listed emails a run failed to fetch or summarize
+    SUMMARY_PENDING_RETRIES: int = 1
+
 
 settings = Settings()  # type: ignore
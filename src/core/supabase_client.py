@@ -1,10 +1,32 @@
-from supabase import AsyncClient, acreate_client
+import asyncio
+from typing import Dict
 
 from core.settings import settings
+from supabase import AsyncClient, AsyncClientOptions, acreate_client
 
 url: str = settings.SUPABASE_URL
 key: str = settings.SUPABASE_SERVICE_KEY
 
+_clients: Dict[str, AsyncClient] = {}
+_client_loops: Dict[str, asyncio.AbstractEventLoop] = {}
 
-async def create_supabase_client() -> AsyncClient:
-    return await acreate_client(url, key)
+
+async def get_supabase_client() -> AsyncClient:
+    """
+    Process-wide Supabase client, created on first use and replaced when
+    the running loop changes (see core.event_loop.run)
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get("default")
+    if client is None or _client_loops["default"] is not loop:
+        client = await acreate_client(
+            url,
+            key,
+            options=AsyncClientOptions(
+                auto_refresh_token=False,
+                persist_session=False,
+            ),
+        )
+        _clients["default"] = client
+        _client_loops["default"] = loop
+    return client
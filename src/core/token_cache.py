@@ -0,0 +1,58 @@
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict
+
+
+@dataclass(slots=True)
+class CachedToken:
+    access_token: str
+    # Unix timestamp
+    expires_at: float
+
+    def is_fresh(self, margin: float = 0) -> bool:
+        return time.time() + margin < self.expires_at
+
+
+class MemoryTokenStore:
+    def __init__(self):
+        self._tokens: Dict[str, CachedToken] = {}
+
+    def get(self, key: str) -> CachedToken | None:
+        return self._tokens.get(key)
+
+    def set(self, key: str, token: CachedToken) -> None:
+        self._tokens[key] = token
+
+
+class FileTokenStore:
+    """
+    One JSON file per key, readable by the owner only.
+
+    On Lambda the directory lives in /tmp, which survives warm starts of
+    the same execution environment but not cold starts.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def get(self, key: str) -> CachedToken | None:
+        try:
+            return CachedToken(**json.loads(self._path(key).read_text()))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def set(self, key: str, token: CachedToken) -> None:
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as file:
+            json.dump(asdict(token), file)
+        # Atomic, so a concurrent reader never sees a partial file
+        tmp_path.replace(path)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
@@ -1,37 +1,126 @@
 import asyncio
 import json
 import os
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
-import boto3
-
+from core import event_loop
 from core.logger import L
-from core.supabase_client import create_supabase_client
+from core.settings import settings
+from core.supabase_client import get_supabase_client
+from domain.user import User
+from services import schedule_service, sqs_service
 
 SQS_QUEUE_URL = os.environ.get("SQS_QUEUE_URL")
-sqs = boto3.client("sqs")
+# Scheduled mode also needs each owner's digest time and timezone
+SCHEDULED_ACCOUNT_COLUMNS = "id, users!inner(id, digest_time, timezone)"
+
 
+async def iter_active_mail_accounts(
+    page_size: int = settings.DISPATCH_PAGE_SIZE, *, logger
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Yield pages of active mail accounts, keyset-paginated on id.
 
-async def get_active_mail_accounts_from_db(*, logger):
+    The next page is already being fetched while the caller works on the
+    current one. Paging stops on the first empty page, so a server-side
+    row limit below page_size cannot end it early.
+    """
     logger.info("Searching for active mail accounts in the database...")
-    supabase = await create_supabase_client()
-    try:
-        response = (
-            await supabase.table("mail_accounts")
-            .select("id")
-            .eq("is_active", True)
-            .execute()
+    supabase = await get_supabase_client()
+    next_page = asyncio.create_task(
+        _fetch_active_mail_accounts_page(
+            supabase, None, page_size, logger=logger
         )
-        active_mail_accounts = response.data
-
-        logger.success(
-            f"{len(active_mail_accounts)} mail active accounts found."
+    )
+    try:
+        while page := await next_page:
+            next_page = asyncio.create_task(
+                _fetch_active_mail_accounts_page(
+                    supabase, page[-1]["id"], page_size, logger=logger
+                )
+            )
+            yield page
+    finally:
+        next_page.cancel()
+
+
+async def _fetch_active_mail_accounts_page(
+    supabase, after_id: str | None, page_size: int, *, logger
+) -> List[Dict[str, Any]]:
+    query = (
+        supabase.table("mail_accounts")
+        .select(
+            SCHEDULED_ACCOUNT_COLUMNS
+            if settings.DISPATCH_MODE == "scheduled"
+            else "id"
         )
-        return active_mail_accounts
+        .eq("is_active", True)
+        .order("id")
+        .limit(page_size)
+    )
+    if after_id:
+        query = query.gt("id", after_id)
+    try:
+        response = await query.execute()
+        return response.data
     except Exception as e:
         logger.exception(f"Error fetching active mail accounts: {e}")
         raise e
 
 
+def due_mail_accounts(
+    mail_accounts: List[Dict[str, Any]], slot_start: datetime
+) -> List[Dict[str, Any]]:
+    due = []
+    for mail_account in mail_accounts:
+        owner = mail_account.get("users") or {}
+        # Missing preferences fall back to the User defaults
+        user = User(**{k: v for k, v in owner.items() if v is not None})
+        if schedule_service.is_digest_due(
+            user.digest_time,
+            user.timezone,
+            slot_start,
+            settings.DISPATCH_SLOT_MINUTES,
+        ):
+            due.append(mail_account)
+    return due
+
+
+async def dispatch_mail_accounts(
+    mail_accounts: List[Dict[str, Any]], spread: bool = False, *, logger
+) -> Tuple[int, int]:
+    """
+    Enqueue one job per mail account. With `spread`, jobs get a
+    DelaySeconds that spreads them over the scheduling slot.
+    """
+    messages = {}
+    delays = {}
+    skipped_count = 0
+    for mail_account in mail_accounts:
+        mail_account_id = mail_account.get("id")
+        if not mail_account_id:
+            logger.info(
+                f"Skipping mail account with missing id: {mail_account}"
+            )
+            skipped_count += 1
+            continue
+        # Mail account ids are UUIDs, which are valid batch entry ids
+        messages[mail_account_id] = json.dumps({
+            "mail_account_id": mail_account_id
+        })
+        if spread:
+            delays[mail_account_id] = schedule_service.spread_delay_seconds(
+                mail_account_id, settings.DISPATCH_SLOT_MINUTES
+            )
+
+    success_count, failure_count = await sqs_service.send_messages(
+        SQS_QUEUE_URL, messages, delays, logger=logger
+    )
+    logger.success(f"{success_count} messages sent to SQS.")
+    return success_count, failure_count + skipped_count
+
+
 async def main_logic(event, context, *, logger):
     if not SQS_QUEUE_URL:
         raise EnvironmentError(
@@ -39,11 +128,38 @@ async def main_logic(event, context, *, logger):
             "Please configure it."
         )
 
-    active_mail_accounts = await get_active_mail_accounts_from_db(
-        logger=logger
-    )
+    slot_start = None
+    if settings.DISPATCH_MODE == "scheduled":
+        slot_start = schedule_service.current_slot(
+            _event_time(event), settings.DISPATCH_SLOT_MINUTES
+        )
+        logger.info(
+            f"Dispatching digests due in the {settings.DISPATCH_SLOT_MINUTES}"
+            f" minute slot starting at {slot_start.isoformat()}"
+        )
 
-    if not active_mail_accounts:
+    total_accounts = 0
+    success_count = 0
+    failure_count = 0
+
+    async for page in iter_active_mail_accounts(logger=logger):
+        mail_accounts = (
+            due_mail_accounts(page, slot_start) if slot_start else page
+        )
+        if not mail_accounts:
+            continue
+        total_accounts += len(mail_accounts)
+        logger.info(
+            f"Dispatching page of {len(mail_accounts)} active mail accounts."
+        )
+        # The next page loads while this one is being sent
+        sent, failed = await dispatch_mail_accounts(
+            mail_accounts, spread=slot_start is not None, logger=logger
+        )
+        success_count += sent
+        failure_count += failed
+
+    if not total_accounts:
         logger.info("No active mail accounts found to process.")
         return {
             "statusCode": 200,
@@ -52,53 +168,33 @@ async def main_logic(event, context, *, logger):
             }),
         }
 
-    logger.info(
-        f"Found {len(active_mail_accounts)} active mail accounts to process."
-    )
-    success_count = 0
-    failure_count = 0
-
-    for mail_account in active_mail_accounts:
-        mail_account_id = mail_account.get("id")
-        if not mail_account_id:
-            logger.info(
-                f"Skipping mail account with missing id: {mail_account}"
-            )
-            failure_count += 1
-            continue
-        try:
-            message_body = json.dumps({"mail_account_id": mail_account_id})
-            sqs.send_message(QueueUrl=SQS_QUEUE_URL, MessageBody=message_body)
-            logger.success(
-                f"Message sent to SQS for mail_account_id: {mail_account_id}"
-            )
-            success_count += 1
-        except Exception as e:
-            logger.exception(
-                f"Failed to send message for mail_account_id {mail_account_id}"
-                f": {e}"
-            )
-            failure_count += 1
-
     logger.success(
-        f"Process completed: {success_count} successful, "
-        f"{failure_count} failed."
+        f"Process completed: {total_accounts} accounts, "
+        f"{success_count} successful, {failure_count} failed."
     )
     return {
         "statusCode": 200,
         "body": json.dumps({
             "message": "Process completed.",
-            "total_accounts": len(active_mail_accounts),
+            "total_accounts": total_accounts,
             "success_count": success_count,
             "failure_count": failure_count,
         }),
     }
 
 
+def _event_time(event) -> datetime:
+    # Scheduled events carry the time they were triggered for, which
+    # keeps the slot right when the invocation starts late
+    if isinstance(event, dict) and event.get("time"):
+        return datetime.fromisoformat(event["time"])
+    return datetime.now(timezone.utc)
+
+
 def lambda_handler(event, context):
     request_id = context.aws_request_id if context else "local"
     logger = L(request_id)
 
     logger.info("Iniciando execução do dispatcher.")
 
-    return asyncio.run(main_logic(event, context, logger=logger))
+    return event_loop.run(main_logic(event, context, logger=logger))
@@ -0,0 +1,17 @@
+from typing import List
+
+from pydantic import BaseModel, ConfigDict
+
+from domain.delivery_channel import DeliveryChannel
+from domain.mail_account import MailAccount
+from domain.user import User
+
+
+class AccountContext(BaseModel):
+    """Everything a digest run needs to know about one mail account"""
+
+    model_config = ConfigDict(from_attributes=True)
+
+    mail_account: MailAccount
+    user: User
+    active_delivery_channels: List[DeliveryChannel]
@@ -0,0 +1,91 @@
+import uuid
+from datetime import date, datetime, timezone
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from schemas.email_summary_schema import EmailSummarySchema
+
+
+class DigestStage(Enum):
+    LIST = "LIST"
+    FETCH = "FETCH"
+    SUMMARIZE = "SUMMARIZE"
+    AGGREGATE = "AGGREGATE"
+    DELIVER = "DELIVER"
+    DONE = "DONE"
+
+
+class DigestCheckpoint(BaseModel):
+    """
+    Progress of one account's digest for one date.
+
+    Each stage's output is kept so a redelivered job resumes at the first
+    incomplete stage. Fetched emails are not stored: fetching is redone for
+    the messages that have no summary yet.
+    """
+
+    model_config = ConfigDict(from_attributes=True)
+
+    mail_account_id: uuid.UUID
+    digest_date: date
+    # LIST. Ids are recorded page by page as they are listed, and
+    # summarized meanwhile; listed is set once the last page is in
+    message_ids: Optional[List[str]] = None
+    history_id: Optional[str] = None
+    listed: bool = False
+    # FETCH + SUMMARIZE, by message id
+    summaries: Dict[str, EmailSummarySchema] = Field(default_factory=dict)
+    # Emails a summary covers, by the message id it is kept under, when a
+    # thread or near-duplicates were summarized once
+    groups: Dict[str, List[str]] = Field(default_factory=dict)
+    # Messages the mail filter skipped, with the rule that skipped them
+    filtered: Dict[str, str] = Field(default_factory=dict)
+    summarized: bool = False
+    # AGGREGATE
+    aggregated_summary: Optional[str] = None
+    # DELIVER. delivery_started_at without delivered_at means a run died
+    # mid-send, and the digest may or may not have gone out
+    delivery_started_at: Optional[datetime] = None
+    delivered_at: Optional[datetime] = None
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+
+    @property
+    def stage(self) -> DigestStage:
+        """First incomplete stage"""
+        if self.delivered_at or self.delivery_started_at:
+            return DigestStage.DONE
+        if self.aggregated_summary is not None:
+            return DigestStage.DELIVER
+        if self.summarized:
+            return DigestStage.AGGREGATE
+        if not self.listed:
+            return DigestStage.LIST
+        if self.summaries:
+            return DigestStage.SUMMARIZE
+        return DigestStage.FETCH
+
+    def pending_message_ids(self) -> List[str]:
+        """Listed messages neither filtered out nor covered by a summary"""
+        covered = set(self.summaries) | set(self.filtered)
+        for message_id in self.summaries:
+            covered.update(self.groups.get(message_id, ()))
+        return [
+            message_id
+            for message_id in self.message_ids or []
+            if message_id not in covered
+        ]
+
+    def ordered_summaries(self) -> List[Tuple[EmailSummarySchema, int]]:
+        """Summaries in listing order, with how many emails each covers"""
+        return [
+            (
+                self.summaries[message_id],
+                len(self.groups.get(message_id, ())) or 1,
+            )
+            for message_id in self.message_ids or []
+            if message_id in self.summaries
+        ]
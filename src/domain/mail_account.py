@@ -26,6 +26,7 @@ class MailAccount(BaseModel):
     account_email: str
     credentials: Optional[Dict[str, Any]] = None
     is_active: bool = True
+    last_history_id: Optional[str] = None
 
     def deactivate(self):
         self.is_active = False
@@ -0,0 +1,34 @@
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class MailFilterAction(Enum):
+    SKIP = "SKIP"
+    KEEP = "KEEP"
+
+
+class MailFilterRule(BaseModel):
+    """
+    Conditions on a message's metadata (labels, headers and size). A rule
+    matches when every condition it sets holds; one that sets none
+    matches every message.
+    """
+
+    model_config = ConfigDict(from_attributes=True)
+
+    name: str
+    action: MailFilterAction = MailFilterAction.SKIP
+    # Any of these Gmail label ids, e.g. CATEGORY_PROMOTIONS
+    labels: List[str] = Field(default_factory=list)
+    # Any of these shell-style patterns on the sender address, e.g.
+    # "noreply@*" or "*@notifications.example.com"
+    sender_patterns: List[str] = Field(default_factory=list)
+    # Whether the message has a List-Unsubscribe header
+    list_unsubscribe: Optional[bool] = None
+    # Whether its Precedence header is bulk, list or junk
+    bulk_precedence: Optional[bool] = None
+    # Bounds on Gmail's sizeEstimate, attachments included
+    min_size_bytes: Optional[int] = None
+    max_size_bytes: Optional[int] = None
@@ -1,8 +1,11 @@
 import uuid
-from typing import Any, Dict, Optional
+from datetime import time
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, ConfigDict
 
+from domain.mail_filter_rule import MailFilterRule
+
 
 class User(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -12,3 +15,9 @@ class User(BaseModel):
     avatar_url: Optional[str] = None
     billing_address: Optional[Dict[str, Any]] = None
     payment_method: Optional[Dict[str, Any]] = None
+    # Local time the daily digest is sent at, in the user's IANA timezone
+    digest_time: time = time(23, 0)
+    timezone: str = "UTC"
+    # Rules deciding which mail makes it into the digest (jsonb column);
+    # None means loaders.mail_filter.DEFAULT_RULES
+    mail_filter_rules: Optional[List[MailFilterRule]] = None
@@ -0,0 +1,212 @@
+import asyncio
+import base64
+import re
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from functools import cache
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, List, Tuple
+
+from bs4 import BeautifulSoup
+
+from core.settings import settings
+
+TEXT_MIME_TYPES = ("text/plain", "text/html")
+
+SKIPPED_TAGS = {"head", "noscript", "script", "style", "template", "title"}
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl",
+    "dt", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hr", "li", "main", "nav", "ol", "p", "pre", "section", "table", "tbody",
+    "td", "tfoot", "th", "thead", "tr", "ul",
+}  # fmt: skip
+
+# HTML is fed to the streaming parser in chunks of this size so it can
+# stop as soon as max_chars of text have been produced
+FEED_CHUNK_SIZE = 16 * 1024
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class _StreamingTextExtractor(HTMLParser):
+    """Collect visible text, one collapsed line per HTML block"""
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.lines: List[str] = []
+        self.length = 0
+        self.done = False
+        self._chunks: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._end_line()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self._end_line()
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self._end_line()
+
+    def handle_data(self, data):
+        if not self._skip_depth and not self.done:
+            # Text nodes are split by inline tags (and feed chunks), so
+            # whitespace is only collapsed once the whole line is known
+            self._chunks.append(data)
+
+    def close(self):
+        super().close()
+        self._end_line()
+
+    def _end_line(self):
+        line = " ".join("".join(self._chunks).split())
+        self._chunks = []
+        if not line:
+            return
+        self.lines.append(line)
+        self.length += len(line) + 1
+        if self.length >= self.max_chars:
+            self.done = True
+
+
+def _collapse_lines(text: str) -> str:
+    lines = (
+        _WHITESPACE_RE.sub(" ", line).strip() for line in text.split("\n")
+    )
+    return "\n".join(line for line in lines if line)
+
+
+def html_to_text_stream(html: str, max_chars: int) -> str:
+    parser = _StreamingTextExtractor(max_chars)
+    for start in range(0, len(html), FEED_CHUNK_SIZE):
+        parser.feed(html[start : start + FEED_CHUNK_SIZE])
+        if parser.done:
+            break
+    parser.close()
+    return "\n".join(parser.lines)[:max_chars]
+
+
+def html_to_text_lxml(html: str, max_chars: int) -> str:
+    try:
+        import lxml.html  # noqa: PLC0415
+    except ImportError:
+        return html_to_text_stream(html, max_chars)
+
+    if not html.strip():
+        return ""
+
+    tree = lxml.html.document_fromstring(html)
+    for element in list(tree.iter(*SKIPPED_TAGS)):
+        element.drop_tree()
+    for element in tree.iter(*BLOCK_TAGS):
+        element.tail = f"\n{element.tail or ''}"
+        if element.tag != "br":
+            element.text = f"\n{element.text or ''}"
+    return _collapse_lines(tree.text_content())[:max_chars]
+
+
+def html_to_text_bs4(html: str, max_chars: int) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    return _collapse_lines(soup.get_text())[:max_chars]
+
+
+HTML_EXTRACTORS: Dict[str, Callable[[str, int], str]] = {
+    "stream": html_to_text_stream,
+    "lxml": html_to_text_lxml,
+    "bs4": html_to_text_bs4,
+}
+
+
+def plain_to_text(text: str, max_chars: int) -> str:
+    lines = []
+    length = 0
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        lines.append(line)
+        length += len(line) + 1
+        if length >= max_chars:
+            break
+    return "\n".join(lines)[:max_chars]
+
+
+def find_text_part(payload: Dict[str, Any]) -> Tuple[str, str] | None:
+    """
+    Return (mime type, base64 data) of the first text/plain or text/html
+    part in the MIME tree, walking nested multiparts depth first
+    """
+    if payload.get("parts"):
+        for part in payload["parts"]:
+            found = find_text_part(part)
+            if found:
+                return found
+        return None
+
+    data = payload.get("body", {}).get("data")
+    if data and payload.get("mimeType") in TEXT_MIME_TYPES:
+        return payload["mimeType"], data
+    return None
+
+
+def extract_text(
+    mime_type: str,
+    data: str,
+    max_chars: int = settings.BODY_MAX_CHARS,
+    engine: str = settings.BODY_EXTRACTION_ENGINE,
+) -> str:
+    """Decode a base64url Gmail body and return its cleaned text"""
+    # Cap the encoded body first so huge bodies are never fully decoded
+    max_encoded_chars = settings.GMAIL_MAX_BODY_BYTES // 3 * 4
+    if max_encoded_chars and len(data) > max_encoded_chars:
+        data = data[:max_encoded_chars]
+
+    content = base64.urlsafe_b64decode(data).decode("utf-8", errors="replace")
+    if mime_type == "text/html":
+        return HTML_EXTRACTORS[engine](content, max_chars)
+    return plain_to_text(content, max_chars)
+
+
+async def aextract_text(
+    mime_type: str,
+    data: str,
+    max_chars: int = settings.BODY_MAX_CHARS,
+    engine: str = settings.BODY_EXTRACTION_ENGINE,
+) -> str:
+    """
+    extract_text off the event loop, on the BODY_PARSER_POOL executor.
+
+    Bodies smaller than BODY_PARSER_INLINE_MAX_BYTES are parsed inline,
+    where handing them to the pool would cost more than the parsing.
+    """
+    executor = _get_executor()
+    if not executor or len(data) < settings.BODY_PARSER_INLINE_MAX_BYTES:
+        return extract_text(mime_type, data, max_chars, engine)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, extract_text, mime_type, data, max_chars, engine
+    )
+
+
+@cache
+def _get_executor() -> Executor | None:
+    if settings.BODY_PARSER_POOL == "thread":
+        return ThreadPoolExecutor(
+            max_workers=settings.BODY_PARSER_POOL_SIZE,
+            thread_name_prefix="body-parser",
+        )
+    if settings.BODY_PARSER_POOL == "process":
+        return ProcessPoolExecutor(max_workers=settings.BODY_PARSER_POOL_SIZE)
+    return None
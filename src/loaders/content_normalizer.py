@@ -0,0 +1,105 @@
+import re
+from email.utils import parseaddr
+from typing import Sequence
+
+# Headers that mark mail sent to a list rather than to one person
+BULK_HEADERS = ("List-Unsubscribe", "List-Id")
+BULK_PRECEDENCES = {"bulk", "list", "junk"}
+
+_URL_RE = re.compile(r"https?://([^/\s?#>\"')]+)[^\s>\"')]*", re.IGNORECASE)
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Long runs mixing letters and digits: tracking ids, coupon codes, hashes
+_TOKEN_RE = re.compile(r"\b(?=[A-Za-z0-9_-]*\d)[A-Za-z0-9_-]{16,}\b")
+_GREETING_RE = re.compile(
+    r"^(?:hi|hello|hey|dear|ol[aá]|oi|prezad[oa]|caro|cara)\b[^\n]{0,40}$",
+    re.IGNORECASE | re.MULTILINE,
+)
+_WHITESPACE_RE = re.compile(r"[ \t]+")
+# Where a reply starts quoting the message it answers: "On <date>, <name>
+# wrote:" (wrapped over two lines by some clients), its pt-BR form, and
+# Outlook's "Original Message" or "From:" / "Sent:" blocks
+_REPLY_HEADER_RE = re.compile(
+    r"^(?:(?:On|Em)\s[^\n]*(?:\n[^\n]*)?\s(?:wrote|escreveu):[ \t]*$"
+    r"|-{2,}\s*(?:Original Message|Mensagem original)\s*-{2,}"
+    r"|(?:From|De):[^\n]*\n(?:Sent|Enviado|Date|Data):)",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Where a forwarded message starts (Gmail, Apple Mail and pt-BR clients).
+# Its own header block looks like a quoted reply's, but it is content
+_FORWARD_RE = re.compile(
+    r"^[ \t]*-*[ \t]*(?:Forwarded message|Begin forwarded message"
+    r"|Mensagem encaminhada|In[ií]cio da mensagem encaminhada)",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Where a signature starts: the "-- " delimiter, an underscore rule, or a
+# mobile client's footer
+_SIGNATURE_RE = re.compile(
+    r"^(?:--[ \t]*|_{2,}[ \t]*|(?:Sent from|Enviado do|Get Outlook for"
+    r"|Obter o Outlook para)\s[^\n]*)$",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Lines a signature may span; a delimiter followed by more is taken to be
+# part of the message
+SIGNATURE_MAX_LINES = 12
+
+
+def is_bulk(headers: Sequence[dict]) -> bool:
+    """Whether the message headers mark it as list or bulk mail"""
+    for header in headers:
+        name = header.get("name", "")
+        if name in BULK_HEADERS:
+            return True
+        if (
+            name == "Precedence"
+            and header.get("value", "").strip().lower() in BULK_PRECEDENCES
+        ):
+            return True
+    return False
+
+
+def normalize_broadcast_text(text: str) -> str:
+    """
+    Strip what differs between recipients of the same broadcast: links
+    are cut to their host (paths and queries carry tracking tokens),
+    addresses, long tokens and greeting lines are dropped
+    """
+    text = _URL_RE.sub(r"<\1>", text)
+    text = _EMAIL_RE.sub("<email>", text)
+    text = _TOKEN_RE.sub("<token>", text)
+    text = _GREETING_RE.sub("", text)
+    lines = (
+        _WHITESPACE_RE.sub(" ", line).strip() for line in text.split("\n")
+    )
+    return "\n".join(line for line in lines if line)
+
+
+def strip_quoted_reply(text: str) -> str:
+    """
+    Text of a reply without the history it quotes: everything from the
+    reply header on, and ">" lines. A forwarded message is kept whole,
+    unless it is itself part of the quoted history. Returned unchanged
+    when nothing would be left.
+    """
+    forward = _FORWARD_RE.search(text)
+    end = forward.start() if forward else len(text)
+    match = _REPLY_HEADER_RE.search(text, 0, end)
+    reply = text[: match.start()] if match else text[:end]
+    forwarded = "" if match else text[end:]
+    stripped = "\n".join(
+        line for line in reply.split("\n") if not line.lstrip().startswith(">")
+    )
+    return f"{stripped}\n{forwarded}".strip() or text
+
+
+def strip_signature(text: str) -> str:
+    """Text without the signature that ends it, if any"""
+    for match in _SIGNATURE_RE.finditer(text):
+        rest = text[match.end() :].strip()
+        if rest.count("\n") < SIGNATURE_MAX_LINES:
+            return text[: match.start()].rstrip() or text
+    return text
+
+
+def sender_address(sender: str) -> str:
+    """Lowercased address of a From header, without the display name"""
+    return parseaddr(sender)[1].lower()
@@ -0,0 +1,193 @@
+import heapq
+import re
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Dict, FrozenSet, List, Sequence, Tuple
+
+from loaders import content_normalizer
+from loaders.email_record import EmailRecord
+
+# Words per shingle: emails are compared by the sets of their shingles
+SHINGLE_SIZE = 3
+# Smallest shingle hashes kept per email (a bottom-k MinHash sketch);
+# emails with fewer shingles are compared exactly
+SKETCH_SIZE = 128
+# Only the start of an email goes into its sketch
+SKETCH_MAX_CHARS = 5000
+# Shorter emails ("Thanks!", "Ok") are never clustered: too little text
+# to tell a duplicate from a coincidence
+NEAR_DUPLICATE_MIN_WORDS = 10
+
+_WORD_RE = re.compile(r"\w+")
+_DIGITS_RE = re.compile(r"\d+")
+
+
+@dataclass(slots=True)
+class EmailGroup:
+    """
+    Emails summarized once: a thread merged into one record, or
+    near-duplicate emails represented by the first of them
+    """
+
+    email: EmailRecord
+    message_ids: List[str]
+
+    @property
+    def size(self) -> int:
+        return len(self.message_ids)
+
+
+@dataclass(slots=True)
+class _Cluster:
+    group: EmailGroup
+    sketch: FrozenSet[int]
+
+
+def group_emails(
+    emails: Sequence[EmailRecord],
+    *,
+    collapse_threads: bool,
+    min_similarity: float | None,
+    max_chars: int,
+) -> List[EmailGroup]:
+    """
+    Group emails to summarize together, in listing order: messages of a
+    thread are merged (see merge_thread), then groups from the same
+    sender, with the same subject apart from its numbers, whose texts
+    have an estimated shingle Jaccard similarity of at least
+    min_similarity are clustered. None turns clustering off.
+    """
+    if collapse_threads:
+        threads: Dict[str, List[EmailRecord]] = {}
+        for email in emails:
+            threads.setdefault(email.thread_id or email.id, []).append(email)
+        groups = [
+            EmailGroup(
+                merge_thread(members, max_chars)
+                if len(members) > 1
+                else members[0],
+                [member.id for member in members],
+            )
+            for members in threads.values()
+        ]
+    else:
+        groups = [EmailGroup(email, [email.id]) for email in emails]
+
+    if min_similarity is None:
+        return groups
+    return _cluster_near_duplicates(groups, min_similarity)
+
+
+def merge_thread(emails: Sequence[EmailRecord], max_chars: int) -> EmailRecord:
+    """
+    One record for the messages of a thread, oldest first, each without
+    the history it quotes. It takes the id of the newest message, and
+    keeps the end of the conversation when longer than max_chars.
+    """
+    ordered = sorted(emails, key=_timestamp)
+    latest = ordered[-1]
+    body = "\n\n".join(
+        f"[{email.date}] {email.sender}:\n"
+        f"{content_normalizer.strip_quoted_reply(email.body)}"
+        for email in ordered
+    )
+    return EmailRecord(
+        id=latest.id,
+        thread_id=latest.thread_id,
+        subject=ordered[0].subject,
+        sender=", ".join(dict.fromkeys(email.sender for email in ordered)),
+        date=latest.date,
+        labels=tuple(
+            dict.fromkeys(label for email in ordered for label in email.labels)
+        ),
+        body=body[-max_chars:],
+        is_bulk=all(email.is_bulk for email in ordered),
+    )
+
+
+def sketch(text: str) -> FrozenSet[int] | None:
+    """
+    MinHash sketch of the text's word shingles, after the same
+    normalization as shared bulk mail and with numbers masked; None when
+    the text is too short
+    """
+    words = _WORD_RE.findall(
+        _DIGITS_RE.sub(
+            "0",
+            content_normalizer.normalize_broadcast_text(
+                text[:SKETCH_MAX_CHARS]
+            ),
+        ).lower()
+    )
+    if len(words) < NEAR_DUPLICATE_MIN_WORDS:
+        return None
+    # Sketches are only compared within one run, so the process-salted
+    # built-in hash is enough
+    hashes = {
+        hash(" ".join(words[start : start + SHINGLE_SIZE]))
+        for start in range(len(words) - SHINGLE_SIZE + 1)
+    }
+    return frozenset(heapq.nsmallest(SKETCH_SIZE, hashes))
+
+
+def subject_key(subject: str) -> str:
+    """
+    Subject with its numbers masked: alerts that differ only by a build,
+    order or ticket number share it, "failed at test step" and "failed at
+    deploy step" do not
+    """
+    return " ".join(_DIGITS_RE.sub("0", subject).lower().split())
+
+
+def similarity(first: FrozenSet[int], second: FrozenSet[int]) -> float:
+    """Jaccard similarity of two texts estimated from their sketches"""
+    if first.isdisjoint(second):
+        return 0.0
+    union = heapq.nsmallest(SKETCH_SIZE, first | second)
+    shared = sum(1 for value in union if value in first and value in second)
+    return shared / len(union)
+
+
+def _cluster_near_duplicates(
+    groups: List[EmailGroup], min_similarity: float
+) -> List[EmailGroup]:
+    # Clusters are indexed by sender and subject key: alerts,
+    # notifications and bulk mail repeat from one address under one
+    # subject, and texts that mostly share a template but differ where
+    # it matters (the failing step of a build) are told apart by it
+    index: Dict[Tuple[str, str], List[_Cluster]] = {}
+    clustered: List[EmailGroup] = []
+    for group in groups:
+        email = group.email
+        email_sketch = sketch(f"{email.subject}\n{email.body}")
+        if email_sketch is None:
+            clustered.append(group)
+            continue
+        candidates = index.setdefault(
+            (
+                content_normalizer.sender_address(email.sender),
+                subject_key(email.subject),
+            ),
+            [],
+        )
+        match = next(
+            (
+                cluster
+                for cluster in candidates
+                if similarity(cluster.sketch, email_sketch) >= min_similarity
+            ),
+            None,
+        )
+        if match:
+            match.group.message_ids.extend(group.message_ids)
+            continue
+        candidates.append(_Cluster(group, email_sketch))
+        clustered.append(group)
+    return clustered
+
+
+def _timestamp(email: EmailRecord) -> float:
+    try:
+        return parsedate_to_datetime(email.date).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+from typing import Tuple
+
+
+@dataclass(slots=True)
+class EmailRecord:
+    """Compact per-email record, kept instead of the raw Gmail payload"""
+
+    id: str
+    thread_id: str
+    subject: str
+    sender: str
+    date: str
+    labels: Tuple[str, ...]
+    body: str
+    # Sent to a mailing list (List-Unsubscribe, List-Id, Precedence: bulk)
+    is_bulk: bool = False
+
+    @property
+    def page_content(self) -> str:
+        return (
+            f"Subject: {self.subject}\n"
+            f"From: {self.sender}\n"
+            f"Date: {self.date}\n\n"
+            f"{self.body}"
+        )
@@ -1,85 +1,284 @@
-import base64
-from datetime import datetime, timedelta
-from typing import Any, Dict, List
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List
 
-from bs4 import BeautifulSoup
 from langchain.document_loaders.base import BaseLoader
 from langchain.schema import Document
 
+from core.settings import settings
+from loaders import body_extractors, content_normalizer
+from loaders.email_record import EmailRecord
+from loaders.mail_filter import MailFilter
 from services import gmail_service
 
 
 class GmailLoader(BaseLoader):
     """Custom LangChain loader for Gmail emails"""
 
-    def __init__(self, access_token: str, days: int = 1, query: str = ""):
+    def __init__(
+        self,
+        access_token: str,
+        days: int = 1,
+        query: str = "",
+        start_history_id: str | None = None,
+        mail_filter: MailFilter | None = None,
+    ):
         self.days = days
         self.query = query
         self.access_token = access_token
+        self.start_history_id = start_history_id
+        # Checkpoint to resume from on the next run, set by aload()
+        self.history_id: str | None = None
+        self.concurrency = settings.GMAIL_FETCH_CONCURRENCY
+        self.batch_threshold = settings.GMAIL_BATCH_THRESHOLD
+        self.max_messages = settings.GMAIL_MAX_MESSAGES_PER_RUN
+        # Decides from metadata which bodies are fetched
+        self.mail_filter = mail_filter or MailFilter()
 
     async def aload(self) -> List[Document]:
-        return await self._load_recent_emails(days=self.days, query=self.query)
+        return [document async for document in self.alazy_load()]
 
-    async def _load_recent_emails(
-        self, days: int = 1, query: str = ""
-    ) -> List[Document]:
-        """Load emails from the last N days"""
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
+    async def alazy_load(self) -> AsyncIterator[Document]:
+        """Yield documents in message order as soon as they are fetched"""
+        async for email in self.alazy_load_records():
+            yield self._to_document(email)
 
-        after_date = start_date.strftime("%Y/%m/%d")
-        query_with_date = f"after:{after_date} {query}".strip()
+    async def alazy_load_records(
+        self,
+        message_ids: List[str] | None = None,
+        pages: AsyncIterator[List[str]] | None = None,
+    ) -> AsyncIterator[EmailRecord]:
+        """
+        Like alazy_load, but yields compact EmailRecords.
 
-        try:
-            messages = await gmail_service.list_messages(
-                user_id="me",
-                access_token=self.access_token,
-                query=query_with_date,
+        Given message_ids, only those messages are fetched and nothing is
+        listed. Given pages of message ids (e.g. from
+        alist_message_id_pages), each page is fetched as it arrives.
+        """
+        if pages is None:
+            pages = (
+                self.alist_message_id_pages()
+                if message_ids is None
+                else self.chunk_message_ids(message_ids)
             )
-            documents = []
-
-            for message in messages:
-                email_data = await self._get_message_content(message["id"])
-                if email_data:
-                    content = (
-                        f"Subject: {email_data['subject']}\n"
-                        + f"From: {email_data['sender']}\n"
-                        + f"Date: {email_data['date']}\n\n"
-                        + email_data["body"].strip()
-                    )
-
-                    doc = Document(
-                        page_content=content,
-                        metadata={
-                            "message_id": email_data["id"],
-                            "subject": email_data["subject"],
-                            "sender": email_data["sender"],
-                            "date": email_data["date"],
-                            "thread_id": email_data["thread_id"],
-                            "labels": email_data["labels"],
-                        },
-                    )
-                    documents.append(doc)
-
-            return documents
-
+        try:
+            async for email in self._fetch_emails(pages):
+                if email:
+                    yield email
         except Exception as e:
             print(f"Error loading emails: {e}")
-            return []
 
-    async def _get_message_content(
-        self, message_id: str
+    async def alist_message_id_pages(self) -> AsyncIterator[List[str]]:
+        """
+        List messages added since start_history_id, or from the last
+        `days` days when there is no usable history checkpoint, one page
+        of ids at a time. history_id is set before the first page.
+        """
+        start_date = datetime.now(timezone.utc) - timedelta(days=self.days)
+        # Epoch seconds keep the window exact regardless of the timezone
+        query_with_date = (
+            f"after:{int(start_date.timestamp())} {self.query}".strip()
+        )
+
+        # Taken before listing so nothing that arrives during the run
+        # is skipped by the next incremental sync
+        profile = await gmail_service.get_profile(
+            user_id="me", access_token=self.access_token
+        )
+        self.history_id = profile.get("historyId")
+
+        async for page in self._iter_message_id_pages(query_with_date):
+            yield page
+
+    @staticmethod
+    async def chunk_message_ids(
+        message_ids: List[str],
+    ) -> AsyncIterator[List[str]]:
+        """Known message ids, in pages as alist_message_id_pages yields"""
+        page_size = settings.GMAIL_LIST_PAGE_SIZE
+        for start in range(0, len(message_ids), page_size):
+            yield message_ids[start : start + page_size]
+
+    async def _iter_message_id_pages(
+        self, query: str
+    ) -> AsyncIterator[List[str]]:
+        if self.start_history_id:
+            try:
+                async for page in gmail_service.iter_history_message_ids(
+                    user_id="me",
+                    access_token=self.access_token,
+                    start_history_id=self.start_history_id,
+                    max_results=settings.GMAIL_LIST_PAGE_SIZE,
+                    limit=self.max_messages,
+                ):
+                    yield page
+                return
+            except gmail_service.HistoryExpiredError as e:
+                print(f"{e}, falling back to the date query")
+
+        async for page in gmail_service.iter_message_pages(
+            user_id="me",
+            access_token=self.access_token,
+            query=query,
+            max_results=settings.GMAIL_LIST_PAGE_SIZE,
+            limit=self.max_messages,
+        ):
+            yield [message["id"] for message in page]
+
+    async def _fetch_emails(
+        self, pages: AsyncIterator[List[str]]
+    ) -> AsyncIterator[EmailRecord | None]:
+        """
+        Fetch every message id yielded by pages, in order.
+
+        Listing runs in a background task and each chunk of ids is fetched
+        in its own task as soon as it is listed, so messages from the first
+        page are downloaded (and yielded) while the next page is still
+        being requested. At most GMAIL_FETCH_AHEAD_CHUNKS chunks are
+        fetched ahead of the consumer: when it falls behind, listing and
+        fetching wait, and fetched messages do not pile up in memory.
+        """
+        # Shared by every chunk so the limit holds across concurrent chunks
+        self._fetch_semaphore = asyncio.Semaphore(max(1, self.concurrency))
+        chunk_size = max(1, settings.GMAIL_BATCH_SIZE)
+        fetches: asyncio.Queue[asyncio.Task | None] = asyncio.Queue()
+        # Taken by each chunk fetch started, given back when it is the
+        # one being consumed
+        ahead = asyncio.Semaphore(max(1, settings.GMAIL_FETCH_AHEAD_CHUNKS))
+
+        async def list_pages():
+            try:
+                async for message_ids in pages:
+                    for start in range(0, len(message_ids), chunk_size):
+                        chunk = message_ids[start : start + chunk_size]
+                        await ahead.acquire()
+                        fetches.put_nowait(
+                            asyncio.create_task(
+                                self._fetch_messages_content(chunk)
+                            )
+                        )
+            finally:
+                fetches.put_nowait(None)
+
+        lister = asyncio.create_task(list_pages())
+        try:
+            while (fetch := await fetches.get()) is not None:
+                ahead.release()
+                for email in await fetch:
+                    yield email
+            await lister
+        finally:
+            lister.cancel()
+            while not fetches.empty():
+                if pending := fetches.get_nowait():
+                    pending.cancel()
+
+    @staticmethod
+    def _to_document(email: EmailRecord) -> Document:
+        return Document(
+            page_content=email.page_content,
+            metadata={
+                "message_id": email.id,
+                "subject": email.subject,
+                "sender": email.sender,
+                "date": email.date,
+                "thread_id": email.thread_id,
+                "labels": list(email.labels),
+            },
+        )
+
+    async def _fetch_messages_content(
+        self, message_ids: List[str]
+    ) -> List[EmailRecord | None]:
+        """
+        Fetch messages in two phases, keeping the order of message_ids.
+
+        Headers and labels come first; bodies are only downloaded for the
+        messages that mail_filter lets through.
+        """
+        metadata = await self._fetch_messages(
+            message_ids, gmail_service.METADATA_PARAMS
+        )
+        kept = [
+            message_id
+            for message_id in message_ids
+            if message_id in metadata
+            and self.mail_filter.keep(metadata[message_id])
+        ]
+        bodies = await self._fetch_messages(kept, gmail_service.BODY_PARAMS)
+
+        # Popping the raw payloads lets each one be freed as soon as its
+        # text has been extracted
+        return await asyncio.gather(
+            *(
+                self._parse_message(metadata.pop(mid), bodies.pop(mid))
+                for mid in message_ids
+                if mid in bodies
+            )
+        )
+
+    async def _fetch_messages(
+        self, message_ids: List[str], params: Dict[str, Any]
+    ) -> Dict[str, Dict[str, Any]]:
+        """Fetch message resources, mapped by id; failures are left out"""
+        messages: Dict[str, Dict[str, Any]] = {}
+        if self.batch_threshold and len(message_ids) >= self.batch_threshold:
+            try:
+                messages = await gmail_service.get_messages(
+                    user_id="me",
+                    access_token=self.access_token,
+                    message_ids=message_ids,
+                    params=params,
+                    batch_size=settings.GMAIL_BATCH_SIZE,
+                )
+            except Exception as e:
+                print(f"Error batch fetching messages: {e}")
+
+        # Whatever the batch could not deliver is fetched one by one
+        missing = [mid for mid in message_ids if mid not in messages]
+        if missing:
+            results = await self._concurrent_fetch_messages(missing, params)
+            messages.update(
+                (message_id, message)
+                for message_id, message in zip(missing, results)
+                if message
+            )
+
+        return messages
+
+    async def _concurrent_fetch_messages(
+        self, message_ids: List[str], params: Dict[str, Any]
+    ) -> List[Dict[str, Any] | None]:
+        """Fetch messages one by one, at most `concurrency` at a time"""
+
+        async def fetch(message_id: str) -> Dict[str, Any] | None:
+            async with self._fetch_semaphore:
+                return await self._get_message(message_id, params)
+
+        return await asyncio.gather(*(fetch(mid) for mid in message_ids))
+
+    async def _get_message(
+        self, message_id: str, params: Dict[str, Any]
     ) -> Dict[str, Any] | None:
-        """Get full message content including body"""
         try:
-            message = await gmail_service.get_message(
+            return await gmail_service.get_message(
                 user_id="me",
                 access_token=self.access_token,
                 message_id=message_id,
+                params=params,
             )
+        except Exception as e:
+            print(f"Error getting message {message_id}: {e}")
+            return None
 
+    async def _parse_message(
+        self, metadata: Dict[str, Any], message: Dict[str, Any]
+    ) -> EmailRecord | None:
+        """Extract headers from the metadata and the body from the message"""
+        message_id = metadata.get("id", "")
+        try:
             # Extract headers
-            headers = message["payload"].get("headers", [])
+            headers = metadata["payload"].get("headers", [])
             subject = next(
                 (h["value"] for h in headers if h["name"] == "Subject"),
                 "No Subject",
@@ -94,72 +293,28 @@ class GmailLoader(BaseLoader):
             )
 
             # Extract body
-            body = self._extract_body(message["payload"], message_id)
-
-            return {
-                "id": message_id,
-                "subject": subject,
-                "sender": sender,
-                "date": date,
-                "body": body,
-                "thread_id": message.get("threadId", ""),
-                "labels": message.get("labelIds", []),
-            }
+            body = await self._extract_body(message["payload"], message_id)
+
+            return EmailRecord(
+                id=message_id,
+                thread_id=metadata.get("threadId", ""),
+                subject=subject,
+                sender=sender,
+                date=date,
+                labels=tuple(metadata.get("labelIds", [])),
+                body=body.strip(),
+                is_bulk=content_normalizer.is_bulk(headers),
+            )
         except Exception as e:
-            print(f"Error getting message {message_id}: {e}")
+            print(f"Error parsing message {message_id}: {e}")
             return None
 
-    def _extract_body(self, payload, message_id: str) -> str:
-        if "parts" in payload:
-            return self._walk_parts(payload["parts"], message_id)
-        elif payload["body"].get("data"):
-            print("Extracting body from single part", message_id)
-            if payload["mimeType"] == "text/plain":
-                print("Extracting text/plain part", message_id)
-                data = payload["body"]["data"]
-                body = base64.urlsafe_b64decode(data).decode("utf-8")
-                lines = body.splitlines()
-                cleaned_lines = [
-                    line.strip() for line in lines if line.strip()
-                ]
-                return "\n".join(cleaned_lines)
-            elif payload["mimeType"] == "text/html":
-                print("Extracting text/html part", message_id)
-                data = payload["body"]["data"]
-                body = base64.urlsafe_b64decode(data).decode("utf-8")
-                soup = BeautifulSoup(body, "html.parser")
-                text = soup.get_text()
-                lines = text.splitlines()
-                cleaned_lines = [
-                    line.strip() for line in lines if line.strip()
-                ]
-                return "\n".join(cleaned_lines)
-        return ""
-
-    def _walk_parts(self, parts: List[Dict[str, Any]], message_id: str) -> str:
-        for part in parts:
-            if part.get("parts"):
-                result = self._walk_parts(part["parts"], message_id)
-                if result:
-                    return result
-            elif part["mimeType"] == "text/plain":
-                print("Extracting text/plain part", message_id)
-                data = part["body"]["data"]
-                body = base64.urlsafe_b64decode(data).decode("utf-8")
-                lines = body.splitlines()
-                cleaned_lines = [
-                    line.strip() for line in lines if line.strip()
-                ]
-                return "\n".join(cleaned_lines)
-            elif part["mimeType"] == "text/html":
-                print("Extracting text/html part", message_id)
-                data = part["body"]["data"]
-                body = base64.urlsafe_b64decode(data).decode("utf-8")
-                soup = BeautifulSoup(body, "html.parser")
-                text = soup.get_text()
-                lines = text.splitlines()
-                cleaned_lines = [
-                    line.strip() for line in lines if line.strip()
-                ]
-                return "\n".join(cleaned_lines)
-        return ""
+    @staticmethod
+    async def _extract_body(payload, message_id: str) -> str:
+        text_part = body_extractors.find_text_part(payload)
+        if not text_part:
+            print(f"No text part found in message {message_id}")
+            return ""
+
+        mime_type, data = text_part
+        return await body_extractors.aextract_text(mime_type, data)
@@ -0,0 +1,95 @@
+from collections import Counter
+from fnmatch import fnmatchcase
+from typing import Any, Dict, List, Sequence
+
+from domain.mail_filter_rule import MailFilterAction, MailFilterRule
+from loaders import content_normalizer
+
+# Applied before any user rule: these are never worth a summary
+EXCLUDED_LABELS_RULE = MailFilterRule(
+    name="excluded-labels", labels=["DRAFT", "SPAM", "TRASH"]
+)
+
+# Used for users who have not set their own rules
+DEFAULT_RULES = [
+    MailFilterRule(
+        name="starred", action=MailFilterAction.KEEP, labels=["STARRED"]
+    ),
+    MailFilterRule(name="promotions", labels=["CATEGORY_PROMOTIONS"]),
+    MailFilterRule(name="social", labels=["CATEGORY_SOCIAL"]),
+    MailFilterRule(
+        name="automated-bulk",
+        sender_patterns=[
+            "noreply*@*",
+            "no-reply*@*",
+            "donotreply*@*",
+            "do-not-reply*@*",
+        ],
+        list_unsubscribe=True,
+    ),
+]
+
+
+class MailFilter:
+    """
+    Decides from a message's metadata alone whether it is worth fetching
+    and summarizing: the first matching rule decides, and messages no
+    rule matches are kept. Counts how often each rule matched.
+    """
+
+    def __init__(self, rules: Sequence[MailFilterRule] | None = None):
+        self.rules: List[MailFilterRule] = [
+            EXCLUDED_LABELS_RULE,
+            *(DEFAULT_RULES if rules is None else rules),
+        ]
+        self.hits: Counter[str] = Counter()
+        # Skipped message ids, with the name of the rule that skipped them
+        self.skipped: Dict[str, str] = {}
+
+    def keep(self, metadata: Dict[str, Any]) -> bool:
+        """Whether to fetch the body of a message, given its metadata"""
+        rule = next(
+            (rule for rule in self.rules if matches(rule, metadata)), None
+        )
+        if rule is None:
+            return True
+        self.hits[rule.name] += 1
+        if rule.action == MailFilterAction.KEEP:
+            return True
+        self.skipped[metadata.get("id", "")] = rule.name
+        return False
+
+
+def matches(rule: MailFilterRule, metadata: Dict[str, Any]) -> bool:
+    """Whether a message resource in metadata format matches the rule"""
+    if rule.labels and not set(rule.labels) & set(
+        metadata.get("labelIds", [])
+    ):
+        return False
+
+    headers = {
+        header.get("name", "").lower(): header.get("value", "")
+        for header in metadata.get("payload", {}).get("headers", [])
+    }
+    if rule.sender_patterns:
+        address = content_normalizer.sender_address(headers.get("from", ""))
+        if not any(
+            fnmatchcase(address, pattern.lower())
+            for pattern in rule.sender_patterns
+        ):
+            return False
+    if (
+        rule.list_unsubscribe is not None
+        and ("list-unsubscribe" in headers) != rule.list_unsubscribe
+    ):
+        return False
+    if rule.bulk_precedence is not None:
+        precedence = headers.get("precedence", "").strip().lower()
+        is_bulk = precedence in content_normalizer.BULK_PRECEDENCES
+        if is_bulk != rule.bulk_precedence:
+            return False
+
+    size = metadata.get("sizeEstimate", 0)
+    if rule.min_size_bytes is not None and size < rule.min_size_bytes:
+        return False
+    return not (rule.max_size_bytes is not None and size > rule.max_size_bytes)
@@ -0,0 +1,127 @@
+import hashlib
+import os
+from dataclasses import dataclass
+from functools import cache
+from typing import Any
+
+from core.logger import loguru_logger
+from core.settings import settings
+from loaders import content_normalizer
+
+# Encoding of the gpt-4.1 models
+TOKEN_ENCODING = "o200k_base"
+# Where tiktoken downloads it from; its cache file is named after the URL
+TOKEN_ENCODING_URL = (
+    "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken"
+)
+# Characters per token assumed when the encoding cannot be loaded
+CHARS_PER_TOKEN = 4
+# Share of the budget given to the start of a body sampled head and tail
+HEAD_SHARE = 0.7
+OMISSION_MARKER = "\n\n[...]\n\n"
+
+
+@dataclass
+class TokenTotals:
+    """Summary input tokens of a run, before and after preprocessing"""
+
+    before: int = 0
+    after: int = 0
+
+    @property
+    def saved(self) -> float:
+        return 1 - self.after / self.before if self.before else 0.0
+
+
+def prepare_body(body: str) -> str:
+    """
+    Email body as sent to the summary chain: without quoted history and
+    signature, and within SUMMARY_BODY_TOKEN_BUDGET tokens
+    """
+    body = content_normalizer.strip_quoted_reply(body)
+    body = content_normalizer.strip_signature(body)
+    return fit_to_budget(
+        body,
+        settings.SUMMARY_BODY_TOKEN_BUDGET,
+        head_only=settings.SUMMARY_BODY_TRUNCATION == "head",
+    )
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def fit_to_budget(text: str, budget: int, *, head_only: bool = False) -> str:
+    """
+    The text if it fits in budget tokens; otherwise its first tokens, or
+    (by default) its first and last ones around an omission marker, since
+    the end of a long email often holds the ask or the conclusion
+    """
+    encoding = _get_encoding()
+    # Without a tokenizer, characters stand in for tokens
+    units: Any = (
+        encoding.encode(text, disallowed_special=()) if encoding else text
+    )
+    limit = budget if encoding else budget * CHARS_PER_TOKEN
+    if len(units) <= limit:
+        return text
+
+    decode = encoding.decode if encoding else "".join
+    if head_only:
+        return decode(units[:limit]).rstrip() + OMISSION_MARKER.rstrip()
+    head = int(limit * HEAD_SHARE)
+    tail = limit - head
+    return (
+        decode(units[:head]).rstrip()
+        + OMISSION_MARKER
+        + decode(units[-tail:]).lstrip()
+    )
+
+
+def encoding_cache_path() -> str:
+    """File tiktoken reads TOKEN_ENCODING from, in TIKTOKEN_CACHE_DIR"""
+    return os.path.join(
+        settings.TIKTOKEN_CACHE_DIR,
+        hashlib.sha1(TOKEN_ENCODING_URL.encode()).hexdigest(),
+    )
+
+
+@cache
+def _get_encoding() -> Any:
+    """
+    tiktoken encoding. It is only read from TIKTOKEN_CACHE_DIR: a cold
+    start never downloads it. Outside Lambda, where the build may not have
+    fetched it, tokens are estimated instead (None).
+    """
+    deployed = bool(os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+    if not os.path.exists(encoding_cache_path()):
+        message = (
+            f"{TOKEN_ENCODING} is not in {settings.TIKTOKEN_CACHE_DIR}; "
+            "run `python -m loaders.token_budget` before building"
+        )
+        if deployed:
+            raise FileNotFoundError(message)
+        loguru_logger.warning(f"Counting tokens approximately: {message}")
+        return None
+    os.environ["TIKTOKEN_CACHE_DIR"] = settings.TIKTOKEN_CACHE_DIR
+    try:
+        import tiktoken  # noqa: PLC0415
+
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception as e:
+        if deployed:
+            raise
+        loguru_logger.warning(f"Counting tokens approximately: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    # Downloads the encoding into TIKTOKEN_CACHE_DIR, to ship with the code
+    os.environ["TIKTOKEN_CACHE_DIR"] = settings.TIKTOKEN_CACHE_DIR
+    import tiktoken  # noqa: PLC0415
+
+    tiktoken.get_encoding(TOKEN_ENCODING)
+    print(f"{TOKEN_ENCODING} saved to {encoding_cache_path()}")
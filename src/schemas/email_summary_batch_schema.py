@@ -0,0 +1,17 @@
+from typing import List
+
+from pydantic import BaseModel, Field
+
+from schemas.email_summary_schema import EmailSummarySchema
+
+
+class KeyedEmailSummarySchema(EmailSummarySchema):
+    message_id: str = Field(
+        ..., description="message_id of the email this summary is about"
+    )
+
+
+class EmailSummaryBatchSchema(BaseModel):
+    summaries: List[KeyedEmailSummarySchema] = Field(
+        ..., description="One summary per email, in any order"
+    )
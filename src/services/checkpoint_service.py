@@ -0,0 +1,323 @@
+import asyncio
+import sqlite3
+import uuid
+from contextlib import closing
+from datetime import date, datetime, timedelta, timezone
+from functools import cache
+from typing import Protocol
+
+from core.settings import settings
+from core.supabase_client import get_supabase_client
+from domain.digest_checkpoint import DigestCheckpoint
+
+
+class CheckpointStore(Protocol):
+    async def load(
+        self, mail_account_id: uuid.UUID, digest_date: date
+    ) -> DigestCheckpoint | None: ...
+
+    async def save(self, checkpoint: DigestCheckpoint) -> None: ...
+
+    async def claim_delivery(self, checkpoint: DigestCheckpoint) -> bool: ...
+
+    async def release_delivery(self, checkpoint: DigestCheckpoint) -> None: ...
+
+
+class SupabaseCheckpointStore:
+    """
+    Checkpoints in the digest_checkpoints table (see
+    supabase/migrations/20261018083803_digest_checkpoints.sql, which also
+    purges rows past CHECKPOINT_RETENTION_DAYS):
+
+        create table digest_checkpoints (
+            mail_account_id uuid not null references mail_accounts(id)
+                on delete cascade,
+            digest_date date not null,
+            state jsonb not null,
+            delivery_started_at timestamptz,
+            updated_at timestamptz not null default now(),
+            primary key (mail_account_id, digest_date)
+        );
+
+    delivery_started_at is only written by claim_delivery and
+    release_delivery, never by save, so a stale state saved by a
+    concurrent copy of the job cannot undo a claim.
+    """
+
+    table = "digest_checkpoints"
+
+    async def load(
+        self, mail_account_id: uuid.UUID, digest_date: date
+    ) -> DigestCheckpoint | None:
+        supabase = await get_supabase_client()
+        try:
+            response = (
+                await supabase.table(self.table)
+                .select("state, delivery_started_at")
+                .eq("mail_account_id", str(mail_account_id))
+                .eq("digest_date", digest_date.isoformat())
+                .execute()
+            )
+        except Exception as e:
+            raise Exception(f"Error loading digest checkpoint: {e}") from e
+
+        if not response.data:
+            return None
+        row = response.data[0]
+        checkpoint = DigestCheckpoint(**row["state"])
+        if row["delivery_started_at"] and not checkpoint.delivery_started_at:
+            checkpoint.delivery_started_at = datetime.fromisoformat(
+                row["delivery_started_at"]
+            )
+        return checkpoint
+
+    async def save(self, checkpoint: DigestCheckpoint) -> None:
+        checkpoint.updated_at = datetime.now(timezone.utc)
+        supabase = await get_supabase_client()
+        try:
+            await (
+                supabase.table(self.table)
+                .upsert(
+                    {
+                        "mail_account_id": str(checkpoint.mail_account_id),
+                        "digest_date": checkpoint.digest_date.isoformat(),
+                        "state": checkpoint.model_dump(mode="json"),
+                        "updated_at": checkpoint.updated_at.isoformat(),
+                    },
+                    on_conflict="mail_account_id,digest_date",
+                )
+                .execute()
+            )
+        except Exception as e:
+            raise Exception(f"Error saving digest checkpoint: {e}") from e
+
+    async def claim_delivery(self, checkpoint: DigestCheckpoint) -> bool:
+        """
+        Set delivery_started_at unless another run already did, in one
+        conditional update; True when this call set it
+        """
+        started_at = datetime.now(timezone.utc)
+        checkpoint.delivery_started_at = started_at
+        checkpoint.updated_at = started_at
+        supabase = await get_supabase_client()
+        try:
+            response = await (
+                supabase.table(self.table)
+                .update({
+                    "state": checkpoint.model_dump(mode="json"),
+                    "delivery_started_at": started_at.isoformat(),
+                    "updated_at": started_at.isoformat(),
+                })
+                .eq("mail_account_id", str(checkpoint.mail_account_id))
+                .eq("digest_date", checkpoint.digest_date.isoformat())
+                .is_("delivery_started_at", "null")
+                .execute()
+            )
+        except Exception as e:
+            raise Exception(f"Error claiming digest delivery: {e}") from e
+        return bool(response.data)
+
+    async def release_delivery(self, checkpoint: DigestCheckpoint) -> None:
+        """Undo this run's claim_delivery, after a send that failed"""
+        started_at = checkpoint.delivery_started_at
+        checkpoint.delivery_started_at = None
+        checkpoint.updated_at = datetime.now(timezone.utc)
+        if started_at is None:
+            return
+        supabase = await get_supabase_client()
+        try:
+            await (
+                supabase.table(self.table)
+                .update({
+                    "state": checkpoint.model_dump(mode="json"),
+                    "delivery_started_at": None,
+                    "updated_at": checkpoint.updated_at.isoformat(),
+                })
+                .eq("mail_account_id", str(checkpoint.mail_account_id))
+                .eq("digest_date", checkpoint.digest_date.isoformat())
+                .eq("delivery_started_at", started_at.isoformat())
+                .execute()
+            )
+        except Exception as e:
+            raise Exception(f"Error releasing digest delivery: {e}") from e
+
+
+class SQLiteCheckpointStore:
+    """
+    Local stand-in for SupabaseCheckpointStore, for local runs and
+    benchmarks. On Lambda a /tmp file only survives within one execution
+    environment, which a redelivered message may not land on. Rows of
+    digests older than retention_days are pruned on save.
+    """
+
+    def __init__(self, path: str, retention_days: int):
+        self.path = path
+        self.retention_days = retention_days
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "create table if not exists digest_checkpoints ("
+                " mail_account_id text not null,"
+                " digest_date text not null,"
+                " state text not null,"
+                " updated_at text not null,"
+                " delivery_started_at text,"
+                " primary key (mail_account_id, digest_date))"
+            )
+            columns = {
+                row[1]
+                for row in connection.execute(
+                    "pragma table_info(digest_checkpoints)"
+                )
+            }
+            # Files created before delivery was claimed in its own column
+            if "delivery_started_at" not in columns:
+                connection.execute(
+                    "alter table digest_checkpoints"
+                    " add column delivery_started_at text"
+                )
+
+    async def load(
+        self, mail_account_id: uuid.UUID, digest_date: date
+    ) -> DigestCheckpoint | None:
+        return await asyncio.to_thread(
+            self._fetch_state, str(mail_account_id), digest_date.isoformat()
+        )
+
+    async def save(self, checkpoint: DigestCheckpoint) -> None:
+        checkpoint.updated_at = datetime.now(timezone.utc)
+        await asyncio.to_thread(
+            self._write_state,
+            str(checkpoint.mail_account_id),
+            checkpoint.digest_date.isoformat(),
+            checkpoint.model_dump_json(),
+            checkpoint.updated_at.isoformat(),
+        )
+
+    async def claim_delivery(self, checkpoint: DigestCheckpoint) -> bool:
+        started_at = datetime.now(timezone.utc)
+        checkpoint.delivery_started_at = started_at
+        checkpoint.updated_at = started_at
+        return await asyncio.to_thread(
+            self._update_delivery,
+            checkpoint,
+            started_at.isoformat(),
+            None,
+        )
+
+    async def release_delivery(self, checkpoint: DigestCheckpoint) -> None:
+        started_at = checkpoint.delivery_started_at
+        checkpoint.delivery_started_at = None
+        checkpoint.updated_at = datetime.now(timezone.utc)
+        if started_at is not None:
+            await asyncio.to_thread(
+                self._update_delivery,
+                checkpoint,
+                None,
+                started_at.isoformat(),
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _fetch_state(self, mail_account_id: str, digest_date: str):
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                "select state, delivery_started_at from digest_checkpoints"
+                " where mail_account_id = ? and digest_date = ?",
+                (mail_account_id, digest_date),
+            ).fetchone()
+        if not row:
+            return None
+        checkpoint = DigestCheckpoint.model_validate_json(row[0])
+        if row[1] and not checkpoint.delivery_started_at:
+            checkpoint.delivery_started_at = datetime.fromisoformat(row[1])
+        return checkpoint
+
+    def _update_delivery(
+        self,
+        checkpoint: DigestCheckpoint,
+        started_at: str | None,
+        claimed_at: str | None,
+    ) -> bool:
+        """
+        Set delivery_started_at to started_at where it is claimed_at
+        (null for a claim); whether a row changed
+        """
+        with closing(self._connect()) as connection, connection:
+            cursor = connection.execute(
+                "update digest_checkpoints"
+                " set state = ?, updated_at = ?, delivery_started_at = ?"
+                " where mail_account_id = ? and digest_date = ?"
+                " and delivery_started_at is ?",
+                (
+                    checkpoint.model_dump_json(),
+                    checkpoint.updated_at.isoformat(),
+                    started_at,
+                    str(checkpoint.mail_account_id),
+                    checkpoint.digest_date.isoformat(),
+                    claimed_at,
+                ),
+            )
+        return cursor.rowcount > 0
+
+    def _write_state(
+        self,
+        mail_account_id: str,
+        digest_date: str,
+        state: str,
+        updated_at: str,
+    ) -> None:
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "insert into digest_checkpoints"
+                " (mail_account_id, digest_date, state, updated_at)"
+                " values (?, ?, ?, ?)"
+                " on conflict (mail_account_id, digest_date)"
+                " do update set state = excluded.state,"
+                " updated_at = excluded.updated_at",
+                (mail_account_id, digest_date, state, updated_at),
+            )
+            connection.execute(
+                "delete from digest_checkpoints where digest_date < ?",
+                (
+                    (
+                        datetime.now(timezone.utc).date()
+                        - timedelta(days=self.retention_days)
+                    ).isoformat(),
+                ),
+            )
+
+
+class NullCheckpointStore:
+    """Keeps nothing: every run starts from scratch"""
+
+    @staticmethod
+    async def load(
+        mail_account_id: uuid.UUID, digest_date: date
+    ) -> DigestCheckpoint | None:
+        return None
+
+    @staticmethod
+    async def save(checkpoint: DigestCheckpoint) -> None:
+        pass
+
+    @staticmethod
+    async def claim_delivery(checkpoint: DigestCheckpoint) -> bool:
+        checkpoint.delivery_started_at = datetime.now(timezone.utc)
+        return True
+
+    @staticmethod
+    async def release_delivery(checkpoint: DigestCheckpoint) -> None:
+        checkpoint.delivery_started_at = None
+
+
+@cache
+def get_checkpoint_store() -> CheckpointStore:
+    if settings.CHECKPOINT_STORE == "supabase":
+        return SupabaseCheckpointStore()
+    if settings.CHECKPOINT_STORE == "sqlite":
+        return SQLiteCheckpointStore(
+            settings.CHECKPOINT_SQLITE_PATH,
+            settings.CHECKPOINT_RETENTION_DAYS,
+        )
+    return NullCheckpointStore()
@@ -1,68 +1,243 @@
+import asyncio
 import json
 import uuid
-from typing import List
-
-from langchain.schema import Document
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List
 
 from chains import (
     generate_aggregated_summary,
+    summarize_email_batch_chain,
     summarize_email_chain,
 )
+from core.settings import settings
+from domain.account_context import AccountContext
+from domain.digest_checkpoint import DigestCheckpoint, DigestStage
+from domain.mail_account import MailAccount
+from loaders import email_grouping, token_budget
+from loaders.email_grouping import EmailGroup
+from loaders.email_record import EmailRecord
 from loaders.gmail_loader import GmailLoader
+from loaders.mail_filter import MailFilter
+from schemas.email_summary_schema import EmailSummarySchema
 from services import (
+    checkpoint_service,
     google_auth_service,
     mail_account_service,
+    schedule_service,
+    summary_cache_service,
     telegram_service,
 )
-from services.delivery_channel_service import get_active_delivery_channels
 
 
 async def generate_daily_email_summary(
-    mail_account_id: uuid.UUID, *, logger
+    mail_account_id: uuid.UUID,
+    dispatched_at: datetime | None = None,
+    *,
+    logger,
 ) -> None:
-    mail_account = await mail_account_service.get_mail_account(
+    """
+    Build and deliver one account's digest in stages (list, fetch,
+    summarize, aggregate, deliver), checkpointing each stage's output.
+
+    The digest is identified by the account and the date, in the user's
+    timezone, of dispatched_at (when the job was first enqueued), so a
+    redelivered job resumes the same digest at its first incomplete stage.
+    A digest is never sent twice.
+    """
+    account_context = await mail_account_service.get_account_context(
         mail_account_id, logger=logger
     )
-    if not mail_account:
+    if not account_context:
         raise ValueError(f"Mail account with ID {mail_account_id} not found.")
+    mail_account = account_context.mail_account
 
     if not mail_account.credentials:
         raise ValueError(
             f"Mail account with ID {mail_account_id} does not have credentials"
         )
 
-    gmail_loader = GmailLoader(
-        await google_auth_service.get_access_token(
-            mail_account.credentials, logger=logger
-        ),
-        days=1,
+    digest_date = (
+        (dispatched_at or datetime.now(timezone.utc))
+        .astimezone(schedule_service.get_zone(account_context.user.timezone))
+        .date()
+    )
+    store = checkpoint_service.get_checkpoint_store()
+    checkpoint = await store.load(
+        mail_account.id, digest_date
+    ) or DigestCheckpoint(
+        mail_account_id=mail_account.id, digest_date=digest_date
+    )
+    logger.info(
+        f"Digest of {digest_date} for mail account {mail_account.id} "
+        f"starts at stage {checkpoint.stage.value}"
     )
-    documents = await gmail_loader.aload()
 
-    if not documents:
-        logger.warning("No emails found for today.")
-        raise ValueError(
-            "No emails found for today. Please check your Gmail settings."
+    if checkpoint.stage is DigestStage.DONE:
+        if checkpoint.delivered_at:
+            logger.info("Digest already delivered, not sending it again.")
+        else:
+            logger.error(
+                "A previous run stopped while delivering this digest; "
+                "not sending it again."
+            )
+        await _advance_history_id(mail_account, checkpoint, logger=logger)
+        return
+
+    if checkpoint.stage in {
+        DigestStage.LIST,
+        DigestStage.FETCH,
+        DigestStage.SUMMARIZE,
+    }:
+        gmail_loader = GmailLoader(
+            await google_auth_service.get_access_token(
+                mail_account, logger=logger
+            ),
+            days=1,
+            start_history_id=(
+                mail_account.last_history_id
+                if settings.GMAIL_INCREMENTAL_SYNC
+                else None
+            ),
+            mail_filter=MailFilter(account_context.user.mail_filter_rules),
+        )
+        await _summarize_pending(
+            gmail_loader, checkpoint, store, logger=logger
+        )
+        checkpoint.summarized = True
+        await store.save(checkpoint)
+
+    if checkpoint.aggregated_summary is None:
+        summaries = checkpoint.ordered_summaries()
+        if not summaries:
+            logger.warning("No emails found for today.")
+            raise ValueError(
+                "No emails found for today. Please check your Gmail settings."
+            )
+
+        aggregated_summary = await generate_aggregated_summary.chain.ainvoke(
+            {
+                "summaries": json.dumps(
+                    [
+                        {**summary.model_dump(), "email_count": count}
+                        for summary, count in summaries
+                    ],
+                    indent=2,
+                )
+            },
+            {
+                "run_name": "executive_summary",
+            },
         )
+        checkpoint.aggregated_summary = str(aggregated_summary.content)
+        await store.save(checkpoint)
+
+    if await _deliver_digest(
+        account_context, checkpoint, store, logger=logger
+    ):
+        await _advance_history_id(mail_account, checkpoint, logger=logger)
 
-    logger.info(f"Found {len(documents)} emails to summarize.")
-    summaries = await _batch_summarize_emails(documents, logger=logger)
 
-    aggregated_summary = await generate_aggregated_summary.chain.ainvoke(
-        {
-            "summaries": json.dumps(
-                [summary.model_dump() for summary in summaries], indent=2
+async def _summarize_pending(
+    gmail_loader: GmailLoader,
+    checkpoint: DigestCheckpoint,
+    store: checkpoint_service.CheckpointStore,
+    *,
+    logger,
+) -> None:
+    """
+    Fetch and summarize the pending messages into the checkpoint, listing
+    the rest first if listing did not finish (see _list_pending_pages).
+
+    Messages whose fetch or parsing failed are neither summarized nor
+    filtered; they get SUMMARY_PENDING_RETRIES more attempts, after which
+    the run fails rather than deliver a digest that leaves them out.
+    """
+    mail_filter = gmail_loader.mail_filter
+    pages = (
+        gmail_loader.chunk_message_ids(checkpoint.pending_message_ids())
+        if checkpoint.listed
+        else _list_pending_pages(gmail_loader, checkpoint, logger=logger)
+    )
+    pending: List[str] = []
+    for attempt in range(settings.SUMMARY_PENDING_RETRIES + 1):
+        if attempt:
+            logger.warning(
+                f"{len(pending)} emails were not summarized, retrying "
+                f"them (attempt {attempt + 1})"
             )
-        },
-        {
-            "run_name": "executive_summary",
-        },
+            pages = gmail_loader.chunk_message_ids(pending)
+        await _stream_summarize_emails(
+            gmail_loader,
+            pages,
+            checkpoint,
+            store,
+            logger=logger,
+        )
+        if not checkpoint.listed:
+            # The loader ends its stream on errors, listing ones included
+            raise Exception("Error listing messages: listing did not finish")
+        checkpoint.filtered.update(mail_filter.skipped)
+        pending = checkpoint.pending_message_ids()
+        if not pending:
+            break
+
+    logger.info(
+        f"Mail filter skipped {len(mail_filter.skipped)} of "
+        f"{len(checkpoint.message_ids or [])} emails. "
+        f"Rule hits: {dict(mail_filter.hits)}"
     )
+    stats = summary_cache_service.summary_cache_stats()
+    logger.info(
+        f"Summary cache: {stats.hits} hits, {stats.misses} misses, "
+        f"{stats.shared_hits} shared bulk mail hits in this process"
+    )
+    if pending:
+        await store.save(checkpoint)
+        raise Exception(
+            f"Could not fetch or summarize {len(pending)} emails: "
+            f"{', '.join(pending[:10])}"
+        )
 
-    active_delivery_channels = await get_active_delivery_channels(
-        mail_account.user_id, logger=logger
+
+async def _list_pending_pages(
+    gmail_loader: GmailLoader, checkpoint: DigestCheckpoint, *, logger
+) -> AsyncIterator[List[str]]:
+    """
+    Pages of message ids to fetch: the pending ones a previous run had
+    listed, then each newly listed page, once its ids are added to
+    checkpoint.message_ids. Marks the checkpoint listed at the end.
+
+    Listing starts over on a resumed run; ids it already has are skipped.
+    """
+    async for page in gmail_loader.chunk_message_ids(
+        checkpoint.pending_message_ids()
+    ):
+        yield page
+    message_ids = checkpoint.message_ids = checkpoint.message_ids or []
+    known = set(message_ids)
+    async for page in gmail_loader.alist_message_id_pages():
+        new = [message_id for message_id in page if message_id not in known]
+        known.update(new)
+        message_ids.extend(new)
+        if new:
+            yield new
+    checkpoint.history_id = gmail_loader.history_id
+    checkpoint.listed = True
+    logger.info(f"Listed {len(message_ids)} emails.")
+
+
+async def _deliver_digest(
+    account_context: AccountContext,
+    checkpoint: DigestCheckpoint,
+    store: checkpoint_service.CheckpointStore,
+    *,
+    logger,
+) -> bool:
+    """Send the digest; False when another run claimed its delivery"""
+    active_delivery_channels = account_context.active_delivery_channels
+    telegram_delivery_channel = (
+        active_delivery_channels[0] if active_delivery_channels else None
     )
-    telegram_delivery_channel = active_delivery_channels[0]
 
     if not telegram_delivery_channel:
         raise ValueError(
@@ -73,26 +248,406 @@ async def generate_daily_email_summary(
         "Sending aggregated summary to Telegram channel: "
         f"{telegram_delivery_channel.address}"
     )
-    await telegram_service.send_message(
-        int(telegram_delivery_channel.address),
-        str(aggregated_summary.content),
+
+    # Claimed before sending, with a conditional write: a copy of this job
+    # running at the same time (SQS delivers at least once) loses the
+    # claim, and if this run dies mid-send, the redelivered job cannot
+    # know whether the digest went out and must not resend it
+    if not await store.claim_delivery(checkpoint):
+        logger.warning(
+            "Another run already claimed delivery of this digest; "
+            "not sending it."
+        )
+        return False
+    try:
+        sent = await telegram_service.send_message(
+            int(telegram_delivery_channel.address),
+            str(checkpoint.aggregated_summary),
+        )
+    except Exception:
+        # The request failed before Telegram accepted the message
+        await store.release_delivery(checkpoint)
+        raise
+    if not sent:
+        # Telegram rejected the message (e.g. too long, bot blocked), so
+        # nothing was sent and a retry may deliver it
+        await store.release_delivery(checkpoint)
+        raise Exception(
+            "Error sending digest to Telegram: the message was rejected"
+        )
+
+    checkpoint.delivered_at = datetime.now(timezone.utc)
+    await store.save(checkpoint)
+    return True
+
+
+async def _summarize_emails(
+    emails: List[EmailRecord],
+    cached: Dict[str, summary_cache_service.CachedSummary],
+    new_entries: List[summary_cache_service.CachedSummary],
+    tokens: token_budget.TokenTotals,
+    *,
+    logger,
+) -> Dict[str, EmailSummarySchema]:
+    """
+    Summaries of a pack of emails (see _pack_groups) by message id, from
+    the cache when possible.
+
+    Cache misses are summarized in one request when there are several,
+    and one by one otherwise, or when a packed response leaves them out.
+    """
+    found = await asyncio.gather(
+        *(
+            _cached_summary(email, cached, new_entries, logger=logger)
+            for email in emails
+        )
+    )
+    summaries = {
+        email.id: summary
+        for email, summary in zip(emails, found, strict=True)
+        if summary is not None
+    }
+    misses = [email for email in emails if email.id not in summaries]
+    if len(misses) > 1:
+        summaries.update(
+            await _generate_packed_summaries(
+                misses, new_entries, tokens, logger=logger
+            )
+        )
+    for email in misses:
+        if email.id not in summaries:
+            summaries[email.id] = await _generate_summary(
+                email, new_entries, tokens
+            )
+    return summaries
+
+
+async def _cached_summary(
+    email: EmailRecord,
+    cached: Dict[str, summary_cache_service.CachedSummary],
+    new_entries: List[summary_cache_service.CachedSummary],
+    *,
+    logger,
+) -> EmailSummarySchema | None:
+    """
+    Cached summary of the email. Bulk mail is also looked up by content
+    across accounts.
+    """
+    summary = summary_cache_service.lookup(cached, email)
+    if summary is not None:
+        return summary
+    if not summary_cache_service.is_shareable(email):
+        return None
+    summary = await summary_cache_service.get_shared_summary(
+        email, logger=logger
+    )
+    if summary is not None:
+        _remember_summary(email, summary, new_entries, generated=False)
+    return summary
+
+
+async def _generate_summary(
+    email: EmailRecord,
+    new_entries: List[summary_cache_service.CachedSummary],
+    tokens: token_budget.TokenTotals,
+) -> EmailSummarySchema:
+    summary = await summarize_email_chain.chain.ainvoke(
+        _summary_input(email, tokens),
+        {"run_name": "generate_summary"},
+    )
+    _remember_summary(email, summary, new_entries, generated=True)
+    return summary
+
+
+async def _generate_packed_summaries(
+    emails: List[EmailRecord],
+    new_entries: List[summary_cache_service.CachedSummary],
+    tokens: token_budget.TokenTotals,
+    *,
+    logger,
+) -> Dict[str, EmailSummarySchema]:
+    """
+    Summaries of several emails from one request, by message id. Entries
+    for unknown or repeated ids are dropped, so emails the response
+    leaves out (or all of them, if it fails) are simply missing.
+    """
+    try:
+        response = await summarize_email_batch_chain.chain.ainvoke(
+            {
+                "emails": summarize_email_batch_chain.format_emails([
+                    {"message_id": email.id, **_summary_input(email, tokens)}
+                    for email in emails
+                ])
+            },
+            {"run_name": "generate_packed_summaries"},
+        )
+    except Exception as e:
+        logger.warning(
+            f"Packed summary request for {len(emails)} emails failed: {e}"
+        )
+        return {}
+
+    by_id = {email.id: email for email in emails}
+    summaries: Dict[str, EmailSummarySchema] = {}
+    for entry in response.summaries:
+        if entry.message_id in by_id and entry.message_id not in summaries:
+            summary = EmailSummarySchema(
+                **entry.model_dump(exclude={"message_id"})
+            )
+            summaries[entry.message_id] = summary
+            _remember_summary(
+                by_id[entry.message_id], summary, new_entries, generated=True
+            )
+    if len(summaries) < len(emails):
+        logger.warning(
+            f"Packed summary response covered {len(summaries)} of "
+            f"{len(emails)} emails; the rest are summarized one by one"
+        )
+    return summaries
+
+
+def _remember_summary(
+    email: EmailRecord,
+    summary: EmailSummarySchema,
+    new_entries: List[summary_cache_service.CachedSummary],
+    *,
+    generated: bool,
+) -> None:
+    """
+    Queue the summary for the cache, under the message id and, when it
+    was just generated from shareable bulk mail, under its content key
+    """
+    if generated and summary_cache_service.is_shareable(email):
+        new_entries.append(
+            summary_cache_service.CachedSummary(
+                summary_cache_service.shared_key(email),
+                summary_cache_service.content_hash(email),
+                summary,
+            )
+        )
+    new_entries.append(
+        summary_cache_service.CachedSummary(
+            email.id, summary_cache_service.content_hash(email), summary
+        )
     )
 
 
-async def _batch_summarize_emails(
-    documents: List[Document], *, logger
-) -> list[Document]:
-    logger.info(f"Summarizing {len(documents)} emails in batch.")
-    input_data_list = [
-        {
-            "subject": email.metadata["subject"],
-            "sender": email.metadata["sender"],
-            "date": email.metadata["date"],
-            "body": email.page_content,
+def _summary_input(
+    email: EmailRecord, tokens: token_budget.TokenTotals
+) -> Dict[str, str]:
+    """
+    Summary prompt input, with the body preprocessed to fit the token
+    budget. The prompt has its own subject, sender and date fields, so the
+    body goes without the header block of page_content.
+
+    Bulk mail is summarized from its recipient-neutral form so the
+    result can be shared.
+    """
+    shareable = summary_cache_service.is_shareable(email)
+    prompt_input = (
+        summary_cache_service.shared_input(email)
+        if shareable
+        else {
+            "subject": email.subject,
+            "sender": email.sender,
+            "date": email.date,
+            "body": email.body,
         }
-        for email in documents
-    ]
+    )
+    # What was sent before preprocessing: page_content, headers included
+    tokens.before += token_budget.count_tokens(
+        prompt_input["body"] if shareable else email.page_content
+    )
+    prompt_input["body"] = token_budget.prepare_body(prompt_input["body"])
+    tokens.after += token_budget.count_tokens(prompt_input["body"])
+    return prompt_input
+
+
+async def _advance_history_id(
+    mail_account: MailAccount, checkpoint: DigestCheckpoint, *, logger
+) -> None:
+    # Only move the checkpoint once the digest went out, so a failed run
+    # picks up the same messages again when SQS redelivers it
+    if (
+        checkpoint.history_id
+        and checkpoint.history_id != mail_account.last_history_id
+    ):
+        await mail_account_service.update_last_history_id(
+            mail_account.id, checkpoint.history_id, logger=logger
+        )
+
+
+async def _stream_summarize_emails(
+    gmail_loader: GmailLoader,
+    pages: AsyncIterator[List[str]],
+    checkpoint: DigestCheckpoint,
+    store: checkpoint_service.CheckpointStore,
+    *,
+    logger,
+) -> None:
+    """
+    Summarize the messages of pages (of message ids) while they are still
+    being listed and fetched, into checkpoint.summaries.
+
+    Emails are grouped (see _group_emails) and packed (see _pack_groups)
+    first, then go through a bounded queue (the loader waits when the LLM
+    falls behind) to SUMMARY_CONCURRENCY workers. Summaries found in the
+    summary cache, looked up a page at a time, are reused; only the misses
+    go to the chain. The checkpoint is saved with each page, every
+    CHECKPOINT_SAVE_EVERY summaries and when summarizing ends, so a failed
+    run keeps what it listed and the summaries it paid for.
+    """
+    cached: Dict[str, summary_cache_service.CachedSummary] = {}
+    new_entries: List[summary_cache_service.CachedSummary] = []
+    tokens = token_budget.TokenTotals()
+    queue: asyncio.Queue[List[EmailGroup] | None] = asyncio.Queue(
+        maxsize=settings.SUMMARY_QUEUE_SIZE
+    )
+    workers = max(1, settings.SUMMARY_CONCURRENCY)
+    save_lock = asyncio.Lock()
+    unsaved = 0
+
+    async def save():
+        nonlocal unsaved
+        async with save_lock:
+            unsaved = 0
+            await store.save(checkpoint)
+
+    async def prefetch() -> AsyncIterator[List[str]]:
+        async for page in pages:
+            cached.update(
+                await summary_cache_service.get_cached_summaries(
+                    page, logger=logger
+                )
+            )
+            await save()
+            yield page
+
+    async def produce():
+        emails = gmail_loader.alazy_load_records(pages=prefetch())
+        async for pack in _pack_groups(_group_emails(emails, logger=logger)):
+            await queue.put(pack)
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def consume():
+        nonlocal unsaved
+        while (pack := await queue.get()) is not None:
+            summaries = await _summarize_emails(
+                [group.email for group in pack],
+                cached,
+                new_entries,
+                tokens,
+                logger=logger,
+            )
+            for group in pack:
+                if group.size > 1:
+                    checkpoint.groups[group.email.id] = group.message_ids
+                checkpoint.summaries[group.email.id] = summaries[
+                    group.email.id
+                ]
+            unsaved += len(pack)
+            if unsaved >= settings.CHECKPOINT_SAVE_EVERY:
+                await save()
+
+    try:
+        async with asyncio.TaskGroup() as tasks:
+            tasks.create_task(produce())
+            for _ in range(workers):
+                tasks.create_task(consume())
+    finally:
+        await save()
+        await summary_cache_service.store_summaries(
+            new_entries, checkpoint.mail_account_id, logger=logger
+        )
+
+    summarized = sum(count for _, count in checkpoint.ordered_summaries())
+    logger.info(
+        f"Summarized {summarized} emails "
+        f"in {len(checkpoint.summaries)} summaries."
+    )
+    logger.info(
+        f"Summary input: {tokens.before} tokens before preprocessing, "
+        f"{tokens.after} after ({tokens.saved:.0%} saved)"
+    )
+
 
-    return await summarize_email_chain.chain.abatch(
-        input_data_list, {"run_name": "generate_summary"}
+async def _group_emails(
+    emails: AsyncIterator[EmailRecord], *, logger
+) -> AsyncIterator[EmailGroup]:
+    """
+    Emails to summarize, grouped so that each thread and each set of
+    near-duplicates costs one LLM call.
+
+    Grouping needs every email: when it is on, all of them are held in
+    memory and summarizing only starts once fetching is done, giving up
+    the overlap of the two. Whether the calls saved make up for that
+    depends on the mailbox, so it is off unless SUMMARY_THREAD_COLLAPSING
+    or NEAR_DUPLICATE_CLUSTERING is set.
+    """
+    if (
+        not settings.SUMMARY_THREAD_COLLAPSING
+        and not settings.NEAR_DUPLICATE_CLUSTERING
+    ):
+        count = 0
+        async for email in emails:
+            yield EmailGroup(email, [email.id])
+            count += 1
+        logger.info(f"Loaded {count} emails to summarize.")
+        return
+
+    loaded = [email async for email in emails]
+    groups = await asyncio.to_thread(
+        email_grouping.group_emails,
+        loaded,
+        collapse_threads=settings.SUMMARY_THREAD_COLLAPSING,
+        min_similarity=(
+            settings.NEAR_DUPLICATE_MIN_SIMILARITY
+            if settings.NEAR_DUPLICATE_CLUSTERING
+            else None
+        ),
+        max_chars=settings.BODY_MAX_CHARS,
     )
+    logger.info(
+        f"Loaded {len(loaded)} emails to summarize as {len(groups)} "
+        f"groups: {len(loaded) - len(groups)} LLM calls saved."
+    )
+    for group in groups:
+        yield group
+
+
+async def _pack_groups(
+    groups: AsyncIterator[EmailGroup],
+) -> AsyncIterator[List[EmailGroup]]:
+    """
+    Groups to summarize in one request each. With SUMMARY_PACKING, short
+    emails are packed together up to SUMMARY_PACK_TOKEN_BUDGET body
+    tokens and SUMMARY_PACK_MAX_EMAILS emails; otherwise, and for long
+    emails, a pack is a single group.
+    """
+    if not settings.SUMMARY_PACKING:
+        async for group in groups:
+            yield [group]
+        return
+
+    pack: List[EmailGroup] = []
+    pack_tokens = 0
+    async for group in groups:
+        # The raw body bounds what is left of it after preprocessing
+        size = min(
+            token_budget.count_tokens(group.email.body),
+            settings.SUMMARY_BODY_TOKEN_BUDGET,
+        )
+        if size > settings.SUMMARY_PACK_MAX_EMAIL_TOKENS:
+            yield [group]
+            continue
+        if pack and (
+            pack_tokens + size > settings.SUMMARY_PACK_TOKEN_BUDGET
+            or len(pack) >= settings.SUMMARY_PACK_MAX_EMAILS
+        ):
+            yield pack
+            pack, pack_tokens = [], 0
+        pack.append(group)
+        pack_tokens += size
+    if pack:
+        yield pack
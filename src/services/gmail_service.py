@@ -1,34 +1,347 @@
+import asyncio
+import json
+import re
+import uuid
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from urllib.parse import urlencode
+
 import httpx
 
+from core import http_client, retry
+from core.rate_limiter import TokenBucket
+from core.settings import settings
 
-async def list_messages(
-    user_id: str, access_token: str, query: str = ""
-) -> list:
-    url = f"https://gmail.googleapis.com/gmail/v1/users/{user_id}/messages"
-    params = {"q": query}
+GMAIL_API_URL = "https://gmail.googleapis.com/gmail/v1"
+GMAIL_BATCH_URL = "https://gmail.googleapis.com/batch/gmail/v1"
+GMAIL_BATCH_MAX_SIZE = 100
+GMAIL_BATCH_MAX_RETRIES = 3
+GMAIL_LIST_MAX_RESULTS = 100
+# Status line of a batch sub-response, e.g. "HTTP/1.1 200 OK"
+_STATUS_LINE_RE = re.compile(r"HTTP/\S+ (\d{3})\b")
+IGNORED_HISTORY_LABELS = {"DRAFT", "SPAM", "TRASH"}
 
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json",
+# Quota units charged by Gmail per method
+QUOTA_UNITS = {
+    "messages.list": 5,
+    "messages.get": 5,
+    "history.list": 2,
+    "getProfile": 1,
+}
+
+# Partial responses: headers and labels first, then only the MIME tree
+# fields needed to decode text bodies (attachments carry no body/data)
+METADATA_PARAMS: Dict[str, Any] = {
+    "format": "metadata",
+    "metadataHeaders": [
+        "Subject",
+        "From",
+        "Date",
+        "List-Unsubscribe",
+        "List-Id",
+        "Precedence",
+    ],
+    "fields": "id,threadId,labelIds,sizeEstimate,payload/headers",
+}
+_PART_FIELDS = "mimeType,body/data"
+BODY_PARAMS: Dict[str, Any] = {
+    "format": "full",
+    "fields": (
+        f"id,payload({_PART_FIELDS},parts({_PART_FIELDS},"
+        f"parts({_PART_FIELDS},parts({_PART_FIELDS}))))"
+    ),
+}
+
+
+class HistoryExpiredError(Exception):
+    """The startHistoryId is too old (or invalid) for users.history.list"""
+
+
+async def iter_message_pages(
+    user_id: str,
+    access_token: str,
+    query: str = "",
+    max_results: int = GMAIL_LIST_MAX_RESULTS,
+    limit: int | None = None,
+) -> AsyncIterator[List[dict]]:
+    """
+    Yield pages of message references, following nextPageToken lazily.
+
+    max_results is the page size requested from Gmail and limit is a hard
+    cap on the total number of messages yielded.
+    """
+    url = f"{GMAIL_API_URL}/users/{user_id}/messages"
+    params = {"q": query, "maxResults": min(max_results, 500)}
+
+    remaining = limit
+    while remaining is None or remaining > 0:
+        if remaining is not None:
+            params["maxResults"] = min(params["maxResults"], remaining)
+
+        response = await _request(
+            "GET",
+            url,
+            access_token,
+            QUOTA_UNITS["messages.list"],
+            params=params,
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        page = data.get("messages", [])
+        if remaining is not None:
+            page = page[:remaining]
+            remaining -= len(page)
+        if page:
+            yield page
+
+        if not data.get("nextPageToken"):
+            break
+        params["pageToken"] = data["nextPageToken"]
+
+
+async def get_profile(user_id: str, access_token: str) -> dict:
+    url = f"{GMAIL_API_URL}/users/{user_id}/profile"
+
+    response = await _request(
+        "GET", url, access_token, QUOTA_UNITS["getProfile"]
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+async def iter_history_message_ids(
+    user_id: str,
+    access_token: str,
+    start_history_id: str,
+    max_results: int = GMAIL_LIST_MAX_RESULTS,
+    limit: int | None = None,
+) -> AsyncIterator[List[str]]:
+    """
+    Yield pages of ids of messages added since start_history_id.
+
+    Raises HistoryExpiredError when Gmail no longer has history for
+    start_history_id, in which case the caller must do a full sync.
+    """
+    url = f"{GMAIL_API_URL}/users/{user_id}/history"
+    params = {
+        "startHistoryId": start_history_id,
+        "historyTypes": "messageAdded",
+        "maxResults": min(max_results, 500),
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, headers=headers, params=params)
+    seen = set()
+    while limit is None or len(seen) < limit:
+        response = await _request(
+            "GET",
+            url,
+            access_token,
+            QUOTA_UNITS["history.list"],
+            params=params,
+        )
+        if response.status_code == httpx.codes.NOT_FOUND:
+            raise HistoryExpiredError(
+                f"History {start_history_id} is no longer available"
+            )
         response.raise_for_status()
-        return response.json().get("messages", [])
+        data = response.json()
+
+        page = []
+        for record in data.get("history", []):
+            for added in record.get("messagesAdded", []):
+                message = added["message"]
+                labels = set(message.get("labelIds", []))
+                if message["id"] in seen or labels & IGNORED_HISTORY_LABELS:
+                    continue
+                if limit is not None and len(seen) >= limit:
+                    break
+                seen.add(message["id"])
+                page.append(message["id"])
+        if page:
+            yield page
+
+        if not data.get("nextPageToken"):
+            break
+        params["pageToken"] = data["nextPageToken"]
 
 
 async def get_message(
-    user_id: str, access_token: str, message_id: str
+    user_id: str,
+    access_token: str,
+    message_id: str,
+    params: Dict[str, Any] | None = None,
 ) -> dict:
-    url = f"https://gmail.googleapis.com/gmail/v1/users/{user_id}/messages/{message_id}"
+    url = f"{GMAIL_API_URL}/users/{user_id}/messages/{message_id}"
 
+    response = await _request(
+        "GET",
+        url,
+        access_token,
+        QUOTA_UNITS["messages.get"],
+        params=params,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+async def get_messages(
+    user_id: str,
+    access_token: str,
+    message_ids: List[str],
+    params: Dict[str, Any] | None = None,
+    batch_size: int = GMAIL_BATCH_MAX_SIZE,
+) -> Dict[str, dict]:
+    """
+    Fetch several messages through the Gmail batch endpoint.
+
+    Returns a mapping of message id to message. Sub-requests that fail with
+    a retryable status are sent again in a new batch; messages that still
+    fail (or are not found) are left out of the result.
+    """
+    batch_size = max(1, min(batch_size, GMAIL_BATCH_MAX_SIZE))
+    messages: Dict[str, dict] = {}
+    pending = list(dict.fromkeys(message_ids))
+
+    for attempt in range(GMAIL_BATCH_MAX_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(retry.retry_delay(attempt - 1))
+
+        failed = []
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start : start + batch_size]
+            responses = await _send_batch(user_id, access_token, chunk, params)
+            for message_id in chunk:
+                status, payload = responses.get(message_id, (503, None))
+                if status == httpx.codes.OK and payload:
+                    messages[message_id] = payload
+                elif status in retry.RETRYABLE_STATUS_CODES:
+                    failed.append(message_id)
+
+        if not failed:
+            break
+        pending = failed
+
+    return messages
+
+
+async def _send_batch(
+    user_id: str,
+    access_token: str,
+    message_ids: List[str],
+    params: Dict[str, Any] | None = None,
+) -> Dict[str, Tuple[int, dict | None]]:
+    boundary = f"batch_{uuid.uuid4().hex}"
+    query = f"?{urlencode(params, doseq=True)}" if params else ""
+    parts = [
+        f"--{boundary}\r\n"
+        "Content-Type: application/http\r\n"
+        f"Content-ID: <{message_id}>\r\n\r\n"
+        f"GET /gmail/v1/users/{user_id}/messages/{message_id}{query}\r\n"
+        "Accept: application/json\r\n\r\n"
+        for message_id in message_ids
+    ]
+    body = "".join(parts) + f"--{boundary}--\r\n"
+
+    # Every sub-request is charged as its own messages.get
+    response = await _request(
+        "POST",
+        GMAIL_BATCH_URL,
+        access_token,
+        QUOTA_UNITS["messages.get"] * len(message_ids),
+        headers={
+            "Accept": "multipart/mixed",
+            "Content-Type": f"multipart/mixed; boundary={boundary}",
+        },
+        content=body,
+    )
+    if retry.is_retryable(response):
+        return {}
+    response.raise_for_status()
+
+    return _parse_batch_response(
+        response.headers.get("Content-Type", ""), response.text
+    )
+
+
+async def _request(
+    method: str,
+    url: str,
+    access_token: str,
+    quota_units: int,
+    **kwargs,
+) -> httpx.Response:
+    """
+    Send a Gmail request within the user's quota, retrying rate limit and
+    server errors with backoff
+    """
+    client = http_client.get_http_client("gmail")
+    limiter = _quota_limiter(access_token)
     headers = {
         "Authorization": f"Bearer {access_token}",
         "Accept": "application/json",
+        **kwargs.pop("headers", {}),
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+    async def send() -> httpx.Response:
+        await limiter.acquire(quota_units)
+        return await client.request(method, url, headers=headers, **kwargs)
+
+    return await retry.send_with_retry(send)
+
+
+@lru_cache(maxsize=256)
+def _quota_limiter(access_token: str) -> TokenBucket:
+    # Gmail quotas are per user, and an access token belongs to one user
+    return TokenBucket(settings.GMAIL_QUOTA_UNITS_PER_SECOND)
+
+
+def _parse_batch_response(
+    content_type: str, text: str
+) -> Dict[str, Tuple[int, dict | None]]:
+    """
+    Map each sub-response Content-ID to its (status, JSON body). Parts
+    without a Content-ID or a readable status line are left out, so
+    get_messages retries their messages.
+    """
+    boundary = next(
+        (
+            param.split("=", 1)[1].strip('"')
+            for param in content_type.split(";")
+            if param.strip().startswith("boundary=")
+        ),
+        None,
+    )
+    if not boundary:
+        raise ValueError(f"Batch response without boundary: {content_type}")
+
+    responses: Dict[str, Tuple[int, dict | None]] = {}
+    text = text.replace("\r\n", "\n")
+    for raw_part in text.split(f"--{boundary}"):
+        part = raw_part.strip()
+        if not part or part == "--":
+            continue
+
+        part_headers, _, http_response = part.partition("\n\n")
+        content_id = next(
+            (
+                line.split(":", 1)[1].strip()
+                for line in part_headers.splitlines()
+                if line.lower().startswith("content-id:")
+            ),
+            "",
+        )
+        # Gmail answers with "<response-{Content-ID}>"
+        message_id = content_id.strip("<>").removeprefix("response-")
+
+        status_line, _, rest = http_response.partition("\n")
+        _, _, payload = rest.partition("\n\n")
+        status_match = _STATUS_LINE_RE.match(status_line)
+        if not message_id or not status_match:
+            continue
+        status = int(status_match.group(1))
+        try:
+            responses[message_id] = (status, json.loads(payload))
+        except json.JSONDecodeError:
+            responses[message_id] = (status, None)
+
+    return responses
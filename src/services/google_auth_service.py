@@ -1,25 +1,117 @@
+import asyncio
+import time
+from functools import cache
 from typing import Any, Dict
 
-import httpx
-
+from core import http_client
 from core.settings import settings
+from core.token_cache import CachedToken, FileTokenStore, MemoryTokenStore
+from domain.mail_account import MailAccount
+from services import mail_account_service
 
 GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+# Google access tokens last an hour when expires_in is missing
+DEFAULT_TOKEN_LIFETIME_SECONDS = 3600
+
+_memory_store = MemoryTokenStore()
+_refreshes: Dict[str, asyncio.Task] = {}
+
 
+async def get_access_token(mail_account: MailAccount, *, logger) -> str:
+    """
+    Access token of a mail account, refreshed only when the cached one is
+    missing or about to expire.
 
-async def get_access_token(
-    mail_account_credentials: Dict[str, Any], *, logger
-) -> str:
-    if not mail_account_credentials.get("refresh_token"):
+    Concurrent calls for the same account share a single refresh request.
+    """
+    credentials = mail_account.credentials or {}
+    if not credentials.get("refresh_token"):
         logger.warning("No refresh token found in mail account credentials.")
         raise ValueError("No refresh token found in mail account credentials.")
 
+    key = str(mail_account.id)
+    token = _get_cached_token(key, credentials)
+    if token:
+        logger.info("Using cached access token.")
+        return token.access_token
+
+    refresh = _refreshes.get(key)
+    if refresh is None or refresh.get_loop() is not asyncio.get_running_loop():
+        refresh = asyncio.create_task(
+            _refresh_and_store(mail_account, logger=logger)
+        )
+        _refreshes[key] = refresh
+        refresh.add_done_callback(lambda task: _forget_refresh(key, task))
+
+    # Shielded so a cancelled caller does not cancel the other waiters
+    token = await asyncio.shield(refresh)
+    return token.access_token
+
+
+def _get_cached_token(
+    key: str, credentials: Dict[str, Any]
+) -> CachedToken | None:
+    margin = settings.GOOGLE_TOKEN_EXPIRY_MARGIN_SECONDS
+    token = _memory_store.get(key)
+    if token and token.is_fresh(margin):
+        return token
+
+    token = None
+    if settings.GOOGLE_TOKEN_CACHE == "tmp":
+        token = _file_store().get(key)
+    elif settings.GOOGLE_TOKEN_CACHE == "supabase" and credentials.get(
+        "access_token"
+    ):
+        token = CachedToken(
+            credentials["access_token"], credentials.get("expires_at", 0)
+        )
+
+    if token and token.is_fresh(margin):
+        _memory_store.set(key, token)
+        return token
+    return None
+
+
+async def _refresh_and_store(
+    mail_account: MailAccount, *, logger
+) -> CachedToken:
     tokens = await _refresh_access_token(
-        mail_account_credentials["refresh_token"], logger=logger
+        mail_account.credentials["refresh_token"], logger=logger
     )
     logger.info("Access token refreshed successfully.")
 
-    return tokens["access_token"]
+    token = CachedToken(
+        tokens["access_token"],
+        time.time() + tokens.get("expires_in", DEFAULT_TOKEN_LIFETIME_SECONDS),
+    )
+    key = str(mail_account.id)
+    _memory_store.set(key, token)
+
+    try:
+        if settings.GOOGLE_TOKEN_CACHE == "tmp":
+            _file_store().set(key, token)
+        elif settings.GOOGLE_TOKEN_CACHE == "supabase":
+            await mail_account_service.update_access_token(
+                mail_account.id,
+                token.access_token,
+                token.expires_at,
+                logger=logger,
+            )
+    except Exception as e:
+        # The token is still cached in memory, so the run can go on
+        logger.warning(f"Could not persist access token: {e}")
+
+    return token
+
+
+def _forget_refresh(key: str, task: asyncio.Task) -> None:
+    if _refreshes.get(key) is task:
+        del _refreshes[key]
+
+
+@cache
+def _file_store() -> FileTokenStore:
+    return FileTokenStore(settings.GOOGLE_TOKEN_CACHE_DIR)
 
 
 async def _refresh_access_token(refresh_token: str, *, logger) -> dict:
@@ -31,7 +123,7 @@ async def _refresh_access_token(refresh_token: str, *, logger) -> dict:
         "grant_type": "refresh_token",
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(GOOGLE_TOKEN_URL, data=data)
-        response.raise_for_status()
-        return response.json()
+    client = http_client.get_http_client("google_oauth")
+    response = await client.post(GOOGLE_TOKEN_URL, data=data)
+    response.raise_for_status()
+    return response.json()
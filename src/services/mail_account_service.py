@@ -1,19 +1,43 @@
 import uuid
 
-from core.supabase_client import create_supabase_client
+from core.supabase_client import get_supabase_client
+from domain.account_context import AccountContext
+from domain.delivery_channel import DeliveryChannel
 from domain.mail_account import MailAccount
+from domain.user import User
 
+# credentials holds the refresh token and, with GOOGLE_TOKEN_CACHE=supabase,
+# the cached access token
+MAIL_ACCOUNT_COLUMNS = (
+    "id, created_at, updated_at, user_id, service_type, account_email, "
+    "credentials, is_active, last_history_id"
+)
+USER_COLUMNS = "id, full_name, digest_time, timezone, mail_filter_rules"
+DELIVERY_CHANNEL_COLUMNS = (
+    "id, created_at, updated_at, user_id, channel_type, address, is_active"
+)
+ACCOUNT_CONTEXT_SELECT = (
+    f"{MAIL_ACCOUNT_COLUMNS}, "
+    f"users!inner({USER_COLUMNS}, "
+    f"delivery_channels({DELIVERY_CHANNEL_COLUMNS}))"
+)
 
-async def get_mail_account(
+
+async def get_account_context(
     mail_account_id: uuid.UUID, *, logger
-) -> MailAccount | None:
-    supabase = await create_supabase_client()
+) -> AccountContext | None:
+    """
+    Mail account, its owner and the owner's active delivery channels, in
+    one embedded PostgREST select
+    """
+    supabase = await get_supabase_client()
     try:
-        logger.info(f"Fetching mail account with ID: {mail_account_id}")
+        logger.info(f"Fetching account context for ID: {mail_account_id}")
         response = (
             await supabase.table("mail_accounts")
-            .select("*")
+            .select(ACCOUNT_CONTEXT_SELECT)
             .eq("id", str(mail_account_id))
+            .eq("users.delivery_channels.is_active", True)
             .execute()
         )
 
@@ -23,8 +47,72 @@ async def get_mail_account(
             )
             return None
 
-        logger.success(f"Mail account found: {response.data[0]}")
-        return MailAccount(**response.data[0])
+        row = response.data[0]
+        user = row.pop("users")
+        delivery_channels = user.pop("delivery_channels")
+        logger.success(
+            f"Account context found: {row['account_email']}, "
+            f"{len(delivery_channels)} active delivery channels"
+        )
+        return AccountContext(
+            mail_account=MailAccount(**row),
+            user=User(**user),
+            active_delivery_channels=[
+                DeliveryChannel(**channel) for channel in delivery_channels
+            ],
+        )
+    except Exception as e:
+        logger.error(f"Error fetching account context: {e}")
+        raise Exception(f"Error fetching account context: {e}") from e
+
+
+async def update_last_history_id(
+    mail_account_id: uuid.UUID, history_id: str, *, logger
+) -> None:
+    supabase = await get_supabase_client()
+    try:
+        logger.info(
+            f"Updating last history ID of mail account {mail_account_id} "
+            f"to {history_id}"
+        )
+        await (
+            supabase.table("mail_accounts")
+            .update({"last_history_id": history_id})
+            .eq("id", str(mail_account_id))
+            .execute()
+        )
+    except Exception as e:
+        logger.error(f"Error updating mail account history ID: {e}")
+        raise Exception(f"Error updating mail account history ID: {e}") from e
+
+
+async def update_access_token(
+    mail_account_id: uuid.UUID,
+    access_token: str,
+    expires_at: float,
+    *,
+    logger,
+) -> None:
+    """
+    Store a refreshed access token in the account's credentials, merged
+    into them in the database: the other keys are left as they are there,
+    not as this run read them
+    """
+    supabase = await get_supabase_client()
+    try:
+        logger.info(f"Updating access token of mail account {mail_account_id}")
+        await supabase.rpc(
+            "merge_mail_account_credentials",
+            {
+                "account_id": str(mail_account_id),
+                "patch": {
+                    "access_token": access_token,
+                    "expires_at": expires_at,
+                },
+            },
+        ).execute()
     except Exception as e:
-        logger.error(f"Error fetching mail account: {e}")
-        raise Exception(f"Error fetching mail account: {e}") from e
+        logger.error(f"Error updating mail account access token: {e}")
+        raise Exception(
+            f"Error updating mail account access token: {e}"
+        ) from e
@@ -0,0 +1,55 @@
+import uuid
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# SQS refuses DelaySeconds above 15 minutes
+SQS_MAX_DELAY_SECONDS = 900
+
+
+def current_slot(now: datetime, slot_minutes: int) -> datetime:
+    """Start of the slot_minutes-long slot of the day `now` falls in"""
+    now = now.astimezone(timezone.utc)
+    minutes = now.hour * 60 + now.minute
+    start = minutes - minutes % slot_minutes
+    return now.replace(
+        hour=start // 60, minute=start % 60, second=0, microsecond=0
+    )
+
+
+def get_zone(timezone_name: str) -> ZoneInfo:
+    """ZoneInfo of an IANA timezone name, UTC when it is unknown"""
+    try:
+        return ZoneInfo(timezone_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+
+def is_digest_due(
+    digest_time: time,
+    timezone_name: str,
+    slot_start: datetime,
+    slot_minutes: int,
+) -> bool:
+    """
+    Whether a digest at `digest_time` local time in `timezone_name` falls in
+    the slot starting at `slot_start`. Unknown timezones count as UTC.
+    """
+    zone = get_zone(timezone_name)
+    slot_end = slot_start + timedelta(minutes=slot_minutes)
+    local_date = slot_start.astimezone(zone).date()
+    # A slot can straddle local midnight, so the next day is checked too
+    return any(
+        slot_start
+        <= datetime.combine(day, digest_time, tzinfo=zone)
+        < slot_end
+        for day in (local_date, local_date + timedelta(days=1))
+    )
+
+
+def spread_delay_seconds(mail_account_id: str, slot_minutes: int) -> int:
+    """
+    DelaySeconds for an account's job, spreading a slot's jobs evenly over
+    the slot. Derived from the id so an account keeps its offset.
+    """
+    window = min(slot_minutes * 60, SQS_MAX_DELAY_SECONDS)
+    return uuid.UUID(mail_account_id).int % window
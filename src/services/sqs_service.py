@@ -0,0 +1,127 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+from typing import Any, Dict, List, Tuple
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+from core import retry
+from core.settings import settings
+
+# SendMessageBatch accepts at most 10 entries
+SQS_BATCH_MAX_SIZE = 10
+
+
+async def send_messages(
+    queue_url: str,
+    messages: Dict[str, str],
+    delays: Dict[str, int] | None = None,
+    *,
+    logger,
+) -> Tuple[int, int]:
+    """
+    Send {entry id: body} messages in batches of 10, with up to
+    SQS_SEND_CONCURRENCY batches in flight. `delays` optionally holds the
+    DelaySeconds of each entry id.
+
+    Entries that fail for a reason that is not the sender's fault are
+    retried by id. Returns (sent, failed) entry counts.
+    """
+    ids = list(messages)
+    size = SQS_BATCH_MAX_SIZE
+    delays = delays or {}
+    batches = [
+        {
+            entry_id: _entry(entry_id, messages[entry_id], delays)
+            for entry_id in ids[i : i + size]
+        }
+        for i in range(0, len(ids), size)
+    ]
+    semaphore = asyncio.Semaphore(settings.SQS_SEND_CONCURRENCY)
+    failed = await asyncio.gather(
+        *(
+            _send_batch(queue_url, batch, semaphore, logger=logger)
+            for batch in batches
+        )
+    )
+    failed_count = sum(len(entry_ids) for entry_ids in failed)
+    return len(messages) - failed_count, failed_count
+
+
+def _entry(entry_id: str, body: str, delays: Dict[str, int]) -> Dict[str, Any]:
+    entry = {"Id": entry_id, "MessageBody": body}
+    if delays.get(entry_id):
+        entry["DelaySeconds"] = delays[entry_id]
+    return entry
+
+
+async def _send_batch(
+    queue_url: str,
+    entries: Dict[str, Dict[str, Any]],
+    semaphore: asyncio.Semaphore,
+    *,
+    logger,
+) -> List[str]:
+    """Send one batch; returns the ids that could not be sent"""
+    pending = dict(entries)
+    rejected: List[str] = []
+    loop = asyncio.get_running_loop()
+
+    for attempt in range(settings.SQS_SEND_MAX_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(retry.retry_delay(attempt - 1))
+
+        async with semaphore:
+            try:
+                response = await loop.run_in_executor(
+                    _get_executor(),
+                    lambda: _sqs_client().send_message_batch(
+                        QueueUrl=queue_url,
+                        Entries=list(pending.values()),
+                    ),
+                )
+            except (BotoCoreError, ClientError) as e:
+                logger.warning(
+                    f"SQS batch of {len(pending)} messages failed: {e}"
+                )
+                continue
+
+        for entry in response.get("Successful", []):
+            pending.pop(entry["Id"], None)
+        for entry in response.get("Failed", []):
+            if entry.get("SenderFault"):
+                logger.error(
+                    f"SQS rejected message {entry['Id']}: "
+                    f"{entry.get('Code')} {entry.get('Message')}"
+                )
+                pending.pop(entry["Id"], None)
+                rejected.append(entry["Id"])
+        if not pending:
+            break
+
+    if pending:
+        logger.error(
+            f"Giving up on {len(pending)} SQS messages after "
+            f"{settings.SQS_SEND_MAX_RETRIES} retries: {list(pending)}"
+        )
+    return rejected + list(pending)
+
+
+@cache
+def _sqs_client():
+    return boto3.client(
+        "sqs",
+        endpoint_url=settings.SQS_ENDPOINT_URL or None,
+        config=Config(max_pool_connections=settings.SQS_SEND_CONCURRENCY),
+    )
+
+
+@cache
+def _get_executor() -> ThreadPoolExecutor:
+    # boto3 is blocking; a batch in flight holds one thread
+    return ThreadPoolExecutor(
+        max_workers=settings.SQS_SEND_CONCURRENCY,
+        thread_name_prefix="sqs-sender",
+    )
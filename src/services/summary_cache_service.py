@@ -0,0 +1,442 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import cache
+from typing import Dict, List, Protocol, Tuple
+
+from chains import summarize_email_batch_chain, summarize_email_chain
+from core.settings import settings
+from core.supabase_client import get_supabase_client
+from loaders import content_normalizer
+from loaders.email_record import EmailRecord
+from schemas.email_summary_schema import EmailSummarySchema
+
+SUPABASE_IN_FILTER_SIZE = 100
+# Entries are only reused under the version of the prompt they were made
+# with; with packing on, any summary may come from the packed prompt
+PROMPT_VERSION = (
+    summarize_email_batch_chain.PROMPT_VERSION
+    if settings.SUMMARY_PACKING
+    else summarize_email_chain.PROMPT_VERSION
+)
+# Shared entries live next to per-message ones, under a content key
+SHARED_KEY_PREFIX = "shared:"
+
+
+@dataclass(slots=True)
+class CachedSummary:
+    message_id: str
+    content_hash: str
+    summary: EmailSummarySchema
+
+
+@dataclass
+class SummaryCacheStats:
+    hits: int = 0
+    misses: int = 0
+    # Bulk mail summaries reused across accounts
+    shared_hits: int = 0
+    shared_misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class SummaryCacheBackend(Protocol):
+    async def get_many(
+        self, message_ids: List[str], version: str
+    ) -> Dict[str, CachedSummary]: ...
+
+    async def set_many(
+        self, entries: List[CachedSummary], version: str, mail_account_id: str
+    ) -> None: ...
+
+
+class MemorySummaryCache:
+    """LRU cache of at most max_entries summaries, each kept ttl seconds"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[
+            Tuple[str, str], Tuple[float, CachedSummary]
+        ] = OrderedDict()
+
+    async def get_many(
+        self, message_ids: List[str], version: str
+    ) -> Dict[str, CachedSummary]:
+        now = time.monotonic()
+        found = {}
+        for message_id in message_ids:
+            key = (message_id, version)
+            item = self._entries.get(key)
+            if not item:
+                continue
+            expires_at, entry = item
+            if expires_at <= now:
+                del self._entries[key]
+                continue
+            self._entries.move_to_end(key)
+            found[message_id] = entry
+        return found
+
+    async def set_many(
+        self, entries: List[CachedSummary], version: str, mail_account_id: str
+    ) -> None:
+        expires_at = time.monotonic() + self.ttl
+        for entry in entries:
+            key = (entry.message_id, version)
+            self._entries[key] = (expires_at, entry)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SQLiteSummaryCache:
+    """
+    MemorySummaryCache in a SQLite file, for local runs and tests; entries
+    past the TTL are ignored and the least recently used are pruned
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "create table if not exists email_summary_cache ("
+                " message_id text not null,"
+                " prompt_version text not null,"
+                " content_hash text not null,"
+                " summary text not null,"
+                " created_at real not null,"
+                " used_at real not null,"
+                " mail_account_id text,"
+                " primary key (message_id, prompt_version))"
+            )
+            columns = {
+                row[1]
+                for row in connection.execute(
+                    "pragma table_info(email_summary_cache)"
+                )
+            }
+            # Files created before entries recorded their account
+            if "mail_account_id" not in columns:
+                connection.execute(
+                    "alter table email_summary_cache"
+                    " add column mail_account_id text"
+                )
+
+    async def get_many(
+        self, message_ids: List[str], version: str
+    ) -> Dict[str, CachedSummary]:
+        return await asyncio.to_thread(self._get_many, message_ids, version)
+
+    async def set_many(
+        self, entries: List[CachedSummary], version: str, mail_account_id: str
+    ) -> None:
+        await asyncio.to_thread(
+            self._set_many, entries, version, mail_account_id
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _get_many(
+        self, message_ids: List[str], version: str
+    ) -> Dict[str, CachedSummary]:
+        if not message_ids:
+            return {}
+        now = time.time()
+        placeholders = ", ".join("?" * len(message_ids))
+        with closing(self._connect()) as connection, connection:
+            rows = connection.execute(
+                "select message_id, content_hash, summary"
+                " from email_summary_cache"
+                f" where message_id in ({placeholders})"
+                " and prompt_version = ? and created_at > ?",
+                (*message_ids, version, now - self.ttl),
+            ).fetchall()
+            connection.execute(
+                "update email_summary_cache set used_at = ?"
+                f" where message_id in ({placeholders})"
+                " and prompt_version = ?",
+                (now, *message_ids, version),
+            )
+        return {
+            message_id: CachedSummary(
+                message_id,
+                content_hash,
+                EmailSummarySchema.model_validate_json(summary),
+            )
+            for message_id, content_hash, summary in rows
+        }
+
+    def _set_many(
+        self, entries: List[CachedSummary], version: str, mail_account_id: str
+    ) -> None:
+        now = time.time()
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "insert or replace into email_summary_cache"
+                " (message_id, prompt_version, content_hash, summary,"
+                " created_at, used_at, mail_account_id)"
+                " values (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        entry.message_id,
+                        version,
+                        entry.content_hash,
+                        entry.summary.model_dump_json(),
+                        now,
+                        now,
+                        _owner(entry, mail_account_id),
+                    )
+                    for entry in entries
+                ],
+            )
+            connection.execute(
+                "delete from email_summary_cache where created_at <= ?",
+                (now - self.ttl,),
+            )
+            connection.execute(
+                "delete from email_summary_cache where rowid not in ("
+                " select rowid from email_summary_cache"
+                " order by used_at desc limit ?)",
+                (self.max_entries,),
+            )
+
+
+class SupabaseSummaryCache:
+    """
+    Summaries in the email_summary_cache table, ignored once older than
+    the TTL (see supabase/migrations/20261018083940_email_summary_cache.sql,
+    which also purges them):
+
+        create table email_summary_cache (
+            message_id text not null,
+            prompt_version text not null,
+            content_hash text not null,
+            summary jsonb not null,
+            created_at timestamptz not null default now(),
+            mail_account_id uuid references mail_accounts(id)
+                on delete cascade,
+            primary key (message_id, prompt_version)
+        );
+
+    Summaries of a message belong to its account and go when the account
+    is deleted; shared bulk mail summaries belong to none.
+    """
+
+    table = "email_summary_cache"
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+
+    async def get_many(
+        self, message_ids: List[str], version: str
+    ) -> Dict[str, CachedSummary]:
+        if not message_ids:
+            return {}
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+        supabase = await get_supabase_client()
+        found = {}
+        # The ids go in the query string, which has to stay short
+        for start in range(0, len(message_ids), SUPABASE_IN_FILTER_SIZE):
+            response = (
+                await supabase.table(self.table)
+                .select("message_id, content_hash, summary")
+                .in_(
+                    "message_id",
+                    message_ids[start : start + SUPABASE_IN_FILTER_SIZE],
+                )
+                .eq("prompt_version", version)
+                .gt("created_at", cutoff.isoformat())
+                .execute()
+            )
+            found.update(
+                (
+                    row["message_id"],
+                    CachedSummary(
+                        row["message_id"],
+                        row["content_hash"],
+                        EmailSummarySchema(**row["summary"]),
+                    ),
+                )
+                for row in response.data
+            )
+        return found
+
+    async def set_many(
+        self, entries: List[CachedSummary], version: str, mail_account_id: str
+    ) -> None:
+        if not entries:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        supabase = await get_supabase_client()
+        await (
+            supabase.table(self.table)
+            .upsert(
+                [
+                    {
+                        "message_id": entry.message_id,
+                        "prompt_version": version,
+                        "content_hash": entry.content_hash,
+                        "summary": entry.summary.model_dump(mode="json"),
+                        "created_at": now,
+                        "mail_account_id": _owner(entry, mail_account_id),
+                    }
+                    for entry in entries
+                ],
+                on_conflict="message_id,prompt_version",
+            )
+            .execute()
+        )
+
+
+_stats = SummaryCacheStats()
+
+
+def summary_cache_stats() -> SummaryCacheStats:
+    """Hits and misses of this process"""
+    return _stats
+
+
+def content_hash(email: EmailRecord) -> str:
+    """Hash of everything the summary prompt is given about the email"""
+    return hashlib.sha256(
+        json.dumps([
+            email.subject,
+            email.sender,
+            email.date,
+            email.body,
+        ]).encode()
+    ).hexdigest()
+
+
+async def get_cached_summaries(
+    message_ids: List[str], *, logger
+) -> Dict[str, CachedSummary]:
+    """
+    Cached summaries of these messages under the current prompt; they
+    still have to be matched with lookup() once the message is fetched
+    """
+    backend = _get_backend()
+    if not backend:
+        return {}
+    try:
+        return await backend.get_many(message_ids, PROMPT_VERSION)
+    except Exception as e:
+        # The cache only saves work, so a failing backend is not fatal
+        logger.warning(f"Could not read the summary cache: {e}")
+        return {}
+
+
+def lookup(
+    cached: Dict[str, CachedSummary], email: EmailRecord
+) -> EmailSummarySchema | None:
+    """Cached summary of the email, if its content has not changed"""
+    entry = cached.get(email.id)
+    if entry and entry.content_hash == content_hash(email):
+        _stats.hits += 1
+        return entry.summary
+    _stats.misses += 1
+    return None
+
+
+def is_shareable(email: EmailRecord) -> bool:
+    """
+    Only bulk mail is shared across accounts: a summary of a personal
+    email is never served to anyone else
+    """
+    return settings.SHARED_SUMMARY_DEDUP and email.is_bulk
+
+
+def shared_input(email: EmailRecord) -> Dict[str, str]:
+    """
+    Summary prompt input for shareable emails, stripped of what is
+    specific to one recipient so the shared summary cannot carry it
+    """
+    return {
+        "subject": email.subject,
+        "sender": email.sender,
+        "date": email.date,
+        "body": content_normalizer.normalize_broadcast_text(email.body),
+    }
+
+
+def shared_key(email: EmailRecord) -> str:
+    """Content address of a shareable email: sender, subject and body"""
+    digest = hashlib.sha256(
+        json.dumps([
+            content_normalizer.sender_address(email.sender),
+            content_normalizer.normalize_broadcast_text(email.subject),
+            content_normalizer.normalize_broadcast_text(email.body),
+        ]).encode()
+    ).hexdigest()
+    return f"{SHARED_KEY_PREFIX}{digest}"
+
+
+async def get_shared_summary(
+    email: EmailRecord, *, logger
+) -> EmailSummarySchema | None:
+    """Summary of identical bulk mail made for any account"""
+    backend = _get_backend()
+    if not backend:
+        return None
+    key = shared_key(email)
+    try:
+        found = await backend.get_many([key], PROMPT_VERSION)
+    except Exception as e:
+        logger.warning(f"Could not read the shared summary cache: {e}")
+        found = {}
+    if key in found:
+        _stats.shared_hits += 1
+        return found[key].summary
+    _stats.shared_misses += 1
+    return None
+
+
+async def store_summaries(
+    entries: List[CachedSummary], mail_account_id: uuid.UUID, *, logger
+) -> None:
+    """Cache summaries made for the account's digest"""
+    backend = _get_backend()
+    if not backend or not entries:
+        return
+    try:
+        await backend.set_many(entries, PROMPT_VERSION, str(mail_account_id))
+    except Exception as e:
+        logger.warning(f"Could not write the summary cache: {e}")
+
+
+def _owner(entry: CachedSummary, mail_account_id: str) -> str | None:
+    """Account an entry is deleted with; shared entries have none"""
+    if entry.message_id.startswith(SHARED_KEY_PREFIX):
+        return None
+    return mail_account_id
+
+
+@cache
+def _get_backend() -> SummaryCacheBackend | None:
+    ttl = settings.SUMMARY_CACHE_TTL_SECONDS
+    if settings.SUMMARY_CACHE == "memory":
+        return MemorySummaryCache(settings.SUMMARY_CACHE_MAX_ENTRIES, ttl)
+    if settings.SUMMARY_CACHE == "sqlite":
+        return SQLiteSummaryCache(
+            settings.SUMMARY_CACHE_SQLITE_PATH,
+            settings.SUMMARY_CACHE_MAX_ENTRIES,
+            ttl,
+        )
+    if settings.SUMMARY_CACHE == "supabase":
+        return SupabaseSummaryCache(ttl)
+    return None
@@ -1,7 +1,6 @@
 from http import HTTPStatus
 
-import httpx
-
+from core import http_client
 from core.settings import settings
 from domain.delivery_channel import DeliveryChannelEnum
 from services import user_service
@@ -61,11 +60,11 @@ async def handle_start_command(message: dict, *, logger) -> None:
 
 
 async def send_message(chat_id: int, text: str) -> bool:
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{TELEGRAM_API_URL}/sendMessage",
-            json={"chat_id": chat_id, "text": text},
-        )
-        return response.status_code == HTTPStatus.OK and response.json().get(
-            "ok", False
-        )
+    client = http_client.get_http_client("telegram")
+    response = await client.post(
+        f"{TELEGRAM_API_URL}/sendMessage",
+        json={"chat_id": chat_id, "text": text},
+    )
+    return response.status_code == HTTPStatus.OK and response.json().get(
+        "ok", False
+    )
@@ -1,13 +1,13 @@
 import json
 import uuid
 
-from core.supabase_client import create_supabase_client
+from core.supabase_client import get_supabase_client
 from domain.delivery_channel import DeliveryChannel, DeliveryChannelEnum
 from domain.user import User
 
 
 async def get_user(user_id: uuid.UUID, *, logger) -> User | None:
-    supabase = await create_supabase_client()
+    supabase = await get_supabase_client()
     try:
         logger.info(f"Fetching user with ID: {user_id}")
         response = (
@@ -36,7 +36,7 @@ async def add_delivery_channel(
     *,
     logger,
 ) -> DeliveryChannel:
-    supabase = await create_supabase_client()
+    supabase = await get_supabase_client()
     try:
         delivery_channel = DeliveryChannel(
             user_id=user_id,
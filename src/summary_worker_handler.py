@@ -1,7 +1,12 @@
 import asyncio
 import json
+from datetime import datetime, timezone
+from typing import Tuple
 
+from core import event_loop, http_client
 from core.logger import L
+from core.memory import peak_rss_mb
+from core.settings import settings
 from services.email_summary_service import generate_daily_email_summary
 
 
@@ -11,41 +16,110 @@ def lambda_handler(event, context):
 
     logger.info("Starting execution of the worker function.")
 
-    return asyncio.run(main_logic(event, context, logger=logger))
+    return event_loop.run(main_logic(event, context, logger=logger))
 
 
 async def main_logic(event, context, *, logger):
+    """
+    Process the accounts of an SQS batch concurrently, up to
+    WORKER_ACCOUNT_CONCURRENCY at a time.
+
+    Only the records whose account failed are reported back in
+    batchItemFailures, so SQS redelivers those and deletes the rest.
+    """
     logger.info(f"Received event: {json.dumps(event)}")
     logger.info("Processing SQS event records...")
 
-    for record in event.get("Records", []):
-        try:
-            message_body = json.loads(record.get("body", "{}"))
-            mail_account_id = message_body.get("mail_account_id")
+    peak_before = peak_rss_mb()
+    semaphore = asyncio.Semaphore(settings.WORKER_ACCOUNT_CONCURRENCY)
+    results = await asyncio.gather(
+        *(
+            process_record(record, semaphore, logger=logger)
+            for record in event.get("Records", [])
+        )
+    )
+    failed_message_ids = [
+        message_id for message_id, succeeded in results if not succeeded
+    ]
 
-            if not mail_account_id:
-                logger.warning(
-                    "SQS message does not contain 'mail_account_id': "
-                    f"{record.get('body')}"
-                )
-                continue
+    logger.info(
+        f"Processed {len(results)} records, {len(failed_message_ids)} failed."
+    )
+    # Accounts of a batch run at the same time, so only the invocation as
+    # a whole has a meaningful peak
+    peak_after = peak_rss_mb()
+    logger.info(
+        f"Peak RSS after this invocation: {peak_after:.1f} MB "
+        f"(+{peak_after - peak_before:.1f} MB)"
+    )
+    logger.info(f"HTTP pool stats: {http_client.pool_stats()}")
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": message_id} for message_id in failed_message_ids
+        ]
+    }
 
-            await process_single_account(mail_account_id, logger=logger)
 
-        except json.JSONDecodeError as e:
-            logger.exception(
-                "Failed to decode JSON from SQS message body: "
-                f"{record.get('body')}. Error: {e}"
+async def process_record(
+    record: dict, semaphore: asyncio.Semaphore, *, logger
+) -> Tuple[str, bool]:
+    """Returns (message id, whether the record needs no redelivery)"""
+    message_id = record.get("messageId", "")
+    try:
+        message_body = json.loads(record.get("body", "{}"))
+    except json.JSONDecodeError as e:
+        # Redelivering a malformed message would fail the same way
+        logger.exception(
+            "Failed to decode JSON from SQS message body: "
+            f"{record.get('body')}. Error: {e}"
+        )
+        return message_id, True
+
+    mail_account_id = message_body.get("mail_account_id")
+    if not mail_account_id:
+        logger.warning(
+            "SQS message does not contain 'mail_account_id': "
+            f"{record.get('body')}"
+        )
+        return message_id, True
+
+    async with semaphore:
+        try:
+            await process_single_account(
+                mail_account_id,
+                _sent_at(record),
+                logger=logger.bind(mail_account_id=mail_account_id),
             )
         except Exception as e:
             logger.exception(
                 "An error occurred while processing SQS message: "
                 f"{record.get('body')}. Error: {e}"
             )
-            raise e
+            return message_id, False
+    return message_id, True
 
-    return {"statusCode": 200, "body": json.dumps({"status": "ok"})}
 
+def _sent_at(record: dict) -> datetime | None:
+    # Unlike the receive time, SentTimestamp is the same on every
+    # redelivery, so retries resume the same digest
+    sent_timestamp = record.get("attributes", {}).get("SentTimestamp")
+    if not sent_timestamp:
+        return None
+    return datetime.fromtimestamp(int(sent_timestamp) / 1000, timezone.utc)
 
-async def process_single_account(mail_account_id, *, logger):
-    await generate_daily_email_summary(mail_account_id, logger=logger)
+
+async def process_single_account(mail_account_id, dispatched_at, *, logger):
+    # Per account, the peak only means something when accounts run one at
+    # a time
+    peak_before = peak_rss_mb()
+    try:
+        await generate_daily_email_summary(
+            mail_account_id, dispatched_at, logger=logger
+        )
+    finally:
+        if settings.WORKER_ACCOUNT_CONCURRENCY == 1:
+            peak_after = peak_rss_mb()
+            logger.info(
+                f"Peak RSS after mail account {mail_account_id}: "
+                f"{peak_after:.1f} MB (+{peak_after - peak_before:.1f} MB)"
+            )
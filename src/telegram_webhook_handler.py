@@ -1,6 +1,6 @@
-import asyncio
 import json
 
+from core import event_loop
 from core.logger import L
 from core.settings import settings
 from services.telegram_service import deal_with_webhook_message
@@ -27,7 +27,7 @@ def lambda_handler(event, context):
             }
 
         payload = json.loads(event.get("body", "{}"))
-        asyncio.run(main_logic(payload, logger=logger))
+        event_loop.run(main_logic(payload, logger=logger))
 
         return {"statusCode": 200, "body": json.dumps({"status": "ok"})}
     except Exception as e:
@@ -0,0 +1,4 @@
+-- Gmail historyId the next incremental sync starts from; null until the
+-- first digest of the account is delivered
+alter table mail_accounts
+    add column if not exists last_history_id text;
@@ -0,0 +1,5 @@
+-- Local time each user's daily digest is sent at, and the IANA timezone
+-- it is in; read by the dispatcher when DISPATCH_MODE is scheduled
+alter table users
+    add column if not exists digest_time time not null default '23:00',
+    add column if not exists timezone text not null default 'UTC';
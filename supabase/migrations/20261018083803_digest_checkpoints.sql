@@ -0,0 +1,28 @@
+-- Stage checkpoints of each account's daily digest (CHECKPOINT_STORE=supabase)
+create table if not exists digest_checkpoints (
+    mail_account_id uuid not null references mail_accounts(id)
+        on delete cascade,
+    digest_date date not null,
+    state jsonb not null,
+    -- Set by the conditional update that claims delivery, never by a
+    -- plain save
+    delivery_started_at timestamptz,
+    updated_at timestamptz not null default now(),
+    primary key (mail_account_id, digest_date)
+);
+
+alter table digest_checkpoints enable row level security;
+
+create index if not exists digest_checkpoints_digest_date_idx
+    on digest_checkpoints (digest_date);
+
+-- A checkpoint is only read by the runs of its own digest, so rows are
+-- kept as long as CHECKPOINT_RETENTION_DAYS (7) and purged nightly
+create extension if not exists pg_cron;
+
+select cron.schedule(
+    'purge-digest-checkpoints',
+    '30 3 * * *',
+    $$delete from digest_checkpoints
+      where digest_date < current_date - 7$$
+);
@@ -0,0 +1,31 @@
+-- Email summaries by message id and prompt version (SUMMARY_CACHE=supabase).
+-- Shared bulk mail summaries are keyed by content ("shared:<sha256>") and
+-- have no account.
+create table if not exists email_summary_cache (
+    message_id text not null,
+    prompt_version text not null,
+    content_hash text not null,
+    summary jsonb not null,
+    created_at timestamptz not null default now(),
+    -- Summaries of an account's mail are deleted with the account
+    mail_account_id uuid references mail_accounts(id) on delete cascade,
+    primary key (message_id, prompt_version)
+);
+
+alter table email_summary_cache enable row level security;
+
+create index if not exists email_summary_cache_mail_account_id_idx
+    on email_summary_cache (mail_account_id);
+create index if not exists email_summary_cache_created_at_idx
+    on email_summary_cache (created_at);
+
+-- Entries are ignored once older than SUMMARY_CACHE_TTL_SECONDS (7 days);
+-- purge them nightly, along with those of retired prompt versions
+create extension if not exists pg_cron;
+
+select cron.schedule(
+    'purge-email-summary-cache',
+    '45 3 * * *',
+    $$delete from email_summary_cache
+      where created_at < now() - interval '7 days'$$
+);
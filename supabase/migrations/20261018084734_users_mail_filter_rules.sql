@@ -0,0 +1,11 @@
+-- Per-user mail filter rules, a JSON array of MailFilterRule objects;
+-- null means the default rules of loaders.mail_filter
+alter table users
+    add column if not exists mail_filter_rules jsonb;
+
+alter table users
+    add constraint users_mail_filter_rules_is_array
+    check (
+        mail_filter_rules is null
+        or jsonb_typeof(mail_filter_rules) = 'array'
+    );
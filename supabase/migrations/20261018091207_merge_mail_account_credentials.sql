@@ -0,0 +1,17 @@
+-- Merges keys into mail_accounts.credentials in one statement: a refreshed
+-- access token is written without the rest of the credentials a run read
+-- earlier, so it never overwrites a refresh token stored in the meantime
+create or replace function merge_mail_account_credentials(
+    account_id uuid,
+    patch jsonb
+) returns void
+language sql
+as $$
+    update mail_accounts
+    set credentials = coalesce(credentials, '{}'::jsonb) || patch
+    where id = account_id;
+$$;
+
+-- Only the service role persists tokens
+revoke execute on function merge_mail_account_credentials(uuid, jsonb)
+    from public, anon, authenticated;
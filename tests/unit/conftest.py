@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# The Lambda code imports from the src root (its CodeUri), so tests do too
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+
+os.environ.setdefault("ENVIRONMENT", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,43 @@
+import pytest
+
+from loaders.body_extractors import (
+    FEED_CHUNK_SIZE,
+    html_to_text_lxml,
+    html_to_text_stream,
+)
+
+INLINE_HTML = (
+    "<p>Save <b>50</b>% today, <span>Maria</span>! "
+    "Total R$<b>82</b>,40 <a>here</a>.</p>"
+)
+
+
+@pytest.mark.parametrize("extract", [html_to_text_stream, html_to_text_lxml])
+def test_inline_tags_do_not_split_words(extract):
+    assert (
+        extract(INLINE_HTML, 1000) == "Save 50% today, Maria! Total R$82,40 here."
+    )
+
+
+def test_blocks_become_collapsed_lines():
+    html = (
+        "<html><head><title>Ignored</title><style>p {}</style></head>"
+        "<body><div>  First\n   line </div><p>Second<br>third</p>"
+        "<script>ignored()</script></body></html>"
+    )
+
+    assert html_to_text_stream(html, 1000) == "First line\nSecond\nthird"
+
+
+def test_words_across_feed_chunks_stay_whole():
+    html = "<p>" + "x" * (FEED_CHUNK_SIZE - 3) + "yz tail</p>"
+
+    text = html_to_text_stream(html, 2 * FEED_CHUNK_SIZE)
+
+    assert text == "x" * (FEED_CHUNK_SIZE - 3) + "yz tail"
+
+
+def test_stops_at_max_chars():
+    html = "".join(f"<p>line {i}</p>" for i in range(1000))
+
+    assert html_to_text_stream(html, 20) == "line 0\nline 1\nline 2"
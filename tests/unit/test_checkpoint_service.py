@@ -0,0 +1,97 @@
+import sqlite3
+import uuid
+from datetime import date, timedelta
+
+import pytest
+
+from domain.digest_checkpoint import DigestCheckpoint, DigestStage
+from services.checkpoint_service import SQLiteCheckpointStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteCheckpointStore(str(tmp_path / "checkpoints.sqlite3"), 7)
+
+
+async def _saved_checkpoint(store, digest_date=None) -> DigestCheckpoint:
+    checkpoint = DigestCheckpoint(
+        mail_account_id=uuid.uuid4(),
+        digest_date=digest_date or date.today(),
+        listed=True,
+        summarized=True,
+        aggregated_summary="digest",
+    )
+    await store.save(checkpoint)
+    return checkpoint
+
+
+@pytest.mark.asyncio
+async def test_only_one_run_claims_delivery(store):
+    saved = await _saved_checkpoint(store)
+    first = await store.load(saved.mail_account_id, saved.digest_date)
+    second = await store.load(saved.mail_account_id, saved.digest_date)
+
+    assert await store.claim_delivery(first)
+    assert not await store.claim_delivery(second)
+    loaded = await store.load(saved.mail_account_id, saved.digest_date)
+    assert loaded.stage is DigestStage.DONE
+
+
+@pytest.mark.asyncio
+async def test_save_of_stale_state_keeps_the_claim(store):
+    saved = await _saved_checkpoint(store)
+    stale = await store.load(saved.mail_account_id, saved.digest_date)
+
+    assert await store.claim_delivery(saved)
+    await store.save(stale)
+
+    loaded = await store.load(saved.mail_account_id, saved.digest_date)
+    assert loaded.delivery_started_at == saved.delivery_started_at
+
+
+@pytest.mark.asyncio
+async def test_released_delivery_can_be_claimed_again(store):
+    saved = await _saved_checkpoint(store)
+    other = await store.load(saved.mail_account_id, saved.digest_date)
+
+    assert await store.claim_delivery(saved)
+    await store.release_delivery(saved)
+
+    loaded = await store.load(saved.mail_account_id, saved.digest_date)
+    assert loaded.stage is DigestStage.DELIVER
+    assert await store.claim_delivery(other)
+
+
+@pytest.mark.asyncio
+async def test_save_prunes_checkpoints_past_retention(store):
+    old = await _saved_checkpoint(store, date.today() - timedelta(days=8))
+    recent = await _saved_checkpoint(store, date.today() - timedelta(days=6))
+
+    await _saved_checkpoint(store)
+
+    assert await store.load(old.mail_account_id, old.digest_date) is None
+    assert await store.load(recent.mail_account_id, recent.digest_date)
+
+
+def test_opens_files_created_without_the_delivery_column(tmp_path):
+    path = tmp_path / "checkpoints.sqlite3"
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "create table digest_checkpoints ("
+            " mail_account_id text not null,"
+            " digest_date text not null,"
+            " state text not null,"
+            " updated_at text not null,"
+            " primary key (mail_account_id, digest_date))"
+        )
+
+    SQLiteCheckpointStore(str(path), 7)
+
+    with sqlite3.connect(path) as connection:
+        columns = {
+            row[1]
+            for row in connection.execute(
+                "pragma table_info(digest_checkpoints)"
+            )
+        }
+    assert "delivery_started_at" in columns
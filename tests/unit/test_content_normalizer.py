@@ -0,0 +1,149 @@
+from loaders.content_normalizer import (
+    is_bulk,
+    normalize_broadcast_text,
+    sender_address,
+    strip_quoted_reply,
+    strip_signature,
+)
+
+
+def test_strip_quoted_reply_cuts_at_reply_header():
+    text = (
+        "Sounds good, see you then.\n\n"
+        "On Mon, 3 Jun 2024 at 10:00, Ana <ana@example.com> wrote:\n"
+        "> Can we meet on Friday?\n"
+    )
+
+    assert strip_quoted_reply(text) == "Sounds good, see you then."
+
+
+def test_strip_quoted_reply_handles_wrapped_and_pt_br_headers():
+    wrapped = "Ok\n\nOn Mon, 3 Jun 2024 at 10:00, Ana\n<ana@example.com> wrote:\n> x"
+    pt_br = "Certo\n\nEm seg., 3 de jun. de 2024, Ana escreveu:\n> x"
+
+    assert strip_quoted_reply(wrapped) == "Ok"
+    assert strip_quoted_reply(pt_br) == "Certo"
+
+
+def test_strip_quoted_reply_cuts_outlook_header_block():
+    text = (
+        "Approved.\n\n"
+        "From: Ana <ana@example.com>\n"
+        "Sent: Monday, June 3, 2024 10:00 AM\n"
+        "Subject: Budget\n\n"
+        "Please approve the budget."
+    )
+
+    assert strip_quoted_reply(text) == "Approved."
+
+
+def test_strip_quoted_reply_drops_quoted_lines():
+    text = "> earlier message\nMy answer\n> more quote\nThanks"
+
+    assert strip_quoted_reply(text) == "My answer\nThanks"
+
+
+def test_strip_quoted_reply_keeps_forwarded_message():
+    text = (
+        "Please review the contract below.\n\n"
+        "---------- Forwarded message ---------\n"
+        "From: Legal <legal@example.com>\n"
+        "Date: Mon, 3 Jun 2024 at 10:00\n"
+        "Subject: Contract\n\n"
+        "Clause 1: the parties agree to the terms."
+    )
+
+    stripped = strip_quoted_reply(text)
+
+    assert stripped.startswith("Please review the contract below.")
+    assert "Clause 1: the parties agree to the terms." in stripped
+
+
+def test_strip_quoted_reply_keeps_apple_and_pt_br_forwards():
+    apple = (
+        "FYI\n\nBegin forwarded message:\n\n"
+        "From: Ana <ana@example.com>\nDate: June 3, 2024\n\nThe report."
+    )
+    pt_br = (
+        "Veja abaixo\n\n---------- Mensagem encaminhada ---------\n"
+        "De: Ana <ana@example.com>\nData: 3 de jun. de 2024\n\nO relatório."
+    )
+
+    assert strip_quoted_reply(apple).endswith("The report.")
+    assert strip_quoted_reply(pt_br).endswith("O relatório.")
+
+
+def test_strip_quoted_reply_cuts_forward_inside_quoted_history():
+    text = (
+        "Thanks!\n\n"
+        "On Mon, 3 Jun 2024 at 10:00, Ana <ana@example.com> wrote:\n"
+        "> ---------- Forwarded message ---------\n"
+        "> The report."
+    )
+
+    assert strip_quoted_reply(text) == "Thanks!"
+
+
+def test_strip_quoted_reply_returns_text_when_nothing_is_left():
+    assert strip_quoted_reply("> only a quote") == "> only a quote"
+
+
+def test_strip_signature_cuts_at_delimiter():
+    text = "See attached.\n\n-- \nJohn Doe\nCEO, Example Inc\n+1 555 0100"
+
+    assert strip_signature(text) == "See attached."
+
+
+def test_strip_signature_cuts_mobile_footer():
+    assert strip_signature("Ok!\n\nSent from my iPhone") == "Ok!"
+    assert strip_signature("Ok!\n\nEnviado do meu iPhone") == "Ok!"
+
+
+def test_strip_signature_keeps_long_text_after_a_delimiter():
+    text = "Part 1\n--\n" + "\n".join(f"line {i}" for i in range(30))
+
+    assert strip_signature(text) == text
+
+
+def test_strip_signature_without_signature():
+    assert strip_signature("Just a message.") == "Just a message."
+
+
+def test_is_bulk_from_list_headers_and_precedence():
+    assert is_bulk([{"name": "List-Unsubscribe", "value": "<mailto:x>"}])
+    assert is_bulk([{"name": "Precedence", "value": " Bulk "}])
+    assert not is_bulk([{"name": "Precedence", "value": "first-class"}])
+    assert not is_bulk([{"name": "Subject", "value": "List-Id"}])
+
+
+def test_normalize_broadcast_text_drops_what_differs_per_recipient():
+    first = (
+        "Hi Ana,\n"
+        "Our sale ends today: https://shop.example.com/sale?u=a1b2c3&t=9\n"
+        "Sent to ana@example.com, code AB12CD34EF56GH78IJ90"
+    )
+    second = (
+        "Hello Bruno,\n"
+        "Our sale   ends today: https://shop.example.com/sale?u=z9y8x7&t=1\n"
+        "Sent to bruno@example.org, code ZZ99YY88XX77WW66VV55"
+    )
+
+    assert normalize_broadcast_text(first) == normalize_broadcast_text(second)
+    assert normalize_broadcast_text(first) == (
+        "Our sale ends today: <shop.example.com>\n"
+        "Sent to <email>, code <token>"
+    )
+
+
+def test_normalize_broadcast_text_keeps_what_the_broadcast_says():
+    assert normalize_broadcast_text("Sale ends today") != (
+        normalize_broadcast_text("Sale ends tomorrow")
+    )
+    # Short numbers (prices, dates) are content, not tokens
+    assert normalize_broadcast_text("Now R$ 49,90") == "Now R$ 49,90"
+
+
+def test_sender_address_ignores_the_display_name():
+    assert sender_address("Shop News <News@Shop.example.com>") == (
+        "news@shop.example.com"
+    )
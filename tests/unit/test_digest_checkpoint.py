@@ -0,0 +1,118 @@
+import uuid
+from datetime import date, datetime, timezone
+
+import pytest
+
+from domain.digest_checkpoint import DigestCheckpoint, DigestStage
+from schemas.email_summary_schema import EmailSummarySchema
+
+
+def _summary(text: str) -> EmailSummarySchema:
+    return EmailSummarySchema(summary=text, priority="low", type="info")
+
+
+def _checkpoint(**fields) -> DigestCheckpoint:
+    return DigestCheckpoint(
+        mail_account_id=uuid.uuid4(), digest_date=date(2026, 6, 1), **fields
+    )
+
+
+@pytest.mark.parametrize(
+    ("fields", "stage"),
+    [
+        ({}, DigestStage.LIST),
+        # Pages listed so far are summarized before listing finishes
+        (
+            {"message_ids": ["a"], "summaries": {"a": _summary("a")}},
+            DigestStage.LIST,
+        ),
+        ({"message_ids": ["a"], "listed": True}, DigestStage.FETCH),
+        (
+            {
+                "message_ids": ["a", "b"],
+                "listed": True,
+                "summaries": {"a": _summary("a")},
+            },
+            DigestStage.SUMMARIZE,
+        ),
+        ({"listed": True, "summarized": True}, DigestStage.AGGREGATE),
+        (
+            {"summarized": True, "aggregated_summary": "digest"},
+            DigestStage.DELIVER,
+        ),
+        (
+            {
+                "aggregated_summary": "digest",
+                "delivery_started_at": datetime.now(timezone.utc),
+            },
+            DigestStage.DONE,
+        ),
+        ({"delivered_at": datetime.now(timezone.utc)}, DigestStage.DONE),
+    ],
+)
+def test_stage_is_first_incomplete_stage(fields, stage):
+    assert _checkpoint(**fields).stage is stage
+
+
+def test_pending_message_ids_excludes_summarized_and_filtered():
+    checkpoint = _checkpoint(
+        message_ids=["a", "b", "c", "d"],
+        summaries={"b": _summary("b")},
+        filtered={"c": "promotions"},
+    )
+
+    assert checkpoint.pending_message_ids() == ["a", "d"]
+
+
+def test_pending_message_ids_excludes_members_of_summarized_groups():
+    checkpoint = _checkpoint(
+        message_ids=["a", "b", "c", "d", "e"],
+        # c is the newest message of a thread with a and c, and d stands
+        # for its near-duplicate e
+        summaries={"c": _summary("thread"), "d": _summary("alert")},
+        groups={"c": ["a", "c"], "d": ["d", "e"]},
+    )
+
+    assert checkpoint.pending_message_ids() == ["b"]
+
+
+def test_pending_message_ids_keeps_members_of_unsummarized_groups():
+    checkpoint = _checkpoint(
+        message_ids=["a", "b"], groups={"b": ["a", "b"]}
+    )
+
+    assert checkpoint.pending_message_ids() == ["a", "b"]
+
+
+def test_pending_message_ids_is_empty_before_listing():
+    assert _checkpoint().pending_message_ids() == []
+
+
+def test_ordered_summaries_follow_listing_order_with_group_sizes():
+    checkpoint = _checkpoint(
+        message_ids=["a", "b", "c"],
+        summaries={"c": _summary("thread"), "b": _summary("single")},
+        groups={"c": ["a", "c"]},
+    )
+
+    assert [
+        (summary.summary, count)
+        for summary, count in checkpoint.ordered_summaries()
+    ] == [("single", 1), ("thread", 2)]
+
+
+def test_checkpoint_round_trips_through_json():
+    checkpoint = _checkpoint(
+        message_ids=["a", "b"],
+        listed=True,
+        summaries={"a": _summary("a")},
+        groups={"a": ["a", "b"]},
+        filtered={},
+    )
+
+    restored = DigestCheckpoint.model_validate_json(
+        checkpoint.model_dump_json()
+    )
+
+    assert restored == checkpoint
+    assert restored.pending_message_ids() == []
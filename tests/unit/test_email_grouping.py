@@ -0,0 +1,92 @@
+from core.settings import settings
+from loaders.email_grouping import group_emails, similarity, sketch
+from loaders.email_record import EmailRecord
+
+CI_SENDER = "CI <ci@example.com>"
+
+
+def _email(message_id, subject, body, sender=CI_SENDER):
+    return EmailRecord(
+        id=message_id,
+        thread_id=message_id,
+        subject=subject,
+        sender=sender,
+        date="Sun, 18 Oct 2026 08:00:00 +0000",
+        labels=("INBOX",),
+        body=body,
+    )
+
+
+def _ci_alert(message_id, build, step):
+    return _email(
+        message_id,
+        f"build #{build} failed at {step} step",
+        f"Build #{build} of main failed at the {step} step after 4 minutes. "
+        "Open the pipeline to see the logs of the failing job, retry it "
+        "or download its artifacts. You receive this email because you "
+        "watch this repository.",
+    )
+
+
+def _group_ids(emails):
+    return [
+        group.message_ids
+        for group in group_emails(
+            emails,
+            collapse_threads=False,
+            min_similarity=settings.NEAR_DUPLICATE_MIN_SIMILARITY,
+            max_chars=10_000,
+        )
+    ]
+
+
+def test_distinct_ci_alerts_stay_separate():
+    emails = [_ci_alert("1", 1234, "test"), _ci_alert("2", 1235, "deploy")]
+
+    assert _group_ids(emails) == [["1"], ["2"]]
+
+
+def test_distinct_alerts_score_below_the_default_threshold():
+    first = _ci_alert("1", 1234, "test")
+    second = _ci_alert("2", 1235, "deploy")
+
+    score = similarity(
+        sketch(f"{first.subject}\n{first.body}"),
+        sketch(f"{second.subject}\n{second.body}"),
+    )
+
+    assert score < settings.NEAR_DUPLICATE_MIN_SIMILARITY
+
+
+def test_alerts_differing_only_by_numbers_are_clustered():
+    emails = [
+        _ci_alert("1", 1234, "test"),
+        _ci_alert("2", 1235, "test"),
+        _ci_alert("3", 1236, "test"),
+    ]
+
+    assert _group_ids(emails) == [["1", "2", "3"]]
+
+
+def test_same_text_from_different_senders_is_not_clustered():
+    first = _ci_alert("1", 1234, "test")
+    second = _ci_alert("2", 1234, "test")
+    second.sender = "Other CI <ci@example.org>"
+
+    assert _group_ids([first, second]) == [["1"], ["2"]]
+
+
+def test_short_emails_are_never_clustered():
+    emails = [_email("1", "Ok", "Thanks!"), _email("2", "Ok", "Thanks!")]
+
+    assert _group_ids(emails) == [["1"], ["2"]]
+
+
+def test_subjects_differing_beyond_numbers_are_never_clustered():
+    emails = [_ci_alert("1", 1234, "test"), _ci_alert("2", 1235, "deploy")]
+
+    groups = group_emails(
+        emails, collapse_threads=False, min_similarity=0.0, max_chars=10_000
+    )
+
+    assert [group.message_ids for group in groups] == [["1"], ["2"]]
@@ -0,0 +1,322 @@
+import uuid
+from datetime import date, datetime, timezone
+
+import pytest
+
+from core.logger import L
+from domain.account_context import AccountContext
+from domain.delivery_channel import DeliveryChannel, DeliveryChannelEnum
+from domain.digest_checkpoint import DigestCheckpoint, DigestStage
+from domain.mail_account import EmailServiceEnum, MailAccount
+from domain.user import User
+from loaders import token_budget
+from loaders.email_record import EmailRecord
+from schemas.email_summary_batch_schema import (
+    EmailSummaryBatchSchema,
+    KeyedEmailSummarySchema,
+)
+from schemas.email_summary_schema import EmailSummarySchema
+from services import (
+    checkpoint_service,
+    email_summary_service,
+    mail_account_service,
+    summary_cache_service,
+    telegram_service,
+)
+from services.checkpoint_service import SQLiteCheckpointStore
+from services.email_summary_service import (
+    _generate_packed_summaries,
+    _summarize_emails,
+)
+
+
+@pytest.fixture
+def account_context():
+    user = User(id=uuid.uuid4())
+    return AccountContext(
+        mail_account=MailAccount(
+            user_id=user.id,
+            service_type=EmailServiceEnum.GMAIL,
+            account_email="someone@example.com",
+            credentials={"refresh_token": "token"},
+            last_history_id="100",
+        ),
+        user=user,
+        active_delivery_channels=[
+            DeliveryChannel(
+                user_id=user.id,
+                channel_type=DeliveryChannelEnum.TELEGRAM,
+                address="42",
+            )
+        ],
+    )
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch, account_context):
+    store = SQLiteCheckpointStore(str(tmp_path / "checkpoints.sqlite3"), 7)
+    monkeypatch.setattr(
+        checkpoint_service, "get_checkpoint_store", lambda: store
+    )
+
+    async def get_account_context(mail_account_id, *, logger):
+        return account_context
+
+    monkeypatch.setattr(
+        mail_account_service, "get_account_context", get_account_context
+    )
+    return store
+
+
+@pytest.fixture
+def history_updates(monkeypatch):
+    updates = []
+
+    async def update_last_history_id(mail_account_id, history_id, *, logger):
+        updates.append(history_id)
+
+    monkeypatch.setattr(
+        mail_account_service, "update_last_history_id", update_last_history_id
+    )
+    return updates
+
+
+async def _aggregated_checkpoint(store, account_context) -> DigestCheckpoint:
+    checkpoint = DigestCheckpoint(
+        mail_account_id=account_context.mail_account.id,
+        digest_date=date(2026, 10, 18),
+        history_id="200",
+        listed=True,
+        summarized=True,
+        aggregated_summary="digest",
+    )
+    await store.save(checkpoint)
+    return checkpoint
+
+
+def _fake_telegram(monkeypatch, sent: bool):
+    messages = []
+
+    async def send_message(chat_id, text):
+        messages.append((chat_id, text))
+        return sent
+
+    monkeypatch.setattr(telegram_service, "send_message", send_message)
+    return messages
+
+
+async def _run(account_context):
+    await email_summary_service.generate_daily_email_summary(
+        account_context.mail_account.id,
+        datetime(2026, 10, 18, 12, tzinfo=timezone.utc),
+        logger=L("test"),
+    )
+
+
+@pytest.mark.asyncio
+async def test_delivered_digest_advances_history_id(
+    monkeypatch, store, account_context, history_updates
+):
+    saved = await _aggregated_checkpoint(store, account_context)
+    messages = _fake_telegram(monkeypatch, sent=True)
+
+    await _run(account_context)
+
+    loaded = await store.load(saved.mail_account_id, saved.digest_date)
+    assert messages == [(42, "digest")]
+    assert loaded.delivered_at is not None
+    assert history_updates == ["200"]
+
+
+@pytest.mark.asyncio
+async def test_digest_rejected_by_telegram_is_released_for_a_retry(
+    monkeypatch, store, account_context, history_updates
+):
+    saved = await _aggregated_checkpoint(store, account_context)
+    messages = _fake_telegram(monkeypatch, sent=False)
+
+    with pytest.raises(Exception, match="rejected"):
+        await _run(account_context)
+
+    loaded = await store.load(saved.mail_account_id, saved.digest_date)
+    assert len(messages) == 1
+    assert loaded.delivered_at is None
+    assert loaded.delivery_started_at is None
+    assert loaded.stage is DigestStage.DELIVER
+    assert history_updates == []
+
+    _fake_telegram(monkeypatch, sent=True)
+    await _run(account_context)
+
+    loaded = await store.load(saved.mail_account_id, saved.digest_date)
+    assert loaded.delivered_at is not None
+    assert history_updates == ["200"]
+
+
+class FakeChain:
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+
+    async def ainvoke(self, inputs, config):
+        self.calls.append(inputs)
+        return self.respond(inputs)
+
+
+def _email(message_id):
+    return EmailRecord(
+        id=message_id,
+        thread_id=message_id,
+        subject=f"Subject {message_id}",
+        sender="Ana <ana@example.com>",
+        date="Sun, 18 Oct 2026 08:00:00 +0000",
+        labels=("INBOX",),
+        body=f"Body of {message_id}",
+    )
+
+
+def _summary(text):
+    return EmailSummarySchema(summary=text, priority="low", type="info")
+
+
+def _keyed(message_id, text=None):
+    return KeyedEmailSummarySchema(
+        message_id=message_id,
+        **_summary(text or f"packed {message_id}").model_dump(),
+    )
+
+
+@pytest.fixture
+def single_chain(monkeypatch):
+    chain = FakeChain(lambda inputs: _summary(f"single {inputs['subject']}"))
+    monkeypatch.setattr(
+        email_summary_service.summarize_email_chain, "chain", chain
+    )
+    return chain
+
+
+def _fake_batch_chain(monkeypatch, respond):
+    chain = FakeChain(respond)
+    monkeypatch.setattr(
+        email_summary_service.summarize_email_batch_chain, "chain", chain
+    )
+    return chain
+
+
+@pytest.mark.asyncio
+async def test_packed_response_drops_unknown_and_repeated_ids(monkeypatch):
+    _fake_batch_chain(
+        monkeypatch,
+        lambda inputs: EmailSummaryBatchSchema(
+            summaries=[
+                _keyed("m1"),
+                _keyed("m1", "repeated"),
+                _keyed("unknown"),
+            ]
+        ),
+    )
+    new_entries = []
+
+    summaries = await _generate_packed_summaries(
+        [_email("m1"), _email("m2")],
+        new_entries,
+        token_budget.TokenTotals(),
+        logger=L("test"),
+    )
+
+    assert summaries == {"m1": _summary("packed m1")}
+    assert [entry.message_id for entry in new_entries] == ["m1"]
+
+
+@pytest.mark.asyncio
+async def test_emails_left_out_of_a_packed_response_are_summarized_alone(
+    monkeypatch, single_chain
+):
+    batch_chain = _fake_batch_chain(
+        monkeypatch,
+        lambda inputs: EmailSummaryBatchSchema(
+            summaries=[_keyed("m1"), _keyed("m3")]
+        ),
+    )
+    emails = [_email("m1"), _email("m2"), _email("m3")]
+
+    summaries = await _summarize_emails(
+        emails, {}, [], token_budget.TokenTotals(), logger=L("test")
+    )
+
+    assert summaries == {
+        "m1": _summary("packed m1"),
+        "m2": _summary("single Subject m2"),
+        "m3": _summary("packed m3"),
+    }
+    assert len(batch_chain.calls) == 1
+    assert [call["subject"] for call in single_chain.calls] == ["Subject m2"]
+
+
+@pytest.mark.asyncio
+async def test_failed_packed_request_falls_back_to_one_by_one(
+    monkeypatch, single_chain
+):
+    def fail(inputs):
+        raise ValueError("invalid JSON")
+
+    _fake_batch_chain(monkeypatch, fail)
+    new_entries = []
+
+    summaries = await _summarize_emails(
+        [_email("m1"), _email("m2")],
+        {},
+        new_entries,
+        token_budget.TokenTotals(),
+        logger=L("test"),
+    )
+
+    assert summaries == {
+        "m1": _summary("single Subject m1"),
+        "m2": _summary("single Subject m2"),
+    }
+    assert [entry.message_id for entry in new_entries] == ["m1", "m2"]
+
+
+@pytest.mark.asyncio
+async def test_only_cache_misses_are_packed(monkeypatch, single_chain):
+    batch_chain = _fake_batch_chain(
+        monkeypatch,
+        lambda inputs: EmailSummaryBatchSchema(
+            summaries=[_keyed("m2"), _keyed("m3")]
+        ),
+    )
+    cached_email = _email("m1")
+    cached = {
+        "m1": summary_cache_service.CachedSummary(
+            "m1",
+            summary_cache_service.content_hash(cached_email),
+            _summary("cached m1"),
+        )
+    }
+
+    summaries = await _summarize_emails(
+        [cached_email, _email("m2"), _email("m3")],
+        cached,
+        [],
+        token_budget.TokenTotals(),
+        logger=L("test"),
+    )
+
+    assert summaries["m1"] == _summary("cached m1")
+    packed_emails = batch_chain.calls[0]["emails"]
+    assert 'message_id="m1"' not in packed_emails
+    assert 'message_id="m2"' in packed_emails
+    assert not single_chain.calls
+
+
+@pytest.mark.asyncio
+async def test_a_single_miss_is_not_packed(monkeypatch, single_chain):
+    batch_chain = _fake_batch_chain(monkeypatch, lambda inputs: None)
+
+    summaries = await _summarize_emails(
+        [_email("m1")], {}, [], token_budget.TokenTotals(), logger=L("test")
+    )
+
+    assert summaries == {"m1": _summary("single Subject m1")}
+    assert not batch_chain.calls
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from services.gmail_service import _parse_batch_response
+
+CONTENT_TYPE = "multipart/mixed; boundary=batch_abc"
+
+
+def _part(content_id: str, status_line: str, payload: str) -> str:
+    return (
+        "--batch_abc\r\n"
+        "Content-Type: application/http\r\n"
+        f"Content-ID: {content_id}\r\n\r\n"
+        f"{status_line}\r\n"
+        "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+        f"{payload}\r\n"
+    )
+
+
+def test_parse_batch_response_maps_status_and_body_by_content_id():
+    text = (
+        _part("<response-m1>", "HTTP/1.1 200 OK", json.dumps({"id": "m1"}))
+        + _part(
+            "<response-m2>",
+            "HTTP/1.1 404 Not Found",
+            json.dumps({"error": {"code": 404}}),
+        )
+        + _part("<response-m3>", "HTTP/1.1 429 Too Many Requests", "{}")
+        + "--batch_abc--\r\n"
+    )
+
+    assert _parse_batch_response(CONTENT_TYPE, text) == {
+        "m1": (200, {"id": "m1"}),
+        "m2": (404, {"error": {"code": 404}}),
+        "m3": (429, {}),
+    }
+
+
+def test_parse_batch_response_reads_quoted_boundary():
+    text = _part("<response-m1>", "HTTP/1.1 200 OK", "{}") + "--batch_abc--"
+
+    assert _parse_batch_response(
+        'multipart/mixed; boundary="batch_abc"', text
+    ) == {"m1": (200, {})}
+
+
+def test_parse_batch_response_keeps_status_of_unreadable_body():
+    text = _part("<response-m1>", "HTTP/1.1 200 OK", "{not json")
+
+    assert _parse_batch_response(CONTENT_TYPE, text) == {"m1": (200, None)}
+
+
+def test_parse_batch_response_skips_malformed_parts():
+    text = (
+        _part("<response-m1>", "garbage", "{}")
+        + _part("<response-m2>", "HTTP/1.1 OK", "{}")
+        + "--batch_abc\r\nContent-Type: application/http\r\n\r\n"
+        "HTTP/1.1 200 OK\r\n\r\n{}\r\n"
+        + _part("<response-m3>", "HTTP/1.1 200 OK", "{}")
+        + "--batch_abc--\r\n"
+    )
+
+    assert _parse_batch_response(CONTENT_TYPE, text) == {"m3": (200, {})}
+
+
+def test_parse_batch_response_requires_boundary():
+    with pytest.raises(ValueError, match="boundary"):
+        _parse_batch_response("multipart/mixed", "")
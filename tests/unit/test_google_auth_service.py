@@ -0,0 +1,46 @@
+import pytest
+
+from core.logger import L
+from core.settings import settings
+from domain.mail_account import EmailServiceEnum, MailAccount
+from services import google_auth_service, mail_account_service
+
+
+@pytest.fixture
+def mail_account():
+    return MailAccount(
+        user_id="00000000-0000-0000-0000-000000000001",
+        service_type=EmailServiceEnum.GMAIL,
+        account_email="someone@example.com",
+        credentials={"refresh_token": "stale-refresh-token"},
+    )
+
+
+@pytest.mark.asyncio
+async def test_refresh_persists_only_the_access_token(
+    monkeypatch, mail_account
+):
+    monkeypatch.setattr(settings, "GOOGLE_TOKEN_CACHE", "supabase")
+    updates = []
+
+    async def refresh_access_token(refresh_token, *, logger):
+        return {"access_token": "new-access-token", "expires_in": 3600}
+
+    async def update_access_token(
+        mail_account_id, access_token, expires_at, *, logger
+    ):
+        updates.append((mail_account_id, access_token))
+
+    monkeypatch.setattr(
+        google_auth_service, "_refresh_access_token", refresh_access_token
+    )
+    monkeypatch.setattr(
+        mail_account_service, "update_access_token", update_access_token
+    )
+
+    token = await google_auth_service.get_access_token(
+        mail_account, logger=L("test")
+    )
+
+    assert token == "new-access-token"
+    assert updates == [(mail_account.id, "new-access-token")]
@@ -0,0 +1,120 @@
+from domain.mail_filter_rule import MailFilterAction, MailFilterRule
+from loaders.mail_filter import MailFilter, matches
+
+
+def _metadata(
+    message_id="m1",
+    labels=("INBOX",),
+    sender="Ana <ana@example.com>",
+    headers=(),
+    size=1000,
+):
+    return {
+        "id": message_id,
+        "labelIds": list(labels),
+        "sizeEstimate": size,
+        "payload": {
+            "headers": [{"name": "From", "value": sender}, *headers]
+        },
+    }
+
+
+def test_first_matching_rule_decides():
+    mail_filter = MailFilter([
+        MailFilterRule(
+            name="keep-boss",
+            action=MailFilterAction.KEEP,
+            sender_patterns=["boss@example.com"],
+        ),
+        MailFilterRule(name="skip-example", sender_patterns=["*@example.com"]),
+    ])
+
+    assert mail_filter.keep(_metadata("m1", sender="Boss <boss@example.com>"))
+    assert not mail_filter.keep(_metadata("m2"))
+    assert mail_filter.skipped == {"m2": "skip-example"}
+
+
+def test_excluded_labels_come_before_user_rules():
+    mail_filter = MailFilter([
+        MailFilterRule(
+            name="keep-all", action=MailFilterAction.KEEP, labels=["INBOX"]
+        )
+    ])
+
+    assert not mail_filter.keep(_metadata(labels=("INBOX", "SPAM")))
+    assert mail_filter.skipped == {"m1": "excluded-labels"}
+
+
+def test_unmatched_messages_are_kept_and_not_counted():
+    mail_filter = MailFilter([
+        MailFilterRule(name="promotions", labels=["CATEGORY_PROMOTIONS"])
+    ])
+
+    assert mail_filter.keep(_metadata())
+    assert not mail_filter.hits
+    assert not mail_filter.skipped
+
+
+def test_hits_count_each_deciding_rule():
+    mail_filter = MailFilter()
+    messages = [
+        _metadata("m1", labels=("INBOX", "STARRED", "CATEGORY_PROMOTIONS")),
+        _metadata("m2", labels=("CATEGORY_PROMOTIONS",)),
+        _metadata("m3", labels=("CATEGORY_PROMOTIONS",)),
+        _metadata(
+            "m4",
+            sender="Shop <no-reply@shop.example.com>",
+            headers=[{"name": "List-Unsubscribe", "value": "<mailto:x>"}],
+        ),
+        _metadata("m5"),
+    ]
+
+    kept = [message["id"] for message in messages if mail_filter.keep(message)]
+
+    assert kept == ["m1", "m5"]
+    assert mail_filter.hits == {
+        "starred": 1,
+        "promotions": 2,
+        "automated-bulk": 1,
+    }
+
+
+def test_an_empty_rule_list_keeps_everything_but_excluded_labels():
+    mail_filter = MailFilter([])
+
+    assert mail_filter.keep(_metadata(labels=("CATEGORY_PROMOTIONS",)))
+    assert not mail_filter.keep(_metadata(labels=("TRASH",)))
+
+
+def test_every_condition_of_a_rule_must_hold():
+    rule = MailFilterRule(
+        name="large-noreply",
+        sender_patterns=["noreply@*"],
+        min_size_bytes=5000,
+    )
+
+    assert matches(rule, _metadata(sender="noreply@example.com", size=6000))
+    assert not matches(rule, _metadata(sender="noreply@example.com"))
+    assert not matches(rule, _metadata(size=6000))
+
+
+def test_header_conditions():
+    bulk = _metadata(headers=[{"name": "Precedence", "value": "bulk"}])
+
+    assert matches(MailFilterRule(name="bulk", bulk_precedence=True), bulk)
+    assert not matches(
+        MailFilterRule(name="not-bulk", bulk_precedence=False), bulk
+    )
+    assert matches(
+        MailFilterRule(name="no-unsubscribe", list_unsubscribe=False), bulk
+    )
+
+
+def test_sender_patterns_ignore_case():
+    rule = MailFilterRule(
+        name="notifications", sender_patterns=["*@Notifications.example.com"]
+    )
+
+    assert matches(
+        rule, _metadata(sender="GitHub <Bot@notifications.EXAMPLE.com>")
+    )
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+
+from core.rate_limiter import TokenBucket
+
+
+async def _elapsed(bucket, *costs):
+    started = time.monotonic()
+    for cost in costs:
+        await bucket.acquire(cost)
+    return time.monotonic() - started
+
+
+@pytest.mark.asyncio
+async def test_a_full_bucket_allows_a_burst():
+    bucket = TokenBucket(rate=10, capacity=5)
+
+    assert await _elapsed(bucket, 1, 1, 1, 1, 1) < 0.05
+
+
+@pytest.mark.asyncio
+async def test_an_empty_bucket_waits_for_the_refill():
+    bucket = TokenBucket(rate=100, capacity=1)
+
+    # One token is there, five more take 50ms to come in
+    assert await _elapsed(bucket, 1, 1, 1, 1, 1, 1) >= 0.045
+
+
+@pytest.mark.asyncio
+async def test_capacity_defaults_to_one_second_of_tokens():
+    bucket = TokenBucket(rate=250)
+
+    assert bucket.capacity == 250
+    assert await _elapsed(bucket, 250) < 0.05
+
+
+@pytest.mark.asyncio
+async def test_oversized_requests_go_through_and_leave_a_debt():
+    bucket = TokenBucket(rate=100, capacity=10)
+
+    assert await _elapsed(bucket, 30) < 0.05
+    # 20 tokens of debt and the next one: 210ms
+    assert await _elapsed(bucket, 1) >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_acquires_share_the_rate():
+    bucket = TokenBucket(rate=100, capacity=1)
+    started = time.monotonic()
+
+    await asyncio.gather(*(bucket.acquire(1) for _ in range(6)))
+
+    assert time.monotonic() - started >= 0.045
+
+
+def test_a_bucket_outlives_its_event_loop():
+    bucket = TokenBucket(rate=1000, capacity=10)
+
+    asyncio.run(bucket.acquire(1))
+    asyncio.run(bucket.acquire(1))
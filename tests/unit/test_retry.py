@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+from core import retry
+from core.settings import settings
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(retry.asyncio, "sleep", sleep)
+    return delays
+
+
+def _sender(*outcomes):
+    calls = []
+    pending = list(outcomes)
+
+    async def send():
+        calls.append(len(calls))
+        outcome = pending.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return send, calls
+
+
+def test_retry_after_seconds_is_honoured():
+    response = httpx.Response(429, headers={"Retry-After": "7"})
+
+    assert retry.retry_delay(0, response) == 7
+
+
+def test_retry_after_http_date_is_honoured():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=10)
+    response = httpx.Response(
+        503, headers={"Retry-After": format_datetime(retry_at, usegmt=True)}
+    )
+
+    assert 8 < retry.retry_delay(0, response) <= 10
+
+
+def test_retry_after_is_capped_and_never_negative():
+    too_long = httpx.Response(429, headers={"Retry-After": "86400"})
+    past = httpx.Response(
+        429, headers={"Retry-After": "Sun, 18 Oct 2020 08:00:00 GMT"}
+    )
+
+    assert (
+        retry.retry_delay(0, too_long)
+        == settings.HTTP_RETRY_MAX_DELAY_SECONDS
+    )
+    assert retry.retry_delay(0, past) == 0
+
+
+def test_backoff_without_retry_after_is_jittered_and_bounded():
+    response = httpx.Response(429, headers={"Retry-After": "soon"})
+    base = settings.HTTP_RETRY_BASE_DELAY_SECONDS
+
+    for attempt in range(4):
+        bound = min(base * 2**attempt, settings.HTTP_RETRY_MAX_DELAY_SECONDS)
+        assert 0 <= retry.retry_delay(attempt, response) <= bound
+
+
+def test_retryable_responses():
+    rate_limited = httpx.Response(
+        403,
+        json={"error": {"errors": [{"reason": "userRateLimitExceeded"}]}},
+    )
+    forbidden = httpx.Response(
+        403, json={"error": {"errors": [{"reason": "forbidden"}]}}
+    )
+
+    assert retry.is_retryable(httpx.Response(429))
+    assert retry.is_retryable(httpx.Response(503))
+    assert retry.is_retryable(rate_limited)
+    assert not retry.is_retryable(forbidden)
+    assert not retry.is_retryable(httpx.Response(403, text="not json"))
+    assert not retry.is_retryable(httpx.Response(404))
+
+
+@pytest.mark.asyncio
+async def test_send_with_retry_waits_as_told_then_succeeds(sleeps):
+    send, calls = _sender(
+        httpx.Response(429, headers={"Retry-After": "2"}),
+        httpx.TransportError("connection reset"),
+        httpx.Response(200),
+    )
+
+    response = await retry.send_with_retry(send, max_retries=3)
+
+    assert response.status_code == httpx.codes.OK
+    assert len(calls) == 3
+    assert sleeps[0] == 2
+    assert len(sleeps) == 2
+
+
+@pytest.mark.asyncio
+async def test_send_with_retry_returns_the_last_response(sleeps):
+    send, calls = _sender(
+        httpx.Response(429),
+        httpx.Response(429),
+        httpx.Response(503),
+    )
+
+    response = await retry.send_with_retry(send, max_retries=2)
+
+    assert response.status_code == httpx.codes.SERVICE_UNAVAILABLE
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_responses_are_returned_at_once(sleeps):
+    send, calls = _sender(httpx.Response(404))
+
+    response = await retry.send_with_retry(send, max_retries=3)
+
+    assert response.status_code == httpx.codes.NOT_FOUND
+    assert calls == [0]
+    assert not sleeps
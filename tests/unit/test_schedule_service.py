@@ -0,0 +1,95 @@
+from datetime import datetime, time, timedelta, timezone
+
+from services.schedule_service import current_slot, is_digest_due
+
+SLOT_MINUTES = 15
+
+
+def _due_slots(digest_time, timezone_name, start, end):
+    slots = []
+    slot = start
+    while slot < end:
+        if is_digest_due(digest_time, timezone_name, slot, SLOT_MINUTES):
+            slots.append(slot)
+        slot += timedelta(minutes=SLOT_MINUTES)
+    return slots
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_is_digest_due_only_in_the_slot_holding_the_digest_time():
+    slot = _utc(2026, 6, 1, 23, 0)
+
+    assert is_digest_due(time(23, 0), "UTC", slot, SLOT_MINUTES)
+    assert is_digest_due(time(23, 14), "UTC", slot, SLOT_MINUTES)
+    assert not is_digest_due(time(23, 15), "UTC", slot, SLOT_MINUTES)
+    assert not is_digest_due(time(22, 59), "UTC", slot, SLOT_MINUTES)
+
+
+def test_is_digest_due_converts_from_local_time():
+    # 08:00 in Sao Paulo (UTC-3) is 11:00 UTC
+    assert is_digest_due(
+        time(8, 0), "America/Sao_Paulo", _utc(2026, 6, 1, 11, 0), SLOT_MINUTES
+    )
+    assert not is_digest_due(
+        time(8, 0), "America/Sao_Paulo", _utc(2026, 6, 1, 8, 0), SLOT_MINUTES
+    )
+
+
+def test_is_digest_due_in_slot_straddling_local_midnight():
+    # 18:00-19:00 UTC is 23:30-00:30 in Kolkata (UTC+5:30): a digest
+    # just after midnight belongs to the next local day
+    slot = _utc(2026, 6, 1, 18, 0)
+
+    assert is_digest_due(time(0, 10), "Asia/Kolkata", slot, 60)
+    assert is_digest_due(time(23, 45), "Asia/Kolkata", slot, 60)
+    assert not is_digest_due(time(0, 30), "Asia/Kolkata", slot, 60)
+
+
+def test_is_digest_due_once_a_day_around_utc_midnight():
+    # 23:50 UTC and 00:05 UTC fall in the slots on either side of midnight
+    assert _due_slots(
+        time(23, 50), "UTC", _utc(2026, 6, 1), _utc(2026, 6, 2)
+    ) == [_utc(2026, 6, 1, 23, 45)]
+    assert _due_slots(
+        time(0, 5), "UTC", _utc(2026, 6, 1), _utc(2026, 6, 2)
+    ) == [_utc(2026, 6, 1, 0, 0)]
+
+
+def test_is_digest_due_follows_dst_changes():
+    # New York is UTC-5 in winter and UTC-4 in summer
+    assert _due_slots(
+        time(23, 0), "America/New_York", _utc(2026, 1, 15), _utc(2026, 1, 16)
+    ) == [_utc(2026, 1, 15, 4, 0)]
+    assert _due_slots(
+        time(23, 0), "America/New_York", _utc(2026, 7, 15), _utc(2026, 7, 16)
+    ) == [_utc(2026, 7, 15, 3, 0)]
+
+
+def test_is_digest_due_once_on_dst_transition_days():
+    # 02:30 does not exist on 8 March 2026 in New York (clocks jump from
+    # 02:00 to 03:00), and 01:30 happens twice on 1 November 2026. Either
+    # way the digest goes out exactly once that local day.
+    spring = _due_slots(
+        time(2, 30), "America/New_York", _utc(2026, 3, 8, 5), _utc(2026, 3, 9, 4)
+    )
+    fall = _due_slots(
+        time(1, 30), "America/New_York", _utc(2026, 11, 1, 4), _utc(2026, 11, 2, 5)
+    )
+
+    assert spring == [_utc(2026, 3, 8, 7, 30)]
+    assert fall == [_utc(2026, 11, 1, 5, 30)]
+
+
+def test_is_digest_due_treats_unknown_timezone_as_utc():
+    slot = _utc(2026, 6, 1, 23, 0)
+
+    assert is_digest_due(time(23, 0), "Not/AZone", slot, SLOT_MINUTES)
+
+
+def test_current_slot_rounds_down_to_slot_start():
+    now = datetime(2026, 6, 1, 20, 44, 59, tzinfo=timezone(timedelta(hours=-3)))
+
+    assert current_slot(now, SLOT_MINUTES) == _utc(2026, 6, 1, 23, 30)
@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+from core import retry
+from core.logger import L
+from services import sqs_service
+
+moto = pytest.importorskip("moto")
+boto3 = pytest.importorskip("boto3")
+
+
+class FlakyClient:
+    """
+    SQS client failing some entries server-side (not the sender's fault)
+    a given number of times, and sending the rest for real
+    """
+
+    def __init__(self, client, failures):
+        self.client = client
+        self.failures = dict(failures)
+        self.calls = []
+
+    def send_message_batch(self, QueueUrl, Entries):  # noqa: N803
+        self.calls.append([entry["Id"] for entry in Entries])
+        failing = [
+            entry for entry in Entries if self.failures.get(entry["Id"], 0)
+        ]
+        for entry in failing:
+            self.failures[entry["Id"]] -= 1
+        sent = [entry for entry in Entries if entry not in failing]
+        response = (
+            self.client.send_message_batch(QueueUrl=QueueUrl, Entries=sent)
+            if sent
+            else {}
+        )
+        response.setdefault("Failed", []).extend(
+            {
+                "Id": entry["Id"],
+                "SenderFault": False,
+                "Code": "InternalError",
+                "Message": "try again",
+            }
+            for entry in failing
+        )
+        return response
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setattr(retry, "retry_delay", lambda attempt: 0)
+    with moto.mock_aws():
+        client = boto3.client("sqs")
+        queue_url = client.create_queue(QueueName="jobs")["QueueUrl"]
+        yield client, queue_url
+
+
+def _use_client(monkeypatch, client):
+    monkeypatch.setattr(sqs_service, "_sqs_client", lambda: client)
+
+
+def _queued_bodies(client, queue_url):
+    bodies = []
+    while messages := client.receive_message(
+        QueueUrl=queue_url, MaxNumberOfMessages=10
+    ).get("Messages"):
+        bodies.extend(message["Body"] for message in messages)
+        client.delete_message_batch(
+            QueueUrl=queue_url,
+            Entries=[
+                {"Id": str(i), "ReceiptHandle": message["ReceiptHandle"]}
+                for i, message in enumerate(messages)
+            ],
+        )
+    return sorted(bodies)
+
+
+def _entries(*entry_ids, delays=None):
+    return {
+        entry_id: sqs_service._entry(entry_id, f"body-{entry_id}", delays or {})
+        for entry_id in entry_ids
+    }
+
+
+def _send_batch(queue_url, entries):
+    return asyncio.run(
+        sqs_service._send_batch(
+            queue_url, entries, asyncio.Semaphore(1), logger=L("test")
+        )
+    )
+
+
+def test_send_batch_sends_every_entry(monkeypatch, queue):
+    client, queue_url = queue
+    _use_client(monkeypatch, client)
+
+    failed = _send_batch(queue_url, _entries("a", "b", "c"))
+
+    assert failed == []
+    assert _queued_bodies(client, queue_url) == ["body-a", "body-b", "body-c"]
+
+
+def test_send_batch_does_not_retry_entries_rejected_by_sqs(
+    monkeypatch, queue
+):
+    client, queue_url = queue
+    flaky = FlakyClient(client, {})
+    _use_client(monkeypatch, flaky)
+
+    # SQS refuses DelaySeconds above 900: the sender's fault
+    failed = _send_batch(
+        queue_url, _entries("a", "b", delays={"b": 1000})
+    )
+
+    assert failed == ["b"]
+    assert flaky.calls == [["a", "b"]]
+    assert _queued_bodies(client, queue_url) == ["body-a"]
+
+
+def test_send_batch_retries_only_failed_entries(monkeypatch, queue):
+    client, queue_url = queue
+    flaky = FlakyClient(client, {"b": 2})
+    _use_client(monkeypatch, flaky)
+
+    failed = _send_batch(queue_url, _entries("a", "b", "c"))
+
+    assert failed == []
+    assert flaky.calls == [["a", "b", "c"], ["b"], ["b"]]
+    assert _queued_bodies(client, queue_url) == ["body-a", "body-b", "body-c"]
+
+
+def test_send_batch_gives_up_after_max_retries(monkeypatch, queue):
+    client, queue_url = queue
+    monkeypatch.setattr(sqs_service.settings, "SQS_SEND_MAX_RETRIES", 2)
+    flaky = FlakyClient(client, {"b": 10})
+    _use_client(monkeypatch, flaky)
+
+    failed = _send_batch(queue_url, _entries("a", "b"))
+
+    assert failed == ["b"]
+    assert len(flaky.calls) == 3
+    assert _queued_bodies(client, queue_url) == ["body-a"]
+
+
+def test_send_messages_counts_sent_and_failed(monkeypatch, queue):
+    client, queue_url = queue
+    _use_client(monkeypatch, FlakyClient(client, {}))
+    messages = {str(i): f"body-{i}" for i in range(25)}
+
+    sent, failed = asyncio.run(
+        sqs_service.send_messages(
+            queue_url, messages, {"3": 1000}, logger=L("test")
+        )
+    )
+
+    assert (sent, failed) == (24, 1)
+    assert len(_queued_bodies(client, queue_url)) == 24
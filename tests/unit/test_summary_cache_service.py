@@ -0,0 +1,272 @@
+import sqlite3
+from dataclasses import replace
+
+import pytest
+
+from core.logger import L
+from core.settings import settings
+from loaders.email_record import EmailRecord
+from schemas.email_summary_schema import EmailSummarySchema
+from services import summary_cache_service
+from services.summary_cache_service import (
+    CachedSummary,
+    MemorySummaryCache,
+    SQLiteSummaryCache,
+)
+
+ACCOUNT_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def _email(message_id="m1", body="Meeting moved to 3pm"):
+    return EmailRecord(
+        id=message_id,
+        thread_id=message_id,
+        subject="Meeting",
+        sender="Ana <ana@example.com>",
+        date="Sun, 18 Oct 2026 08:00:00 +0000",
+        labels=("INBOX",),
+        body=body,
+    )
+
+
+def _entry(email):
+    return CachedSummary(
+        email.id,
+        summary_cache_service.content_hash(email),
+        EmailSummarySchema(
+            summary=f"Summary of {email.id}", priority="low", type="info"
+        ),
+    )
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_backend(request, tmp_path):
+    def make(max_entries=100, ttl=3600.0):
+        if request.param == "memory":
+            return MemorySummaryCache(max_entries, ttl)
+        return SQLiteSummaryCache(
+            str(tmp_path / "cache.sqlite3"), max_entries, ttl
+        )
+
+    return make
+
+
+@pytest.mark.asyncio
+async def test_backend_round_trip(make_backend):
+    backend = make_backend()
+    entry = _entry(_email())
+
+    await backend.set_many([entry], "v1", ACCOUNT_ID)
+
+    assert await backend.get_many(["m1", "m2"], "v1") == {"m1": entry}
+
+
+@pytest.mark.asyncio
+async def test_entries_are_kept_per_prompt_version(make_backend):
+    backend = make_backend()
+
+    await backend.set_many([_entry(_email())], "v1", ACCOUNT_ID)
+
+    assert await backend.get_many(["m1"], "v2") == {}
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_ignored(make_backend):
+    backend = make_backend(ttl=0.0)
+
+    await backend.set_many([_entry(_email())], "v1", ACCOUNT_ID)
+
+    assert await backend.get_many(["m1"], "v1") == {}
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_entries_are_evicted(make_backend):
+    backend = make_backend(max_entries=2)
+    first, second, third = (_entry(_email(f"m{i}")) for i in range(3))
+
+    await backend.set_many([first], "v1", ACCOUNT_ID)
+    await backend.set_many([second], "v1", ACCOUNT_ID)
+    await backend.get_many(["m0"], "v1")
+    await backend.set_many([third], "v1", ACCOUNT_ID)
+
+    assert set(await backend.get_many(["m0", "m1", "m2"], "v1")) == {
+        "m0",
+        "m2",
+    }
+
+
+@pytest.mark.asyncio
+async def test_sqlite_shared_entries_belong_to_no_account(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    backend = SQLiteSummaryCache(path, 100, 3600.0)
+    email = _email()
+    shared = replace(
+        _entry(email), message_id=summary_cache_service.shared_key(email)
+    )
+
+    await backend.set_many([_entry(email), shared], "v1", ACCOUNT_ID)
+
+    with sqlite3.connect(path) as connection:
+        owners = dict(
+            connection.execute(
+                "select message_id, mail_account_id from email_summary_cache"
+            )
+        )
+    assert owners == {"m1": ACCOUNT_ID, shared.message_id: None}
+
+
+def test_changed_content_invalidates_the_entry():
+    email = _email()
+    cached = {"m1": _entry(email)}
+    stats = summary_cache_service.summary_cache_stats()
+    hits, misses = stats.hits, stats.misses
+
+    assert summary_cache_service.lookup(cached, email) is not None
+    assert (
+        summary_cache_service.lookup(
+            cached, _email(body="Meeting moved to 4pm")
+        )
+        is None
+    )
+    assert (stats.hits, stats.misses) == (hits + 1, misses + 1)
+
+
+def test_content_hash_covers_what_the_prompt_is_given():
+    email = _email()
+    original = summary_cache_service.content_hash(email)
+
+    for field, value in [
+        ("subject", "Other"),
+        ("sender", "Bia <bia@example.com>"),
+        ("date", "Mon, 19 Oct 2026 08:00:00 +0000"),
+        ("body", "Other body"),
+    ]:
+        changed = summary_cache_service.content_hash(
+            replace(email, **{field: value})
+        )
+        assert changed != original, field
+    assert (
+        summary_cache_service.content_hash(replace(email, labels=("STARRED",)))
+        == original
+    )
+
+
+@pytest.mark.asyncio
+async def test_store_and_read_through_the_configured_backend(monkeypatch):
+    backend = MemorySummaryCache(100, 3600.0)
+    monkeypatch.setattr(summary_cache_service, "_get_backend", lambda: backend)
+    entry = _entry(_email())
+
+    await summary_cache_service.store_summaries(
+        [entry], ACCOUNT_ID, logger=L("test")
+    )
+
+    assert await summary_cache_service.get_cached_summaries(
+        ["m1"], logger=L("test")
+    ) == {"m1": entry}
+
+
+@pytest.mark.asyncio
+async def test_a_failing_backend_is_a_cache_miss(monkeypatch):
+    class FailingBackend:
+        async def get_many(self, message_ids, version):
+            raise ConnectionError("down")
+
+        async def set_many(self, entries, version, mail_account_id):
+            raise ConnectionError("down")
+
+    monkeypatch.setattr(
+        summary_cache_service, "_get_backend", lambda: FailingBackend()
+    )
+
+    await summary_cache_service.store_summaries(
+        [_entry(_email())], ACCOUNT_ID, logger=L("test")
+    )
+    assert (
+        await summary_cache_service.get_cached_summaries(
+            ["m1"], logger=L("test")
+        )
+        == {}
+    )
+
+
+def _broadcast(message_id, recipient, sender="Shop <news@shop.example.com>"):
+    return EmailRecord(
+        id=message_id,
+        thread_id=message_id,
+        subject="Weekend sale",
+        sender=sender,
+        date="Sun, 18 Oct 2026 08:00:00 +0000",
+        labels=("CATEGORY_PROMOTIONS",),
+        body=(
+            f"Hi {recipient},\n"
+            "Everything is 30% off until Sunday.\n"
+            f"https://shop.example.com/sale?u={recipient}1234567890abcdef\n"
+            f"You receive this at {recipient}@example.com"
+        ),
+        is_bulk=True,
+    )
+
+
+def test_shared_key_is_the_same_for_every_recipient():
+    assert summary_cache_service.shared_key(
+        _broadcast("m1", "ana")
+    ) == summary_cache_service.shared_key(_broadcast("m2", "bruno"))
+
+
+def test_shared_key_tells_broadcasts_apart():
+    email = _broadcast("m1", "ana")
+    key = summary_cache_service.shared_key(email)
+
+    other_sender = _broadcast(
+        "m2", "ana", sender="Shop <news@other.example.com>"
+    )
+    other_body = replace(email, body=email.body.replace("30%", "50%"))
+    assert summary_cache_service.shared_key(other_sender) != key
+    assert summary_cache_service.shared_key(other_body) != key
+    assert key.startswith(summary_cache_service.SHARED_KEY_PREFIX)
+
+
+def test_only_bulk_mail_is_shareable(monkeypatch):
+    monkeypatch.setattr(settings, "SHARED_SUMMARY_DEDUP", True)
+    bulk = _broadcast("m1", "ana")
+
+    assert summary_cache_service.is_shareable(bulk)
+    assert not summary_cache_service.is_shareable(
+        replace(bulk, is_bulk=False)
+    )
+    monkeypatch.setattr(settings, "SHARED_SUMMARY_DEDUP", False)
+    assert not summary_cache_service.is_shareable(bulk)
+
+
+def test_shared_input_leaves_the_recipient_out():
+    prompt_input = summary_cache_service.shared_input(_broadcast("m1", "ana"))
+
+    assert "ana" not in prompt_input["body"]
+    assert "30% off" in prompt_input["body"]
+
+
+@pytest.mark.asyncio
+async def test_shared_summary_is_served_to_other_accounts(monkeypatch):
+    backend = MemorySummaryCache(100, 3600.0)
+    monkeypatch.setattr(summary_cache_service, "_get_backend", lambda: backend)
+    stats = summary_cache_service.summary_cache_stats()
+    hits, misses = stats.shared_hits, stats.shared_misses
+    first, second = _broadcast("m1", "ana"), _broadcast("m2", "bruno")
+
+    assert (
+        await summary_cache_service.get_shared_summary(first, logger=L("t"))
+        is None
+    )
+    entry = replace(
+        _entry(first), message_id=summary_cache_service.shared_key(first)
+    )
+    await summary_cache_service.store_summaries(
+        [entry], ACCOUNT_ID, logger=L("test")
+    )
+
+    assert (
+        await summary_cache_service.get_shared_summary(second, logger=L("t"))
+        == entry.summary
+    )
+    assert (stats.shared_hits, stats.shared_misses) == (hits + 1, misses + 1)
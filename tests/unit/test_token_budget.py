@@ -0,0 +1,27 @@
+import pytest
+
+from core.settings import settings
+from loaders import token_budget
+
+
+@pytest.fixture
+def missing_encoding(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TIKTOKEN_CACHE_DIR", str(tmp_path))
+    token_budget._get_encoding.cache_clear()
+    yield
+    token_budget._get_encoding.cache_clear()
+
+
+def test_missing_encoding_is_estimated_outside_lambda(
+    missing_encoding, monkeypatch
+):
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+
+    assert token_budget.count_tokens("x" * 10) == 3
+
+
+def test_missing_encoding_is_an_error_in_lambda(missing_encoding, monkeypatch):
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "worker")
+
+    with pytest.raises(FileNotFoundError, match="loaders.token_budget"):
+        token_budget.count_tokens("text")